@@ -0,0 +1,328 @@
+"""
+Generated fixtures for the storage_manager benchmarks.
+
+Everything here stands in for a live host: synthetic directory trees for
+the scanner, canned lsblk and lvm JSON for hosts with any number of
+devices, a fake /sys + /proc + /run/udev layout for SysfsBlockBackend,
+mountinfo files for MountUsageCollector, a FakeRunner that answers
+StorageManager.run_commands from the canned output instead of starting
+processes, and a stand-in lsblk executable for measuring the real
+process start-up. Device fixtures mount their filesystems on empty
+directories inside the fixture, so mount usage never statvfs-es the
+host's own mounts. Generators are deterministic, so numbers from two runs of the
+same fixture can be compared.
+"""
+
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from storage_manager import MountUsageCollector, StorageManager  # noqa: E402
+
+GIB = 1024 ** 3
+
+
+def make_tree(root, entries, fanout=16, files_per_dir=32, data_every=64):
+    """
+    Create a directory tree with `entries` files and directories in total.
+
+    Directories are filled breadth first with files_per_dir files and up
+    to fanout subdirectories each. Every data_every-th file gets 4 KiB of
+    data and the rest are empty, so 10M-entry trees stay small on disk.
+    A marker file makes repeated calls reuse a finished tree.
+    """
+    marker = os.path.join(root, '.fixture-complete')
+    if os.path.exists(marker):
+        return root
+    os.makedirs(root, exist_ok=True)
+    block = b'x' * 4096
+    pending = [root]
+    created = 0
+    while pending and created < entries:
+        directory = pending.pop(0)
+        for i in range(files_per_dir):
+            if created >= entries:
+                break
+            with open(os.path.join(directory, f"f{i:03d}"), 'wb') as f:
+                if created % data_every == 0:
+                    f.write(block)
+            created += 1
+        for i in range(fanout):
+            if created >= entries:
+                break
+            sub = os.path.join(directory, f"d{i:02d}")
+            os.mkdir(sub)
+            pending.append(sub)
+            created += 1
+    with open(marker, 'w') as f:
+        f.write(str(created))
+    return root
+
+
+def _device_layout(devices):
+    """Disks with two partitions each; every fourth second partition is an LVM PV."""
+    layout = []
+    count = 0
+    disk = 0
+    while count < devices:
+        parts = []
+        for p in (1, 2):
+            lv = None
+            if p == 2 and disk % 4 == 0:
+                lv = {'name': f"vg{disk}-data", 'kname': f"dm-{disk // 4}", 'minor': disk // 4}
+            parts.append({'name': f"disk{disk}p{p}", 'minor': disk * 16 + p, 'lv': lv,
+                          'mounted': p == 1})
+        layout.append({'name': f"disk{disk}", 'minor': disk * 16, 'parts': parts})
+        count += 3 + sum(1 for part in parts if part['lv'])
+        disk += 1
+    return layout
+
+
+def lsblk_json(devices):
+    """`lsblk -J -b -o NAME,SIZE,TYPE,MOUNTPOINT,FSTYPE,UUID,LABEL,MAJ:MIN` for a host."""
+    blockdevices = []
+    for disk in _device_layout(devices):
+        children = []
+        for part in disk['parts']:
+            child = {'name': part['name'], 'maj:min': f"8:{part['minor']}", 'size': 50 * GIB,
+                     'type': 'part', 'mountpoint': f"/srv/{part['name']}" if part['mounted'] else None,
+                     'fstype': 'ext4', 'uuid': f"uuid-{part['name']}", 'label': None}
+            if part['lv']:
+                child['fstype'] = 'LVM2_member'
+                child['children'] = [{'name': part['lv']['name'],
+                                      'maj:min': f"253:{part['lv']['minor']}", 'size': 40 * GIB,
+                                      'type': 'lvm', 'mountpoint': None, 'fstype': 'xfs',
+                                      'uuid': f"uuid-{part['lv']['name']}", 'label': None}]
+            children.append(child)
+        blockdevices.append({'name': disk['name'], 'maj:min': f"8:{disk['minor']}", 'size': 100 * GIB,
+                             'type': 'disk', 'mountpoint': None, 'fstype': None, 'uuid': None,
+                             'label': None, 'children': children})
+    return json.dumps({'blockdevices': blockdevices})
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+def make_device_mounts(root, devices):
+    """
+    A mountinfo file mounting the first partition of each disk in _device_layout.
+
+    Each mountpoint is a real, empty directory under root, so statvfs on it
+    is as cheap as on an idle local filesystem.
+    """
+    path = os.path.join(root, 'mountinfo')
+    if os.path.exists(path):
+        return path
+    lines = []
+    for disk in _device_layout(devices):
+        for part in disk['parts']:
+            if part['mounted']:
+                target = os.path.join(root, 'mnt', part['name'])
+                os.makedirs(target, exist_ok=True)
+                lines.append(f"{len(lines) + 30} 1 8:{part['minor']} / {target} "
+                             f"rw,relatime shared:1 - ext4 /dev/{part['name']} rw")
+    _write(path, '\n'.join(lines) + '\n')
+    return path
+
+
+def make_lsblk(root, devices):
+    """
+    A bin directory with an lsblk that prints lsblk_json(devices).
+
+    Put it first on PATH to run the lsblk backend through real process
+    start-up; the stand-in is a shell script that execs cat on a file.
+    """
+    bin_dir = os.path.join(root, 'bin')
+    script = os.path.join(bin_dir, 'lsblk')
+    if os.path.exists(script):
+        return bin_dir
+    output = os.path.join(root, 'lsblk.json')
+    _write(output, lsblk_json(devices))
+    _write(script, f"#!/bin/sh\nexec cat '{output}'\n")
+    os.chmod(script, 0o755)
+    return bin_dir
+
+
+def make_sysfs(root, devices):
+    """
+    A /sys, /proc and /run/udev/data layout with the same devices as lsblk_json.
+
+    Returns (sys_root, proc_root, udev_root) for SysfsBlockBackend.
+    """
+    sys_root = os.path.join(root, 'sys')
+    proc_root = os.path.join(root, 'proc')
+    udev_root = os.path.join(root, 'udev')
+    marker = os.path.join(root, '.fixture-complete')
+    if os.path.exists(marker):
+        return sys_root, proc_root, udev_root
+
+    block = os.path.join(sys_root, 'class', 'block')
+    os.makedirs(block, exist_ok=True)
+    os.makedirs(udev_root, exist_ok=True)
+    partitions = ['major minor  #blocks  name', '']
+
+    def device(base, name, major, minor, devtype, size, fs=None):
+        _write(os.path.join(base, 'uevent'),
+               f"MAJOR={major}\nMINOR={minor}\nDEVNAME={name}\nDEVTYPE={devtype}\n")
+        _write(os.path.join(base, 'size'), str(size // 512))
+        os.makedirs(os.path.join(base, 'holders'), exist_ok=True)
+        partitions.append(f" {major:4d} {minor:7d} {size // 1024:10d} {name}")
+        if fs:
+            _write(os.path.join(udev_root, f"b{major}:{minor}"),
+                   f"E:ID_FS_TYPE={fs}\nE:ID_FS_UUID=uuid-{name}\n")
+
+    for disk in _device_layout(devices):
+        disk_dir = os.path.join(block, disk['name'])
+        device(disk_dir, disk['name'], 8, disk['minor'], 'disk', 100 * GIB)
+        for part in disk['parts']:
+            part_dir = os.path.join(disk_dir, part['name'])
+            device(part_dir, part['name'], 8, part['minor'], 'partition', 50 * GIB,
+                   fs='LVM2_member' if part['lv'] else 'ext4')
+            _write(os.path.join(part_dir, 'partition'), part['name'][-1])
+            os.symlink(os.path.join(disk['name'], part['name']), os.path.join(block, part['name']))
+            if part['lv']:
+                lv = part['lv']
+                dm_dir = os.path.join(block, lv['kname'])
+                device(dm_dir, lv['kname'], 253, lv['minor'], 'disk', 40 * GIB, fs='xfs')
+                _write(os.path.join(dm_dir, 'dm', 'uuid'), f"LVM-{lv['name']}")
+                _write(os.path.join(dm_dir, 'dm', 'name'), lv['name'])
+                os.symlink(dm_dir, os.path.join(part_dir, 'holders', lv['kname']))
+
+    _write(os.path.join(proc_root, 'partitions'), '\n'.join(partitions) + '\n')
+    with open(make_device_mounts(root, devices)) as f:
+        _write(os.path.join(proc_root, 'self', 'mountinfo'), f.read())
+    _write(marker, str(devices))
+    return sys_root, proc_root, udev_root
+
+
+def make_mountinfo(root, mounts):
+    """A mountinfo file with `mounts` filesystems, each mounted on a real directory."""
+    path = os.path.join(root, 'mountinfo')
+    if os.path.exists(path):
+        return path
+    lines = []
+    for i in range(mounts):
+        target = os.path.join(root, 'mnt', f"m{i}")
+        os.makedirs(target, exist_ok=True)
+        lines.append(f"{i + 30} 1 253:{i} / {target} rw,relatime shared:1 - xfs /dev/dm-{i} rw")
+    _write(path, '\n'.join(lines) + '\n')
+    return path
+
+
+def lvm_reports(lvs, lvs_per_vg=50):
+    """
+    Canned lvm JSON for `lvs` logical volumes.
+
+    Returns a dict with the `lvm fullreport` output and the separate
+    pvs / vgs / lvs / lvs --segments outputs, all in --units b --nosuffix form.
+    """
+    groups = max(1, -(-lvs // lvs_per_vg))
+    entries = []
+    all_rows = {'pv': [], 'vg': [], 'lv': [], 'seg': []}
+    made = 0
+    for g in range(groups):
+        vg = f"vg{g}"
+        count = min(lvs_per_vg, lvs - made)
+        made += count
+        extent = 4 * 1024 * 1024
+        pv_size = count * 10 * GIB
+        pvs = [{'pv_name': f"/dev/disk{g}p{p}", 'vg_name': vg, 'pv_uuid': f"pv-{g}-{p}",
+                'pv_size': str(pv_size), 'pv_free': str(GIB),
+                'pv_pe_count': str(pv_size // extent),
+                'pv_pe_alloc_count': str((pv_size - GIB) // extent)} for p in (1, 2)]
+        vgs = [{'vg_name': vg, 'vg_uuid': f"vg-{g}", 'vg_size': str(2 * pv_size),
+                'vg_free': str(2 * GIB), 'pv_count': '2', 'lv_count': str(count),
+                'vg_extent_size': str(extent), 'vg_extent_count': str(2 * pv_size // extent),
+                'vg_free_count': str(2 * GIB // extent)}]
+        lv_rows, seg_rows = [], []
+        for i in range(count):
+            uuid = f"lv-{g}-{i}"
+            lv_rows.append({'lv_name': f"lv{i}", 'vg_name': vg, 'lv_uuid': uuid,
+                            'lv_attr': '-wi-ao----', 'lv_size': str(10 * GIB),
+                            'lv_layout': 'linear', 'pool_lv': '', 'data_percent': '',
+                            'metadata_percent': ''})
+            seg_rows.append({'lv_uuid': uuid, 'segtype': 'linear', 'stripes': '1',
+                             'seg_start': '0', 'seg_size': str(10 * GIB),
+                             'devices': f"/dev/disk{g}p{1 + i % 2}(0)"})
+        entries.append({'vg': vgs, 'pv': pvs, 'lv': lv_rows, 'seg': seg_rows})
+        for key, rows in (('pv', pvs), ('vg', vgs), ('lv', lv_rows), ('seg', seg_rows)):
+            all_rows[key].extend(rows)
+
+    return {
+        'lvm fullreport': json.dumps({'report': entries}),
+        'pvs': json.dumps({'report': [{'pv': all_rows['pv']}]}),
+        'vgs': json.dumps({'report': [{'vg': all_rows['vg']}]}),
+        'lvs': json.dumps({'report': [{'lv': all_rows['lv']}]}),
+        'lvs --segments': json.dumps({'report': [{'seg': all_rows['seg']}]}),
+    }
+
+
+class FakeRunner:
+    """
+    Answers run_commands from canned output.
+
+    Responses are keyed by the command name, plus its first argument for
+    'lvm fullreport' and 'lvs --segments'. Unknown commands exit 127 like a
+    missing binary. latency adds a fixed delay per call to stand in for
+    process start-up cost.
+    """
+
+    def __init__(self, responses=None, latency=0.0):
+        self.responses = dict(responses or {})
+        self.latency = latency
+        self.calls = []
+
+    @staticmethod
+    def key(cmd):
+        if len(cmd) > 1 and (cmd[0], cmd[1]) in (('lvm', 'fullreport'), ('lvs', '--segments')):
+            return f"{cmd[0]} {cmd[1]}"
+        return cmd[0]
+
+    def __call__(self, cmd, require_root=False, capture_output=True):
+        self.calls.append(list(cmd))
+        if self.latency:
+            time.sleep(self.latency)
+        response = self.responses.get(self.key(cmd))
+        if response is None:
+            return (127, "", f"Command not found: {cmd[0]}")
+        if isinstance(response, tuple):
+            return response
+        return (0, response, "")
+
+
+class FixtureStorageManager(StorageManager):
+    """
+    StorageManager whose external commands are answered by a FakeRunner.
+
+    The /run metadata cache is off unless a cache is passed in, so fixture
+    devices never end up in the host's real cache, and mount usage is read
+    from the `mountinfo` file when one is given.
+    """
+
+    def __init__(self, runner, disk_backend='lsblk', root=True, metadata_cache=None, mountinfo=None):
+        super().__init__(disk_backend=disk_backend)
+        self.runner = runner
+        self.root = root
+        if mountinfo is not None:
+            self.mount_collector = MountUsageCollector(mountinfo)
+        if metadata_cache is None:
+            self.metadata_ttl = 0
+        else:
+            self.metadata_cache = metadata_cache
+
+    def check_root_privileges(self):
+        return self.root
+
+    def run_commands(self, commands, require_root=False, capture_output=True, concurrency=16):
+        if require_root and not self.check_root_privileges():
+            return {name: (1, "", "Root privileges required for this operation") for name in commands}
+        return {name: self.runner(cmd, require_root=require_root, capture_output=capture_output)
+                for name, cmd in commands.items()}
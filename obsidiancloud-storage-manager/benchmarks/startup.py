@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Startup-time benchmark for storage_manager.
+
+Runs scripted (non-TTY) invocations the way the installed obsidian-storage
+launcher does, importing storage_manager from its bytecode cache, and
+reports the fastest and median wall time of each next to a bare
+interpreter start. Every round runs the bare interpreter and then each
+command, and a command's ratio is the median over rounds of its time
+divided by that round's interpreter time, so load on a shared machine
+hits both sides of each ratio. Exits non-zero when a gated command's
+ratio is above --budget-ratio, so it can gate regressions in CI; the
+budget is relative because a slower machine slows the interpreter and
+the tool alike.
+
+overview is what scripts call most: it reads the device tree (sysfs, or
+lsblk without it) and statvfs-es the mounts. list-backups runs on an
+empty backup directory, so it measures import, argument parsing and
+dispatch alone.
+
+    python3 benchmarks/startup.py [--runs 20] [--budget-ratio 7]
+"""
+
+import argparse
+import os
+import py_compile
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+GATED_COMMANDS = [
+    ['overview', '--format', 'ndjson'],
+    ['overview'],
+    ['list-backups', '--format', 'ndjson'],
+]
+
+LAUNCHER = ("import sys; sys.path.insert(0, {root!r}); "
+            "sys.argv[0] = 'obsidian-storage'; "
+            "from storage_manager import main; main()")
+
+
+def run_ms(argv, env):
+    started = time.perf_counter()
+    subprocess.run(argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env)
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure storage_manager startup time')
+    parser.add_argument('--runs', type=int, default=20, help='Runs per command (default: 20)')
+    parser.add_argument('--budget-ratio', type=float, default=7.0,
+                        help='Allowed startup time as a multiple of a bare interpreter start (default: 7)')
+    args = parser.parse_args()
+
+    py_compile.compile(os.path.join(ROOT, 'storage_manager.py'), doraise=True)
+    launcher = LAUNCHER.format(root=ROOT)
+    interpreter = [sys.executable, '-c', 'pass']
+    commands = [[sys.executable, '-c', launcher] + command for command in GATED_COMMANDS]
+
+    with tempfile.TemporaryDirectory() as home:
+        # An empty HOME keeps list-backups free of per-backup work
+        env = dict(os.environ, HOME=home)
+        baseline_times = []
+        times = [[] for _ in commands]
+        for _ in range(args.runs):
+            baseline_times.append(run_ms(interpreter, env))
+            for argv, samples in zip(commands, times):
+                samples.append(run_ms(argv, env))
+
+    print(f"{'':<32} {'fastest':>8}  {'median':>8}  {'ratio':>6}")
+    print(f"{'interpreter':<32} {min(baseline_times):8.1f}  {statistics.median(baseline_times):8.1f}")
+    failed = False
+    for command, samples in zip(GATED_COMMANDS, times):
+        ratio = statistics.median(t / b for t, b in zip(samples, baseline_times))
+        over = ratio > args.budget_ratio
+        failed |= over
+        status = 'OVER BUDGET' if over else 'ok'
+        print(f"{' '.join(command):<32} {min(samples):8.1f}  {statistics.median(samples):8.1f}  "
+              f"{ratio:6.2f}  {status}")
+    print(f"budget: {args.budget_ratio:g}x a bare interpreter start")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for storage_manager hot paths.
+
+Each case runs against generated fixtures (see fixtures.py) in its own
+child process, so peak RSS is not polluted by earlier cases. Reported per
+case and size:
+
+  wall      median wall time of the measured call over --repeat runs
+  rw-sys    read/write-family syscalls (syscr + syscw from /proc/self/io)
+  syscalls  every syscall, from a separate run under strace -f -c
+            (only with --strace and when strace is installed)
+  peak RSS  ru_maxrss of the child, and how much the call added to it
+
+The disk-info cases read mount usage from the fixture's own mountinfo.
+disk-info-lsblk answers lsblk from canned output, so it measures parsing
+and the tree build; disk-info-lsblk-exec runs a stand-in lsblk as a real
+process, which is what the lsblk backend costs next to disk-info-sysfs.
+
+Fixtures are cached in --fixtures-dir, so large trees are only built once.
+
+    python3 benchmarks/suite.py                          # default sizes
+    python3 benchmarks/suite.py --case analyze --sizes 1000000
+    python3 benchmarks/suite.py --save before.json
+    python3 benchmarks/suite.py --compare before.json    # after a change
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+import fixtures  # noqa: E402
+import storage_manager as sm  # noqa: E402
+
+
+class Case:
+    def __init__(self, name, sizes, prepare, run, setup=None):
+        self.name = name
+        self.sizes = sizes
+        self.prepare = prepare
+        self.run = run
+        self.setup = setup
+
+
+def _lsblk_prepare(base, size):
+    path = os.path.join(base, 'lsblk.json')
+    if not os.path.exists(path):
+        os.makedirs(base, exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(fixtures.lsblk_json(size))
+    return {'output': path, 'mountinfo': fixtures.make_device_mounts(base, size),
+            'bin': fixtures.make_lsblk(base, size)}
+
+
+def _lsblk_manager(fixture, metadata_cache=None):
+    with open(fixture['output']) as f:
+        runner = fixtures.FakeRunner({'lsblk': f.read()})
+    return fixtures.FixtureStorageManager(runner, disk_backend='lsblk', metadata_cache=metadata_cache,
+                                          mountinfo=fixture['mountinfo'])
+
+
+def _lsblk_exec_setup(fixture):
+    # The stand-in lsblk is found first, so the call pays for fork/exec and the pipe read
+    os.environ['PATH'] = fixture['bin'] + os.pathsep + os.environ.get('PATH', '')
+    manager = sm.StorageManager(disk_backend='lsblk')
+    manager.metadata_ttl = 0
+    manager.mount_collector = sm.MountUsageCollector(fixture['mountinfo'])
+    return manager
+
+
+def _cached_setup(fixture):
+    # Populate the cache so the measured call is a hit
+    cache = sm.MetadataCache(os.path.join(os.path.dirname(fixture['output']), 'run'), ttl=3600)
+    manager = _lsblk_manager(fixture, metadata_cache=cache)
+    manager.get_disk_info()
+    return manager
+
+
+def _sysfs_setup(roots):
+    manager = sm.StorageManager(disk_backend='sysfs')
+    manager.mount_collector = sm.MountUsageCollector(os.path.join(roots[1], 'self', 'mountinfo'))
+    return manager
+
+
+def _sysfs_run(roots, manager):
+    # What _read_device_tree does for the sysfs backend, with fixture roots
+    tree = sm.SysfsBlockBackend(*roots).read_tree()
+    manager._enhance_with_mount_usage(tree)
+
+
+def _lvm_prepare(base, size):
+    path = os.path.join(base, 'lvm.json')
+    if not os.path.exists(path):
+        os.makedirs(base, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(fixtures.lvm_reports(size), f)
+    return path
+
+
+def _lvm_runner(path, fullreport):
+    with open(path) as f:
+        responses = json.load(f)
+    if not fullreport:
+        responses['lvm fullreport'] = (3, '', 'Unrecognised command fullreport')
+    return fixtures.FakeRunner(responses)
+
+
+def _analyze_manager(base):
+    manager = sm.StorageManager()
+    manager.cache_dir = os.path.join(base, 'cache')
+    return manager
+
+
+def _analyze_index_setup(path):
+    manager = _analyze_manager(os.path.dirname(path))
+    manager.scan_space_usage(path, full_rescan=True)
+    return manager
+
+
+CASES = {case.name: case for case in [
+    Case('disk-info-lsblk', [10, 100, 1000, 5000], _lsblk_prepare,
+         lambda fixture, state: _lsblk_manager(fixture).get_disk_info()),
+    Case('disk-info-lsblk-exec', [10, 100, 1000, 5000], _lsblk_prepare,
+         lambda fixture, state: state.get_disk_info(), setup=_lsblk_exec_setup),
+    Case('disk-info-cached', [10, 100, 1000, 5000], _lsblk_prepare,
+         lambda fixture, state: state.get_disk_info(), setup=_cached_setup),
+    Case('disk-info-sysfs', [10, 100, 1000, 5000],
+         lambda base, size: fixtures.make_sysfs(base, size), _sysfs_run, setup=_sysfs_setup),
+    Case('mount-usage', [10, 100, 1000, 5000],
+         lambda base, size: fixtures.make_mountinfo(base, size),
+         lambda path, state: sm.MountUsageCollector(path).collect()),
+    Case('lvm-fullreport', [10, 100, 1000, 5000], _lvm_prepare,
+         lambda path, state: fixtures.FixtureStorageManager(_lvm_runner(path, True)).get_lvm_info()),
+    Case('lvm-fallback', [10, 100, 1000, 5000], _lvm_prepare,
+         lambda path, state: fixtures.FixtureStorageManager(_lvm_runner(path, False)).get_lvm_info()),
+    Case('analyze', [1000, 10000, 100000],
+         lambda base, size: fixtures.make_tree(os.path.join(base, 'tree'), size),
+         lambda path, state: _analyze_manager(os.path.dirname(path)).scan_space_usage(path)),
+    Case('analyze-incremental', [1000, 10000, 100000],
+         lambda base, size: fixtures.make_tree(os.path.join(base, 'tree'), size),
+         lambda path, state: state.scan_space_usage(path, incremental=True),
+         setup=_analyze_index_setup),
+]}
+
+
+def _fixture_base(fixtures_dir, case, size):
+    # Both analyze cases share one tree per size
+    kind = 'analyze' if case.name.startswith('analyze') else case.name.split('-')[0]
+    if case.name == 'disk-info-sysfs':
+        kind = 'sysfs'
+    return os.path.join(fixtures_dir, f"{kind}-{size}")
+
+
+def _io_syscalls():
+    with open('/proc/self/io') as f:
+        counters = dict(line.split(': ') for line in f.read().splitlines())
+    return int(counters['syscr']) + int(counters['syscw'])
+
+
+def run_child(name, size, fixture):
+    case = CASES[name]
+    fixture = json.loads(fixture)
+    state = case.setup(fixture) if case.setup else None
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    calls_before = _io_syscalls()
+    started = time.perf_counter()
+    case.run(fixture, state)
+    wall = time.perf_counter() - started
+    calls = _io_syscalls() - calls_before
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({'wall_ms': wall * 1000, 'rw_syscalls': calls,
+                      'peak_rss_kb': rss, 'rss_added_kb': rss - rss_before}))
+
+
+def _child_command(name, size, fixture):
+    return [sys.executable, os.path.abspath(__file__), '--child', name, str(size), json.dumps(fixture)]
+
+
+def _strace_syscalls(name, size, fixture):
+    with tempfile.NamedTemporaryFile('r', suffix='.strace') as out:
+        subprocess.run(['strace', '-f', '-c', '-o', out.name] + _child_command(name, size, fixture),
+                       stdout=subprocess.DEVNULL, check=True)
+        for line in out.read().splitlines():
+            fields = line.split()
+            if fields and fields[-1] == 'total':
+                # columns: % time, seconds, usecs/call, calls, [errors,] total
+                numbers = [f for f in fields[:-1] if f.replace('.', '', 1).isdigit()]
+                return int(numbers[3]) if len(numbers) > 3 else int(numbers[-1])
+    return None
+
+
+def measure(case, size, fixtures_dir, repeat, use_strace):
+    fixture = case.prepare(_fixture_base(fixtures_dir, case, size), size)
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run(_child_command(case.name, size, fixture),
+                             capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(out.splitlines()[-1]))
+    result = {
+        'case': case.name,
+        'size': size,
+        'wall_ms': statistics.median(r['wall_ms'] for r in runs),
+        'rw_syscalls': statistics.median(r['rw_syscalls'] for r in runs),
+        'peak_rss_kb': max(r['peak_rss_kb'] for r in runs),
+        'rss_added_kb': max(r['rss_added_kb'] for r in runs),
+        'syscalls': _strace_syscalls(case.name, size, fixture) if use_strace else None,
+    }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='storage_manager benchmark suite')
+    parser.add_argument('--case', action='append', choices=sorted(CASES),
+                        help='Case to run (repeatable, default: all)')
+    parser.add_argument('--sizes', help='Comma-separated sizes instead of each case\'s defaults')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement (default: 3)')
+    parser.add_argument('--fixtures-dir', default=os.path.join(tempfile.gettempdir(), 'storage-manager-bench'),
+                        help='Where generated fixtures are cached')
+    parser.add_argument('--strace', action='store_true', help='Also count every syscall with strace')
+    parser.add_argument('--save', help='Write results as JSON to this file')
+    parser.add_argument('--compare', help='Show the change in wall time against a saved run')
+    parser.add_argument('--child', nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child[0], int(args.child[1]), args.child[2])
+        return 0
+
+    use_strace = args.strace and shutil.which('strace') is not None
+    if args.strace and not use_strace:
+        print("strace not found; syscall totals are not collected", file=sys.stderr)
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {(r['case'], r['size']): r for r in json.load(f)}
+
+    print(f"{'case':<22} {'size':>8} {'wall':>11} {'rw-sys':>9} {'syscalls':>9} "
+          f"{'peak RSS':>10} {'added':>9}  change")
+    results = []
+    for name in args.case or list(CASES):
+        case = CASES[name]
+        sizes = [int(s) for s in args.sizes.split(',')] if args.sizes else case.sizes
+        for size in sizes:
+            r = measure(case, size, args.fixtures_dir, args.repeat, use_strace)
+            results.append(r)
+            change = ''
+            before = baseline.get((name, size))
+            if before and before['wall_ms']:
+                change = f"{(r['wall_ms'] / before['wall_ms'] - 1) * 100:+.1f}%"
+            syscalls = str(r['syscalls']) if r['syscalls'] is not None else '-'
+            print(f"{name:<22} {size:>8} {r['wall_ms']:>8.2f} ms {r['rw_syscalls']:>9.0f} {syscalls:>9} "
+                  f"{r['peak_rss_kb'] / 1024:>7.1f} MB {r['rss_added_kb'] / 1024:>6.1f} MB  {change}",
+                  flush=True)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
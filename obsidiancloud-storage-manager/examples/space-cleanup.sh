@@ -30,47 +30,15 @@ fi
 echo -e "${BLUE}=== Initial Disk Usage ===${NC}"
 obsidian-storage overview
 
-FREED_SPACE=0
+# 1. Package caches, old journal files, rotated logs, stale /tmp files and
+#    unused container images. cleanup sizes every rule up front and reports
+#    the bytes it actually freed per rule.
+echo -e "\n${BLUE}[1/5]${NC} Cleaning caches, logs and temporary files..."
+obsidian-storage cleanup --yes || echo -e "${YELLOW}⚠ Some items could not be removed${NC}"
 
-# Function to calculate freed space
-calculate_freed() {
-    BEFORE=$(df / | tail -1 | awk '{print $3}')
-    $1
-    AFTER=$(df / | tail -1 | awk '{print $3}')
-    DIFF=$((BEFORE - AFTER))
-    FREED_SPACE=$((FREED_SPACE + DIFF))
-    echo -e "${GREEN}✓ Freed: $(numfmt --to=iec-i --suffix=B $((DIFF * 1024)))${NC}"
-}
-
-# 1. Package manager cache
-echo -e "\n${BLUE}[1/8]${NC} Cleaning package cache..."
-
-if command -v pacman &> /dev/null; then
-    echo "Removing pacman cache..."
-    calculate_freed "pacman -Sc --noconfirm"
-elif command -v apt &> /dev/null; then
-    echo "Removing apt cache..."
-    calculate_freed "apt clean"
-    calculate_freed "apt autoremove -y"
-elif command -v dnf &> /dev/null; then
-    echo "Removing dnf cache..."
-    calculate_freed "dnf clean all"
-fi
-
-# 2. Journalctl logs
-echo -e "\n${BLUE}[2/8]${NC} Cleaning old journal logs..."
-echo "Keeping last 3 days..."
-calculate_freed "journalctl --vacuum-time=3d"
-
-# 3. Temporary files
-echo -e "\n${BLUE}[3/8]${NC} Cleaning temporary files..."
-echo "Removing /tmp files older than 7 days..."
-find /tmp -type f -atime +7 -delete 2>/dev/null || true
-echo -e "${GREEN}✓ Done${NC}"
-
-# 4. Old kernels (Arch-specific)
+# 2. Old kernels (Arch-specific)
 if command -v pacman &> /dev/null; then
-    echo -e "\n${BLUE}[4/8]${NC} Cleaning old kernels..."
+    echo -e "\n${BLUE}[2/5]${NC} Cleaning old kernels..."
     CURRENT_KERNEL=$(uname -r | sed 's/-[^-]*$//')
     INSTALLED_KERNELS=$(pacman -Q | grep '^linux' | grep -v "$CURRENT_KERNEL" | awk '{print $1}')
     
@@ -86,15 +54,8 @@ if command -v pacman &> /dev/null; then
     fi
 fi
 
-# 5. Docker cleanup
-if command -v docker &> /dev/null; then
-    echo -e "\n${BLUE}[5/8]${NC} Cleaning Docker resources..."
-    echo "Removing unused Docker images, containers, and volumes..."
-    docker system prune -af --volumes 2>/dev/null || echo "Docker cleanup skipped"
-fi
-
-# 6. Thumbnail cache
-echo -e "\n${BLUE}[6/8]${NC} Cleaning thumbnail cache..."
+# 3. Thumbnail cache
+echo -e "\n${BLUE}[3/5]${NC} Cleaning thumbnail cache..."
 if [ -d "$HOME/.cache/thumbnails" ]; then
     THUMB_SIZE=$(du -sh "$HOME/.cache/thumbnails" 2>/dev/null | cut -f1)
     echo "Thumbnail cache size: $THUMB_SIZE"
@@ -102,8 +63,8 @@ if [ -d "$HOME/.cache/thumbnails" ]; then
     echo -e "${GREEN}✓ Cleared thumbnail cache${NC}"
 fi
 
-# 7. Browser caches
-echo -e "\n${BLUE}[7/8]${NC} Cleaning browser caches..."
+# 4. Browser caches
+echo -e "\n${BLUE}[4/5]${NC} Cleaning browser caches..."
 
 # Chrome/Chromium
 if [ -d "$HOME/.cache/google-chrome" ]; then
@@ -128,8 +89,8 @@ fi
 
 echo -e "${GREEN}✓ Browser caches cleaned${NC}"
 
-# 8. Find large files
-echo -e "\n${BLUE}[8/8]${NC} Locating large files (>1GB)..."
+# 5. Find large files
+echo -e "\n${BLUE}[5/5]${NC} Locating large files (>1GB)..."
 echo "This may take a moment..."
 echo ""
 
@@ -147,13 +108,6 @@ echo -e "${CYAN}║                     Cleanup Complete!
 echo -e "${CYAN}╚═══════════════════════════════════════════════════════════════╝${NC}"
 echo ""
 
-if [ $FREED_SPACE -gt 0 ]; then
-    echo -e "${GREEN}Total space freed: $(numfmt --to=iec-i --suffix=B $((FREED_SPACE * 1024)))${NC}"
-else
-    echo -e "${GREEN}Space optimized!${NC}"
-fi
-
-echo ""
 echo -e "${BLUE}=== Final Disk Usage ===${NC}"
 obsidian-storage overview
 
@@ -28,17 +28,21 @@ echo -e "${NC}"
 # Check Python version
 echo -e "${BLUE}[1/6]${NC} Checking Python version..."
 if ! command -v python3 &> /dev/null; then
-    echo -e "${RED}✗ Python 3 not found. Please install Python 3.6 or higher.${NC}"
+    echo -e "${RED}✗ Python 3 not found. Please install Python 3.8 or higher.${NC}"
     exit 1
 fi
 
 PYTHON_VERSION=$(python3 --version | cut -d' ' -f2)
+if ! python3 -c 'import sys; sys.exit(sys.version_info < (3, 8))'; then
+    echo -e "${RED}✗ Python ${PYTHON_VERSION} found, but 3.8 or higher is required.${NC}"
+    exit 1
+fi
 echo -e "${GREEN}✓ Python ${PYTHON_VERSION} found${NC}"
 
 # Check required commands
 echo -e "${BLUE}[2/6]${NC} Checking required dependencies..."
 
-REQUIRED_COMMANDS=("lsblk" "df" "du" "sfdisk")
+REQUIRED_COMMANDS=("lsblk" "sfdisk")
 MISSING_COMMANDS=()
 
 for cmd in "${REQUIRED_COMMANDS[@]}"; do
@@ -74,8 +78,24 @@ fi
 # Make script executable
 echo -e "${BLUE}[3/6]${NC} Making storage_manager.py executable..."
 chmod +x "${SCRIPT_DIR}/storage_manager.py"
+# Compile once so every run loads bytecode instead of re-parsing the script
+python3 -m py_compile "${SCRIPT_DIR}/storage_manager.py"
 echo -e "${GREEN}✓ Made executable${NC}"
 
+# The installed command imports storage_manager as a module rather than
+# running the script, so Python reuses the compiled bytecode
+write_launcher() {
+    rm -f "$1"
+    cat > "$1" <<EOF
+#!/usr/bin/env python3
+import sys
+sys.path.insert(0, "${SCRIPT_DIR}")
+from storage_manager import main
+main()
+EOF
+    chmod +x "$1"
+}
+
 # Install script
 echo -e "${BLUE}[4/6]${NC} Installing storage manager..."
 
@@ -90,7 +110,7 @@ if [ "$INSTALL_TARGET" == "system" ]; then
     INSTALL_DIR="/usr/local/bin"
     INSTALL_PATH="${INSTALL_DIR}/obsidian-storage"
     
-    ln -sf "${SCRIPT_DIR}/storage_manager.py" "$INSTALL_PATH"
+    write_launcher "$INSTALL_PATH"
     echo -e "${GREEN}✓ Installed to: ${INSTALL_PATH}${NC}"
 else
     # User installation
@@ -98,7 +118,7 @@ else
     INSTALL_PATH="${INSTALL_DIR}/obsidian-storage"
     
     mkdir -p "$INSTALL_DIR"
-    ln -sf "${SCRIPT_DIR}/storage_manager.py" "$INSTALL_PATH"
+    write_launcher "$INSTALL_PATH"
     echo -e "${GREEN}✓ Installed to: ${INSTALL_PATH}${NC}"
     
     # Check if ~/.local/bin is in PATH
@@ -4,60 +4,2942 @@ Obsidian Cloud - Storage Manager
 Production-grade disk management utility for Linux systems
 """
 
+from __future__ import annotations
+
 import os
 import sys
-import subprocess
 import json
 import argparse
 import re
+import stat
+import queue
+import threading
+import time
+import select
+import signal
+import fcntl
+import bisect
+import shlex
+import heapq
+import pwd
+import mmap
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+from dataclasses import dataclass, field, fields as dataclass_fields, asdict
 from enum import Enum
 import shutil
+from array import array
+from collections import deque
+
+# Heavier modules (subprocess, sqlite3, asyncio, http.server, concurrent.futures,
+# hashlib, gzip, urllib.parse) are imported where they are used, so each
+# command only pays for what it needs at startup.
+if TYPE_CHECKING:
+    import asyncio
+    import sqlite3
+    from concurrent.futures import ThreadPoolExecutor
+
+# Color codes
+class Color:
+    HEADER = '\033[95m'
+    OKBLUE = '\033[94m'
+    OKCYAN = '\033[96m'
+    OKGREEN = '\033[92m'
+    WARNING = '\033[93m'
+    FAIL = '\033[91m'
+    ENDC = '\033[0m'
+    BOLD = '\033[1m'
+
+class OperationRisk(Enum):
+    SAFE = "safe"
+    LOW = "low"
+    MEDIUM = "medium"
+    HIGH = "high"
+    CRITICAL = "critical"
+
+@dataclass
+class DiskInfo:
+    name: str
+    size: str
+    type: str
+    mountpoint: Optional[str]
+    fstype: Optional[str]
+    uuid: Optional[str]
+    label: Optional[str]
+    used: Optional[str] = None
+    avail: Optional[str] = None
+    use_percent: Optional[str] = None
+    maj_min: Optional[str] = None
+    size_bytes: Optional[int] = None
+    used_bytes: Optional[int] = None
+    avail_bytes: Optional[int] = None
+
+class DeviceNode:
+    __slots__ = ('info', 'parents', 'children')
+
+    def __init__(self, info: DiskInfo):
+        self.info = info
+        self.parents: List['DeviceNode'] = []
+        self.children: List['DeviceNode'] = []
+
+    def __repr__(self):
+        return f"DeviceNode({self.info.name!r}, children={len(self.children)})"
+
+class DeviceTree:
+    """
+    Block device graph with constant-time lookups.
+
+    A device can have several parents (md or LVM spanning partitions) and
+    several children, and every device is stored once however often it is
+    reached. Nodes are kept in depth-first insertion order, and the name,
+    UUID, maj:min, mountpoint and type indexes are filled as nodes are added
+    so building the tree is a single pass over the backend output.
+    """
+
+    __slots__ = ('nodes', 'roots', 'by_name', 'by_uuid', 'by_devno', 'by_mountpoint', 'by_type')
+
+    def __init__(self):
+        self.nodes: List[DeviceNode] = []
+        self.roots: List[DeviceNode] = []
+        self.by_name: Dict[str, DeviceNode] = {}
+        self.by_uuid: Dict[str, DeviceNode] = {}
+        self.by_devno: Dict[str, DeviceNode] = {}
+        self.by_mountpoint: Dict[str, DeviceNode] = {}
+        self.by_type: Dict[str, List[DeviceNode]] = {}
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def get(self, info: DiskInfo) -> Optional[DeviceNode]:
+        if info.maj_min:
+            return self.by_devno.get(info.maj_min)
+        return self.by_name.get(info.name)
+
+    def add(self, info: DiskInfo, parent: Optional[DeviceNode] = None) -> Tuple[DeviceNode, bool]:
+        node = self.get(info)
+        created = node is None
+        if created:
+            node = DeviceNode(info)
+            self.nodes.append(node)
+            self.by_name[info.name] = node
+            if info.uuid:
+                self.by_uuid.setdefault(info.uuid, node)
+            if info.maj_min:
+                self.by_devno[info.maj_min] = node
+            if info.mountpoint:
+                self.by_mountpoint[info.mountpoint] = node
+            self.by_type.setdefault(info.type, []).append(node)
+        if parent is None:
+            if created:
+                self.roots.append(node)
+        elif parent not in node.parents:
+            node.parents.append(parent)
+            parent.children.append(node)
+        return node, created
+
+    def by_source(self, source: str) -> Optional[DeviceNode]:
+        # Mount sources name devices as /dev/<name> or /dev/mapper/<dm name>
+        for prefix in ('/dev/mapper/', '/dev/'):
+            if source.startswith(prefix):
+                return self.by_name.get(source[len(prefix):])
+        return None
+
+    @property
+    def devices(self) -> List[DiskInfo]:
+        return [node.info for node in self.nodes]
+
+    def of_type(self, dev_type: str) -> List[DiskInfo]:
+        return [node.info for node in self.by_type.get(dev_type, [])]
+
+    def dump(self) -> Dict:
+        # Devices are stored as rows under one field list, which loads much faster than dicts
+        names = [f.name for f in dataclass_fields(DiskInfo)]
+        index = {id(node): i for i, node in enumerate(self.nodes)}
+        return {
+            'fields': names,
+            'devices': [[getattr(node.info, name) for name in names] for node in self.nodes],
+            'roots': [index[id(node)] for node in self.roots],
+            'edges': [(index[id(node)], index[id(child)]) for node in self.nodes for child in node.children],
+        }
+
+    @classmethod
+    def restore(cls, data: Dict) -> 'DeviceTree':
+        if data['fields'] != [f.name for f in dataclass_fields(DiskInfo)]:
+            raise KeyError('fields')
+        tree = cls()
+        for row in data['devices']:
+            tree.add(DiskInfo(*row))
+        tree.roots = [tree.nodes[i] for i in data['roots']]
+        for parent, child in data['edges']:
+            tree.nodes[child].parents.append(tree.nodes[parent])
+            tree.nodes[parent].children.append(tree.nodes[child])
+        return tree
+
+@dataclass
+class MountEntry:
+    major: int
+    minor: int
+    root: str
+    mountpoint: str
+    fstype: str
+    source: str
+
+def _unescape_mount_field(value: str) -> str:
+    # mountinfo escapes space, tab, newline and backslash as \ooo
+    return re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), value)
+
+def parse_mountinfo(path: str = "/proc/self/mountinfo") -> List[MountEntry]:
+    mounts = []
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            try:
+                sep = fields.index('-', 6)
+                major, minor = fields[2].split(':')
+                mounts.append(MountEntry(
+                    major=int(major),
+                    minor=int(minor),
+                    root=_unescape_mount_field(fields[3]),
+                    mountpoint=_unescape_mount_field(fields[4]),
+                    fstype=fields[sep + 1],
+                    source=_unescape_mount_field(fields[sep + 2])
+                ))
+            except (ValueError, IndexError):
+                continue
+    return mounts
+
+def mounts_by_source(entries: List[MountEntry]) -> Dict[str, MountEntry]:
+    """
+    Mounts with an anonymous 0:N device number, keyed by their /dev source.
+
+    btrfs (and a few others) report such a device number in mountinfo, so
+    they can only be matched to a block device by the source path, e.g.
+    /dev/sda2 or /dev/mapper/vg-root.
+    """
+    by_source: Dict[str, MountEntry] = {}
+    for entry in entries:
+        if entry.major != 0 or not entry.source.startswith('/dev/'):
+            continue
+        current = by_source.get(entry.source)
+        if current is None or (current.root != '/' and entry.root == '/'):
+            by_source[entry.source] = entry
+    return by_source
+
+@dataclass
+class MountUsage:
+    mountpoint: str
+    fstype: str
+    source: str
+    major: int
+    minor: int
+    total: int = 0
+    used: int = 0
+    avail: int = 0
+    error: Optional[str] = None
+
+    @property
+    def use_percent(self) -> int:
+        # Same rounding as df: share of the space available to non-root users
+        usable = self.used + self.avail
+        if usable <= 0:
+            return 0
+        return -(-self.used * 100 // usable)
+
+class MountUsageCollector:
+    """
+    Capacity for every mount from os.statvfs, keyed by mountinfo.
+
+    Each mount is queried on its own daemon thread, and mounts that have
+    not answered within the timeout (a hung NFS server, a dead multipath
+    path) are returned with error='timeout' instead of blocking the caller.
+    A mount keeps at most one probe in flight: while its last statvfs has
+    not returned it is reported as timed out without starting another
+    thread, so long-running callers do not pile up threads on a hung mount.
+    Pseudo filesystems without capacity (proc, sysfs, cgroup, ...) are not
+    probed at all.
+    """
+
+    PSEUDO_FSTYPES = frozenset({
+        'proc', 'sysfs', 'cgroup', 'cgroup2', 'devpts', 'mqueue', 'debugfs', 'tracefs',
+        'securityfs', 'pstore', 'bpf', 'configfs', 'fusectl', 'hugetlbfs', 'autofs',
+        'binfmt_misc', 'efivarfs', 'selinuxfs', 'nsfs', 'rpc_pipefs', 'overlay',
+    })
+
+    def __init__(self, mountinfo_path: str = "/proc/self/mountinfo", timeout: float = 2.0):
+        self.mountinfo_path = mountinfo_path
+        self.timeout = timeout
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def mounts(self, block_only: bool = False) -> List[MountEntry]:
+        selected: Dict[Tuple[int, int], MountEntry] = {}
+        extra: Dict[str, MountEntry] = {}
+        for entry in parse_mountinfo(self.mountinfo_path):
+            if entry.fstype in self.PSEUDO_FSTYPES:
+                continue
+            # btrfs and a few others have an anonymous 0:N device but still a /dev source
+            if entry.major == 0 and not entry.source.startswith('/dev/'):
+                # Later mounts on the same path hide earlier ones
+                if not block_only:
+                    extra.pop(entry.mountpoint, None)
+                    extra[entry.mountpoint] = entry
+                continue
+            key = (entry.major, entry.minor)
+            current = selected.get(key)
+            # One statvfs per filesystem; prefer the mount of its root
+            if current is None or (current.root != '/' and entry.root == '/'):
+                selected[key] = entry
+        return list(selected.values()) + list(extra.values())
+
+    def collect(self, mounts: Optional[List[MountEntry]] = None,
+                block_only: bool = False) -> List[MountUsage]:
+        if mounts is None:
+            mounts = self.mounts(block_only=block_only)
+        results = [MountUsage(m.mountpoint, m.fstype, m.source, m.major, m.minor,
+                              error='timeout') for m in mounts]
+        done = threading.Semaphore(0)
+
+        def probe(usage: MountUsage):
+            try:
+                st = os.statvfs(usage.mountpoint)
+                usage.total = st.f_blocks * st.f_frsize
+                usage.used = (st.f_blocks - st.f_bfree) * st.f_frsize
+                usage.avail = st.f_bavail * st.f_frsize
+                usage.error = None
+            except OSError as e:
+                usage.error = e.strerror or str(e)
+            finally:
+                with self._lock:
+                    self._pending.discard(usage.mountpoint)
+                done.release()
+
+        started = 0
+        for usage in results:
+            with self._lock:
+                # The previous probe of this mount is still stuck in statvfs
+                if usage.mountpoint in self._pending:
+                    continue
+                self._pending.add(usage.mountpoint)
+            threading.Thread(target=probe, args=(usage,), daemon=True).start()
+            started += 1
+
+        deadline = time.monotonic() + self.timeout
+        for _ in range(started):
+            if not done.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                break
+        return results
+
+def parse_size(text: str) -> int:
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMGTP]?)i?B?\s*', text, re.IGNORECASE)
+    if not match:
+        raise argparse.ArgumentTypeError(f"invalid size: {text}")
+    power = ' KMGTP'.index(match.group(2).upper() or ' ')
+    return int(float(match.group(1)) * 1024 ** power)
+
+def parse_date(text: str) -> float:
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date (use YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS): {text}")
+
+def format_lsblk_size(size: int) -> str:
+    value = float(size)
+    for unit in ['B', 'K', 'M', 'G', 'T', 'P']:
+        if value < 1024.0:
+            break
+        value /= 1024.0
+    else:
+        unit = 'E'
+    text = f"{value:.1f}".rstrip('0').rstrip('.')
+    return f"{text}{unit}"
+
+class SysfsBlockBackend:
+    """
+    Builds DiskInfo records straight from the kernel and udev databases.
+
+    Device numbers and sizes come from one read of /proc/partitions, the
+    device type and relations from /sys/class/block, mountpoints from
+    mountinfo and filesystem metadata from /run/udev/data, so no
+    subprocess is started. Roots are parameters so fixtures can stand in
+    for a live system.
+    """
+
+    DM_TYPES = {'LVM': 'lvm', 'CRYPT': 'crypt', 'mpath': 'mpath', 'part1': 'part'}
+
+    def __init__(self, sys_root: str = "/sys", proc_root: str = "/proc",
+                 udev_root: str = "/run/udev/data"):
+        self.block_dir = os.path.join(sys_root, "class", "block")
+        self.proc_root = proc_root
+        self.udev_root = udev_root
+
+    def available(self) -> bool:
+        return os.path.isdir(self.block_dir)
+
+    @staticmethod
+    def _read(path: str) -> Optional[str]:
+        try:
+            with open(path) as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def _partition_sizes(self) -> Dict[str, int]:
+        sizes = {}
+        content = self._read(os.path.join(self.proc_root, "partitions")) or ''
+        for line in content.splitlines()[1:]:
+            parts = line.split()
+            if len(parts) == 4 and parts[2].isdigit():
+                sizes[parts[3]] = int(parts[2]) * 1024
+        return sizes
+
+    def _udev_properties(self, major: int, minor: int) -> Dict[str, str]:
+        props = {}
+        content = self._read(os.path.join(self.udev_root, f"b{major}:{minor}")) or ''
+        for line in content.splitlines():
+            if line.startswith('E:') and '=' in line:
+                key, value = line[2:].split('=', 1)
+                props[key] = value
+        return props
+
+    def _mounts(self) -> Tuple[Dict[Tuple[int, int], MountEntry], Dict[str, MountEntry]]:
+        mounts = {}
+        try:
+            entries = parse_mountinfo(os.path.join(self.proc_root, "self", "mountinfo"))
+        except OSError:
+            return mounts, {}
+        for entry in entries:
+            key = (entry.major, entry.minor)
+            current = mounts.get(key)
+            # Prefer the mount of the filesystem root over bind mounts of subdirectories
+            if current is None or (current.root != '/' and entry.root == '/'):
+                mounts[key] = entry
+        return mounts, mounts_by_source(entries)
+
+    def _device_type(self, kname: str, uevent: Dict[str, str], major: int) -> str:
+        base = os.path.join(self.block_dir, kname)
+        if uevent.get('DEVTYPE') == 'partition':
+            return 'part'
+        dm_uuid = self._read(os.path.join(base, "dm", "uuid"))
+        if dm_uuid is not None:
+            prefix = dm_uuid.split('-', 1)[0]
+            return self.DM_TYPES.get(prefix, 'part' if prefix.startswith('part') else 'dm')
+        level = self._read(os.path.join(base, "md", "level"))
+        if level:
+            return level
+        if kname.startswith('loop'):
+            return 'loop'
+        if major == 11:
+            return 'rom'
+        return 'disk'
+
+    def read_devices(self) -> List[DiskInfo]:
+        return self.read_tree().devices
+
+    def read_tree(self) -> DeviceTree:
+        sizes = self._partition_sizes()
+        mounts, by_source = self._mounts()
+        nodes: Dict[str, DiskInfo] = {}
+        devnos: Dict[str, Tuple[int, int]] = {}
+        children: Dict[str, List[str]] = {}
+        has_parent = set()
+
+        for kname in os.listdir(self.block_dir):
+            base = os.path.join(self.block_dir, kname)
+            uevent = {}
+            for line in (self._read(os.path.join(base, "uevent")) or '').splitlines():
+                key, _, value = line.partition('=')
+                uevent[key] = value
+            try:
+                major, minor = int(uevent['MAJOR']), int(uevent['MINOR'])
+            except (KeyError, ValueError):
+                continue
+            # lsblk hides RAM disks and detached loop devices by default
+            if major == 1:
+                continue
+            if kname.startswith('loop') and not os.path.exists(os.path.join(base, "loop")):
+                continue
+
+            size = sizes.get(kname)
+            if size is None:
+                sectors = self._read(os.path.join(base, "size"))
+                size = int(sectors) * 512 if sectors and sectors.isdigit() else 0
+
+            props = self._udev_properties(major, minor)
+            dm_name = self._read(os.path.join(base, "dm", "name"))
+            mount = mounts.get((major, minor))
+            if mount is None:
+                mount = by_source.get(f"/dev/{kname}")
+                if mount is None and dm_name:
+                    mount = by_source.get(f"/dev/mapper/{dm_name}")
+            label = props.get('ID_FS_LABEL_ENC')
+            if label is not None:
+                label = re.sub(rb'\\x([0-9a-fA-F]{2})', lambda m: bytes([int(m.group(1), 16)]),
+                               label.encode()).decode('utf-8', 'replace')
+            else:
+                label = props.get('ID_FS_LABEL')
+
+            nodes[kname] = DiskInfo(
+                name=dm_name or kname,
+                size=format_lsblk_size(size),
+                type=self._device_type(kname, uevent, major),
+                mountpoint=mount.mountpoint if mount else None,
+                fstype=props.get('ID_FS_TYPE') or (mount.fstype if mount else None),
+                uuid=props.get('ID_FS_UUID'),
+                label=label,
+                maj_min=f"{major}:{minor}",
+                size_bytes=size
+            )
+            devnos[kname] = (major, minor)
+
+            kids = []
+            if uevent.get('DEVTYPE') == 'disk':
+                try:
+                    kids.extend(e.name for e in os.scandir(base)
+                                if e.name.startswith(kname) and
+                                os.path.exists(os.path.join(e.path, "partition")))
+                except OSError:
+                    pass
+            try:
+                kids.extend(sorted(os.listdir(os.path.join(base, "holders"))))
+            except OSError:
+                pass
+            children[kname] = kids
+            has_parent.update(kids)
+
+        tree = DeviceTree()
+        stack = [(kname, None) for kname in
+                 sorted((k for k in nodes if k not in has_parent), key=lambda k: devnos[k],
+                        reverse=True)]
+        while stack:
+            kname, parent = stack.pop()
+            node, created = tree.add(nodes[kname], parent)
+            if created:
+                kids = [k for k in children[kname] if k in nodes]
+                kids.sort(key=lambda k: devnos[k], reverse=True)
+                stack.extend((kid, node) for kid in kids)
+        return tree
+
+@dataclass
+class PhysicalVolume:
+    pv_name: str
+    vg_name: str
+    pv_uuid: str
+    pv_size: int
+    pv_free: int
+    pe_count: Optional[int]
+    pe_alloc_count: Optional[int]
+
+@dataclass
+class VolumeGroup:
+    vg_name: str
+    vg_uuid: str
+    vg_size: int
+    vg_free: int
+    pv_count: int
+    lv_count: int
+    extent_size: Optional[int]
+    extent_count: Optional[int]
+    free_count: Optional[int]
+
+@dataclass
+class LVSegment:
+    lv_uuid: str
+    segtype: str
+    stripes: Optional[int]
+    seg_start: int
+    seg_size: int
+    devices: List[str]
+
+@dataclass
+class LogicalVolume:
+    lv_name: str
+    vg_name: str
+    lv_uuid: str
+    lv_attr: str
+    lv_size: int
+    layout: List[str]
+    pool_lv: Optional[str]
+    data_percent: Optional[float]
+    metadata_percent: Optional[float]
+    segments: List[LVSegment] = field(default_factory=list)
+
+    @property
+    def is_thin_pool(self) -> bool:
+        return 'pool' in self.layout and 'thin' in self.layout
+
+@dataclass
+class LVMReport:
+    physical_volumes: List[PhysicalVolume] = field(default_factory=list)
+    volume_groups: List[VolumeGroup] = field(default_factory=list)
+    logical_volumes: List[LogicalVolume] = field(default_factory=list)
+    segments: List[LVSegment] = field(default_factory=list)
+    source: str = ''
+    errors: List[str] = field(default_factory=list)
+
+    def dump(self) -> Dict:
+        data = asdict(self)
+        for lv in data['logical_volumes']:
+            del lv['segments']
+        return data
+
+    @classmethod
+    def restore(cls, data: Dict) -> 'LVMReport':
+        report = cls(
+            physical_volumes=[PhysicalVolume(**pv) for pv in data['physical_volumes']],
+            volume_groups=[VolumeGroup(**vg) for vg in data['volume_groups']],
+            logical_volumes=[LogicalVolume(**lv) for lv in data['logical_volumes']],
+            segments=[LVSegment(**seg) for seg in data['segments']],
+            source=data['source'],
+            errors=data['errors'],
+        )
+        by_lv: Dict[str, List[LVSegment]] = {}
+        for seg in report.segments:
+            by_lv.setdefault(seg.lv_uuid, []).append(seg)
+        for lv in report.logical_volumes:
+            lv.segments = by_lv.get(lv.lv_uuid, [])
+        return report
+
+class LVMReportParser:
+    """
+    Turns lvm JSON reports into typed records.
+
+    Commands are run with --units b --nosuffix so every size is an exact
+    byte count. The same parser handles the per-VG entries of
+    `lvm fullreport` and the single entry printed by pvs/vgs/lvs. Rows
+    that cannot be converted are reported in LVMReport.errors rather than
+    silently dropped.
+    """
+
+    PV_FIELDS = 'pv_name,vg_name,pv_uuid,pv_size,pv_free,pv_pe_count,pv_pe_alloc_count'
+    VG_FIELDS = ('vg_name,vg_uuid,vg_size,vg_free,pv_count,lv_count,'
+                 'vg_extent_size,vg_extent_count,vg_free_count')
+    LV_FIELDS = ('lv_name,vg_name,lv_uuid,lv_attr,lv_size,lv_layout,pool_lv,'
+                 'data_percent,metadata_percent')
+    SEG_FIELDS = 'lv_uuid,segtype,stripes,seg_start,seg_size,devices'
+
+    @staticmethod
+    def _int(value: Optional[str]) -> Optional[int]:
+        if value is None or value == '':
+            return None
+        # Byte counts stay exact; only values printed with a decimal point go through float
+        if '.' in value:
+            return int(float(value))
+        return int(value)
+
+    @staticmethod
+    def _float(value: Optional[str]) -> Optional[float]:
+        if value is None or value == '':
+            return None
+        return float(value)
+
+    def parse(self, output: str, report: LVMReport, source: str):
+        try:
+            data = json.loads(output)
+            entries = data['report']
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            report.errors.append(f"{source}: malformed report ({e})")
+            return
+
+        for entry in entries:
+            for row in entry.get('pv', []):
+                self._convert(report, source, 'pv', row, lambda r: report.physical_volumes.append(
+                    PhysicalVolume(
+                        pv_name=r['pv_name'],
+                        vg_name=r.get('vg_name', ''),
+                        pv_uuid=r.get('pv_uuid', ''),
+                        pv_size=self._int(r['pv_size']) or 0,
+                        pv_free=self._int(r['pv_free']) or 0,
+                        pe_count=self._int(r.get('pv_pe_count')),
+                        pe_alloc_count=self._int(r.get('pv_pe_alloc_count'))
+                    )))
+            for row in entry.get('vg', []):
+                self._convert(report, source, 'vg', row, lambda r: report.volume_groups.append(
+                    VolumeGroup(
+                        vg_name=r['vg_name'],
+                        vg_uuid=r.get('vg_uuid', ''),
+                        vg_size=self._int(r['vg_size']) or 0,
+                        vg_free=self._int(r['vg_free']) or 0,
+                        pv_count=self._int(r.get('pv_count')) or 0,
+                        lv_count=self._int(r.get('lv_count')) or 0,
+                        extent_size=self._int(r.get('vg_extent_size')),
+                        extent_count=self._int(r.get('vg_extent_count')),
+                        free_count=self._int(r.get('vg_free_count'))
+                    )))
+            for row in entry.get('lv', []):
+                self._convert(report, source, 'lv', row, lambda r: report.logical_volumes.append(
+                    LogicalVolume(
+                        lv_name=r['lv_name'],
+                        vg_name=r['vg_name'],
+                        lv_uuid=r.get('lv_uuid', ''),
+                        lv_attr=r.get('lv_attr', ''),
+                        lv_size=self._int(r['lv_size']) or 0,
+                        layout=[p for p in r.get('lv_layout', '').split(',') if p],
+                        pool_lv=r.get('pool_lv') or None,
+                        data_percent=self._float(r.get('data_percent')),
+                        metadata_percent=self._float(r.get('metadata_percent'))
+                    )))
+            for row in entry.get('seg', []):
+                self._convert(report, source, 'seg', row, lambda r: report.segments.append(
+                    LVSegment(
+                        lv_uuid=r['lv_uuid'],
+                        segtype=r.get('segtype', ''),
+                        stripes=self._int(r.get('stripes')),
+                        seg_start=self._int(r.get('seg_start')) or 0,
+                        seg_size=self._int(r.get('seg_size')) or 0,
+                        devices=[d for d in r.get('devices', '').split(',') if d]
+                    )))
+
+        # Segments may arrive in a different report than their LVs
+        by_lv: Dict[str, List[LVSegment]] = {}
+        for seg in report.segments:
+            by_lv.setdefault(seg.lv_uuid, []).append(seg)
+        for lv in report.logical_volumes:
+            lv.segments = by_lv.get(lv.lv_uuid, [])
+
+    @staticmethod
+    def _convert(report: LVMReport, source: str, kind: str, row: Dict, build):
+        try:
+            build(row)
+        except (KeyError, ValueError, TypeError, AttributeError) as e:
+            report.errors.append(f"{source}: skipped {kind} row ({type(e).__name__}: {e})")
+
+class MetadataCache:
+    """
+    Device and LVM metadata shared between invocations, kept in /run.
+
+    Each entry is a small JSON file stamped with the cache VERSION, the time
+    it was written and a topology key: the udev event sequence number, a
+    checksum of the mount table and the mtime of /etc/lvm/backup. An entry
+    is used only while it is younger than `ttl` and the key still matches,
+    so a device event, a mount or unmount, or an LVM metadata change forces
+    a fresh read. Usage figures in a cached entry are at most `ttl` old.
+    """
+
+    VERSION = 1
+
+    def __init__(self, directory: str, ttl: float = 10.0, sys_root: str = "/sys",
+                 proc_root: str = "/proc", lvm_backup: str = "/etc/lvm/backup"):
+        self.directory = directory
+        self.ttl = ttl
+        self.seqnum_path = os.path.join(sys_root, "kernel", "uevent_seqnum")
+        self.mountinfo_path = os.path.join(proc_root, "self", "mountinfo")
+        self.lvm_backup = lvm_backup
+
+    @staticmethod
+    def default_directory() -> Optional[str]:
+        if os.geteuid() == 0:
+            return "/run/storage-manager"
+        runtime = os.environ.get('XDG_RUNTIME_DIR')
+        return os.path.join(runtime, "storage-manager") if runtime else None
+
+    def topology_key(self) -> List:
+        import zlib
+        key = []
+        # procfs mtimes are the reader's process start time, so the mount table is checksummed
+        for path, read in ((self.seqnum_path, lambda data: data.strip().decode()),
+                           (self.mountinfo_path, zlib.crc32)):
+            try:
+                with open(path, 'rb') as f:
+                    key.append(read(f.read()))
+            except OSError:
+                key.append(None)
+        try:
+            key.append(os.stat(self.lvm_backup).st_mtime_ns)
+        except OSError:
+            key.append(None)
+        return key
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.json")
+
+    def load(self, name: str, key: List) -> Optional[Dict]:
+        try:
+            with open(self._path(name)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (not isinstance(entry, dict) or entry.get('version') != self.VERSION
+                or not 0 <= time.time() - entry.get('created', 0) < self.ttl
+                or entry.get('key') != key):
+            return None
+        return entry.get('value')
+
+    def store(self, name: str, value: Dict, key: List):
+        # key is taken before the data is read, so a change during the read invalidates the entry
+        entry = {'version': self.VERSION, 'created': time.time(), 'key': key, 'value': value}
+        path = self._path(name)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+@dataclass
+class SpaceUsage:
+    path: str
+    size: int
+    is_dir: bool
+
+@dataclass
+class ScanResult:
+    path: str
+    total: int = 0
+    items: List[SpaceUsage] = field(default_factory=list)
+    files: int = 0
+    dirs: int = 0
+    errors: int = 0
+    reused: int = 0
+
+@dataclass
+class DirRecord:
+    mtime_ns: int
+    ctime_ns: int
+    own_bytes: int
+    files: int
+    subdirs: List[bytes]
+    links: List[Tuple[int, int, int]]
+
+class ScanIndex:
+    """
+    On-disk cache of per-directory scan results, keyed by path.
+
+    A record holds the directory's mtime/ctime, the bytes of its singly
+    linked files, the names of its subdirectories and the (dev, ino, size)
+    of its multiply linked files. When mtime and ctime are unchanged on the
+    next scan the directory does not need to be listed again. Files that
+    grow in place or gain hard links elsewhere do not touch their directory,
+    so such changes are only picked up once the directory itself changes or
+    a full rescan is run.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS dirs (
+            path BLOB PRIMARY KEY,
+            mtime_ns INTEGER NOT NULL,
+            ctime_ns INTEGER NOT NULL,
+            own_bytes INTEGER NOT NULL,
+            files INTEGER NOT NULL,
+            subdirs BLOB NOT NULL,
+            links TEXT NOT NULL
+        )
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+
+    def _connect(self) -> 'sqlite3.Connection':
+        import sqlite3
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute(self.SCHEMA)
+        return conn
+
+    @staticmethod
+    def _bounds(root: str) -> Tuple[bytes, bytes]:
+        prefix = os.fsencode(root.rstrip('/') + '/')
+        # '0' is the byte after '/', so this selects everything below root
+        return prefix, prefix[:-1] + b'0'
+
+    def load(self, root: str) -> Dict[bytes, DirRecord]:
+        low, high = self._bounds(root)
+        records = {}
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT path, mtime_ns, ctime_ns, own_bytes, files, subdirs, links "
+                "FROM dirs WHERE path >= ? AND path < ?", (low, high))
+            for path, mtime_ns, ctime_ns, own_bytes, files, subdirs, links in rows:
+                records[bytes(path)] = DirRecord(
+                    mtime_ns=mtime_ns,
+                    ctime_ns=ctime_ns,
+                    own_bytes=own_bytes,
+                    files=files,
+                    subdirs=bytes(subdirs).split(b'/') if subdirs else [],
+                    links=[tuple(link) for link in json.loads(links)]
+                )
+        finally:
+            conn.close()
+        return records
+
+    def save(self, root: str, records: Dict[bytes, DirRecord]):
+        low, high = self._bounds(root)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM dirs WHERE path >= ? AND path < ?", (low, high))
+                conn.executemany(
+                    "INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    ((path, rec.mtime_ns, rec.ctime_ns, rec.own_bytes, rec.files,
+                      b'/'.join(rec.subdirs), json.dumps(rec.links))
+                     for path, rec in records.items())
+                )
+        finally:
+            conn.close()
+
+class _ScanQueue(queue.LifoQueue):
+    """
+    Work queue that also counts outstanding directories per bucket.
+
+    Last in, first out, so workers go depth first and the directories
+    waiting in the queue stay proportional to the depth of the tree rather
+    than its width.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.pending: Dict[str, int] = {}
+
+    def _put(self, item):
+        # Called by put() with self.mutex held
+        if item is not None:
+            self.pending[item[1]] = self.pending.get(item[1], 0) + 1
+        super()._put(item)
+
+class ScanThrottle:
+    """
+    Keeps a scan out of the way of production I/O (analyze --polite).
+
+    apply_priority() puts the calling thread, and every thread it starts
+    afterwards, at nice 19 and in the idle I/O class. The idle class only
+    has an effect under the BFQ scheduler, so the scanner also paces itself:
+    wait() is called before each directory is read and spaces reads out to
+    at most max_rate per second across all workers. Once a second the
+    stall time in /proc/pressure/io is checked; while tasks spend more than
+    stall_percent of the time waiting on I/O the rate is halved, and it
+    recovers by a quarter per second once pressure drops.
+    """
+
+    # ioprio_set(2) has no libc wrapper
+    IOPRIO_SYSCALLS = {'x86_64': 251, 'i386': 289, 'i686': 289, 'aarch64': 30, 'riscv64': 30,
+                       'armv7l': 314, 'ppc64le': 273, 's390x': 282}
+    IOPRIO_CLASS_IDLE = 3
+    IOPRIO_CLASS_SHIFT = 13
+
+    def __init__(self, max_rate: float = 200.0, stall_percent: float = 10.0,
+                 min_rate: float = 1.0, pressure_path: str = "/proc/pressure/io"):
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate)
+        self.rate = max_rate
+        self.stall_percent = stall_percent
+        self.pressure_path = pressure_path
+        self.backoffs = 0
+        self._lock = threading.Lock()
+        self._next = 0.0
+        self._checked = time.monotonic()
+        self._stall_total = self._read_stall_total()
+
+    def apply_priority(self) -> bool:
+        os.setpriority(os.PRIO_PROCESS, 0, 19)
+        value = self.IOPRIO_CLASS_IDLE << self.IOPRIO_CLASS_SHIFT
+        nr = self.IOPRIO_SYSCALLS.get(os.uname().machine)
+        if nr is not None:
+            import ctypes
+            libc = ctypes.CDLL(None, use_errno=True)
+            # IOPRIO_WHO_PROCESS with id 0 is the calling thread
+            if libc.syscall(nr, 1, 0, value) == 0:
+                return True
+        import subprocess
+        try:
+            return subprocess.run(['ionice', '-c', '3', '-p', str(threading.get_native_id())],
+                                  capture_output=True).returncode == 0
+        except OSError:
+            return False
+
+    def _read_stall_total(self) -> Optional[int]:
+        try:
+            with open(self.pressure_path) as f:
+                line = f.readline()
+        except OSError:
+            return None
+        for item in line.split()[1:]:
+            key, _, value = item.partition('=')
+            if key == 'total':
+                return int(value)
+        return None
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._checked >= 1.0:
+                total = self._read_stall_total()
+                if total is not None and self._stall_total is not None:
+                    # "some" total is cumulative stall time in microseconds
+                    stalled = (total - self._stall_total) / ((now - self._checked) * 1e4)
+                    if stalled >= self.stall_percent:
+                        self.rate = max(self.min_rate, self.rate / 2)
+                        self.backoffs += 1
+                    else:
+                        self.rate = min(self.max_rate, self.rate * 1.25)
+                self._stall_total = total
+                self._checked = now
+            slot = max(now, self._next)
+            self._next = slot + 1.0 / self.rate
+        if slot > now:
+            time.sleep(slot - now)
+
+class DirectoryScanner:
+    """
+    Parallel du-style walker built on os.scandir.
+
+    Sizes are allocated bytes (st_blocks * 512). Directories are handed out
+    to a pool of threads through a shared queue so that one large subtree
+    does not serialise the scan, and every inode with more than one link is
+    only counted the first time it is seen. With a ScanIndex, directories
+    whose mtime/ctime match the index are not listed again.
+
+    Visitors see every file during the same pass. A visitor provides
+    fork(), which returns a per-thread copy with visit(bucket, path, st,
+    size), and merge(), which folds that copy back in when its thread
+    finishes. Visitors need every file, so they disable reuse of the
+    scan index. An optional ScanThrottle paces directory reads.
+
+    scan() can also take an on_entry callback. It is called from the worker
+    threads with each top-level SpaceUsage as soon as that entry's subtree
+    is complete, so results can be streamed before the whole scan ends.
+
+    Unreadable entries are counted in ScanResult.errors. Any other
+    exception raised on a worker (from a visitor or on_entry, say) stops
+    the walk and is re-raised by scan() once the workers have finished.
+
+    Per-directory records are only kept when there is an index to save
+    them to, so memory does not grow with the number of directories.
+    """
+
+    def __init__(self, workers: Optional[int] = None, index: Optional[ScanIndex] = None,
+                 full_rescan: bool = False, visitors: Optional[List] = None,
+                 throttle: Optional[ScanThrottle] = None):
+        self.workers = workers or min(32, (os.cpu_count() or 1) * 4)
+        self.index = index
+        self.full_rescan = full_rescan
+        self.visitors = visitors or []
+        self.throttle = throttle
+        self._seen_lock = threading.Lock()
+        self._seen = set()
+        self._cached: Dict[bytes, DirRecord] = {}
+
+    def scan(self, root: str, on_entry=None) -> ScanResult:
+        root = os.path.abspath(root)
+        result = ScanResult(path=root)
+        self._seen = set()
+        self._cached = {}
+        if self.index and not self.full_rescan and not self.visitors:
+            self._cached = self.index.load(root)
+
+        st = os.lstat(root)
+        result.total = self._allocated(st)
+        if not stat.S_ISDIR(st.st_mode):
+            result.files = 1
+            result.items.append(SpaceUsage(root, result.total, False))
+            return result
+        result.dirs = 1
+
+        tasks = _ScanQueue()
+        buckets: Dict[str, int] = {}
+        kinds: Dict[str, bool] = {}
+        records: Dict[bytes, DirRecord] = {}
+
+        try:
+            entries = list(os.scandir(root))
+        except OSError:
+            result.errors += 1
+            entries = []
+
+        for entry in entries:
+            try:
+                est = entry.stat(follow_symlinks=False)
+            except OSError:
+                result.errors += 1
+                continue
+            is_dir = stat.S_ISDIR(est.st_mode)
+            kinds[entry.path] = is_dir
+            if is_dir:
+                result.dirs += 1
+                buckets[entry.path] = self._allocated(est)
+                tasks.put((entry.path, entry.path, self._stamp(est)))
+            else:
+                result.files += 1
+                size = self._count_file(est.st_dev, est.st_ino, est.st_nlink, self._allocated(est))
+                buckets[entry.path] = size
+                for visitor in self.visitors:
+                    visitor.visit(entry.path, entry.path, est, size)
+                if on_entry:
+                    on_entry(SpaceUsage(entry.path, size, False))
+
+        merge_lock = threading.Lock()
+        failed: List[Exception] = []
+
+        def worker():
+            local_records: Dict[bytes, DirRecord] = {}
+            local_counts = [0, 0, 0, 0]
+            local_visitors = [visitor.fork() for visitor in self.visitors]
+            while True:
+                item = tasks.get()
+                if item is None:
+                    tasks.task_done()
+                    break
+                path, bucket, stamp = item
+                total = 0
+                # A worker that died would leave its queued directories undone and
+                # tasks.join() waiting forever, so failures are kept for scan() instead
+                try:
+                    if not failed:
+                        total = self._visit_dir(path, bucket, stamp, tasks, local_records,
+                                                local_counts, local_visitors)
+                except Exception as e:
+                    failed.append(e)
+                with tasks.mutex:
+                    buckets[bucket] += total
+                    tasks.pending[bucket] -= 1
+                    finished = tasks.pending[bucket] == 0
+                try:
+                    if finished and on_entry and not failed:
+                        on_entry(SpaceUsage(bucket, buckets[bucket], True))
+                except Exception as e:
+                    failed.append(e)
+                tasks.task_done()
+            with merge_lock:
+                records.update(local_records)
+                result.files += local_counts[0]
+                result.dirs += local_counts[1]
+                result.errors += local_counts[2]
+                result.reused += local_counts[3]
+                for visitor, local in zip(self.visitors, local_visitors):
+                    visitor.merge(local)
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(self.workers)]
+        for t in threads:
+            t.start()
+        tasks.join()
+        for _ in threads:
+            tasks.put(None)
+        for t in threads:
+            t.join()
+        if failed:
+            raise failed[0]
+
+        for path, size in buckets.items():
+            result.total += size
+            result.items.append(SpaceUsage(path, size, kinds[path]))
+        result.items.sort(key=lambda item: item.size, reverse=True)
+
+        if self.index:
+            self.index.save(root, records)
+        return result
+
+    def _visit_dir(self, path: str, bucket: str, stamp: Optional[Tuple[int, int]], tasks: queue.Queue,
+                   records: Dict[bytes, DirRecord], counts: List[int], visitors: List) -> int:
+        key = os.fsencode(path)
+        cached = self._cached.get(key)
+        if cached and (cached.mtime_ns, cached.ctime_ns) == stamp:
+            total = self._reuse_dir(path, bucket, cached, tasks, counts)
+            records[key] = cached
+            counts[3] += 1
+        else:
+            total, record = self._scan_dir(path, bucket, tasks, counts, visitors)
+            if record is not None:
+                record.mtime_ns, record.ctime_ns = stamp
+                records[key] = record
+        return total
+
+    def _reuse_dir(self, path: str, bucket: str, cached: DirRecord,
+                   tasks: queue.Queue, counts: List[int]) -> int:
+        total = cached.own_bytes
+        counts[0] += cached.files
+        for dev, ino, size in cached.links:
+            total += self._count_file(dev, ino, 2, size)
+        base = os.fsencode(path)
+        for name in cached.subdirs:
+            sub = os.fsdecode(base + b'/' + name)
+            try:
+                sst = os.lstat(sub)
+            except OSError:
+                counts[2] += 1
+                continue
+            if stat.S_ISDIR(sst.st_mode):
+                counts[1] += 1
+                total += self._allocated(sst)
+                tasks.put((sub, bucket, self._stamp(sst)))
+        return total
+
+    def _scan_dir(self, path: str, bucket: str, tasks: queue.Queue, counts: List[int],
+                  visitors: List) -> Tuple[int, Optional[DirRecord]]:
+        if self.throttle:
+            self.throttle.wait()
+        total = 0
+        record = DirRecord(0, 0, 0, 0, [], []) if self.index else None
+        complete = True
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        st = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        counts[2] += 1
+                        complete = False
+                        continue
+                    size = self._allocated(st)
+                    if stat.S_ISDIR(st.st_mode):
+                        counts[1] += 1
+                        total += size
+                        if record is not None:
+                            record.subdirs.append(os.fsencode(entry.name))
+                        tasks.put((entry.path, bucket, self._stamp(st)))
+                        continue
+                    counts[0] += 1
+                    if record is not None:
+                        record.files += 1
+                        if st.st_nlink > 1:
+                            record.links.append((st.st_dev, st.st_ino, size))
+                        else:
+                            record.own_bytes += size
+                    counted = self._count_file(st.st_dev, st.st_ino, st.st_nlink, size)
+                    total += counted
+                    for visitor in visitors:
+                        visitor.visit(bucket, entry.path, st, counted)
+        except OSError:
+            counts[2] += 1
+            return total, None
+        return total, record if complete else None
+
+    def _count_file(self, dev: int, ino: int, nlink: int, size: int) -> int:
+        if nlink > 1:
+            key = (dev, ino)
+            with self._seen_lock:
+                if key in self._seen:
+                    return 0
+                self._seen.add(key)
+        return size
+
+    def _stamp(self, st: os.stat_result) -> Optional[Tuple[int, int]]:
+        # Queued directories carry only what the index compares, and nothing without one
+        return (st.st_mtime_ns, st.st_ctime_ns) if self.index else None
+
+    @staticmethod
+    def _allocated(st: os.stat_result) -> int:
+        return st.st_blocks * 512
+
+@dataclass
+class Forecast:
+    mountpoint: str
+    samples: int
+    used: int
+    avail: int
+    rate: float
+    seconds_to_full: Optional[float]
+
+class CapacityHistory:
+    """
+    Append-only usage history, one file per mount.
+
+    Every sample is three native uint64 values (unix time, used bytes,
+    available bytes), so a file is read back with a single
+    array.fromfile call. When a file grows past max_records, samples older
+    than full_resolution seconds are thinned to one per hour, and if that
+    is not enough the oldest samples are dropped.
+    """
+
+    RECORD = 3
+
+    def __init__(self, directory: str, max_records: int = 200000,
+                 full_resolution: float = 7 * 86400):
+        self.directory = directory
+        self.max_records = max_records
+        self.full_resolution = full_resolution
+
+    def _path(self, mountpoint: str) -> str:
+        from urllib.parse import quote
+        return os.path.join(self.directory, quote(mountpoint, safe='') + '.bin')
+
+    def mounts(self) -> List[str]:
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        from urllib.parse import unquote
+        return sorted(unquote(name[:-4]) for name in names if name.endswith('.bin'))
+
+    def append(self, mountpoint: str, timestamp: float, used: int, avail: int):
+        path = self._path(mountpoint)
+        record = array('Q', [int(timestamp), used, avail])
+        while True:
+            with open(path, 'ab') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                # compact() may have replaced the file while we waited for the lock
+                if os.fstat(f.fileno()).st_ino != os.stat(path).st_ino:
+                    continue
+                record.tofile(f)
+                size = f.tell()
+                break
+        if size // (record.itemsize * self.RECORD) > self.max_records:
+            self.compact(mountpoint)
+
+    def load(self, mountpoint: str, since: Optional[float] = None) -> array:
+        data = array('Q')
+        path = self._path(mountpoint)
+        try:
+            with open(path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                # Ignore a trailing partial record from an interrupted write
+                count = size // data.itemsize
+                data.fromfile(f, count - count % self.RECORD)
+        except OSError:
+            return data
+        if since is not None:
+            times = data[0::self.RECORD]
+            start = bisect.bisect_left(times, int(since))
+            data = data[start * self.RECORD:]
+        return data
+
+    def compact(self, mountpoint: str, now: Optional[float] = None):
+        import tempfile
+        path = self._path(mountpoint)
+        cutoff = (now or time.time()) - self.full_resolution
+        while True:
+            with open(path, 'rb+') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                # Another compact() may have replaced the file while we waited for the lock
+                locked, current = os.fstat(f.fileno()), os.stat(path)
+                if (locked.st_dev, locked.st_ino) != (current.st_dev, current.st_ino):
+                    continue
+                data = array('Q')
+                count = locked.st_size // data.itemsize
+                data.fromfile(f, count - count % self.RECORD)
+
+                kept = array('Q')
+                last_hour = None
+                for i in range(0, len(data), self.RECORD):
+                    ts = data[i]
+                    if ts < cutoff:
+                        hour = ts // 3600
+                        if hour == last_hour:
+                            continue
+                        last_hour = hour
+                    kept.extend(data[i:i + self.RECORD])
+
+                # Leave headroom so the next compaction is not one append away
+                limit = self.max_records * 3 // 4 * self.RECORD
+                if len(kept) > limit:
+                    kept = kept[len(kept) - limit:]
+
+                fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.compact-', suffix='.tmp')
+                try:
+                    with os.fdopen(fd, 'wb') as out:
+                        kept.tofile(out)
+                    os.replace(tmp_path, path)
+                except BaseException:
+                    try:
+                        os.unlink(tmp_path)
+                    except OSError:
+                        pass
+                    raise
+                return
+
+    def forecast(self, mountpoint: str, window: float) -> Optional[Forecast]:
+        data = self.load(mountpoint, since=time.time() - window)
+        n = len(data) // self.RECORD
+        if n == 0:
+            return None
+        times = data[0::self.RECORD]
+        used = data[1::self.RECORD]
+        last_used, last_avail = used[-1], data[-1]
+        rate = 0.0
+        if n >= 2:
+            # Least-squares slope of used bytes over time
+            t0 = times[0]
+            mean_t = sum(t - t0 for t in times) / n
+            mean_u = sum(used) / n
+            var = sum((t - t0 - mean_t) ** 2 for t in times)
+            if var > 0:
+                rate = sum((t - t0 - mean_t) * (u - mean_u) for t, u in zip(times, used)) / var
+        seconds = last_avail / rate if rate > 0 else None
+        return Forecast(mountpoint, n, last_used, last_avail, rate, seconds)
+
+@dataclass
+class FileEntry:
+    path: str
+    size: int
+    uid: int
+    mtime: float
+
+class LargestFiles:
+    """
+    Scan visitor keeping the N largest files in a bounded min-heap.
+
+    Each worker keeps its own heap of at most N entries and the heaps are
+    merged at the end, so memory stays O(N * workers) however many files
+    are walked. Extra hard links to an inode already counted arrive with
+    size 0 and are ignored.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._heap: List[Tuple[int, str, int, float]] = []
+
+    def fork(self) -> 'LargestFiles':
+        return LargestFiles(self.limit)
+
+    def visit(self, bucket: str, path: str, st: os.stat_result, size: int):
+        if size <= 0:
+            return
+        if len(self._heap) < self.limit:
+            heapq.heappush(self._heap, (size, path, st.st_uid, st.st_mtime))
+        elif size > self._heap[0][0]:
+            heapq.heappushpop(self._heap, (size, path, st.st_uid, st.st_mtime))
+
+    def merge(self, other: 'LargestFiles'):
+        for item in other._heap:
+            if len(self._heap) < self.limit:
+                heapq.heappush(self._heap, item)
+            elif item[0] > self._heap[0][0]:
+                heapq.heappushpop(self._heap, item)
+
+    def results(self) -> List[FileEntry]:
+        return [FileEntry(path, size, uid, mtime)
+                for size, path, uid, mtime in sorted(self._heap, reverse=True)]
+
+class AgeHistogram:
+    """
+    Scan visitor building cold-data histograms per top-level entry.
+
+    For every bucket it adds up bytes by days since last modification,
+    days since last access, and file size class. The histograms are
+    filled during the same pass as the size totals, so no second walk
+    is needed.
+    """
+
+    AGE_DAYS = [30, 90, 365]
+    AGE_LABELS = ['<30d', '30-90d', '90-365d', '>365d']
+    SIZE_LIMITS = [1024 ** 2, 100 * 1024 ** 2, 1024 ** 3]
+    SIZE_LABELS = ['<1M', '1M-100M', '100M-1G', '>1G']
+
+    def __init__(self, now: Optional[float] = None):
+        self.now = now or time.time()
+        self._age_limits = [self.now - days * 86400 for days in self.AGE_DAYS]
+        self.buckets: Dict[str, Dict[str, List[int]]] = {}
+
+    def fork(self) -> 'AgeHistogram':
+        return AgeHistogram(self.now)
+
+    def new_bucket(self) -> Dict[str, List[int]]:
+        return {'mtime': [0] * 4, 'atime': [0] * 4, 'size': [0] * 4, 'size_count': [0] * 4}
+
+    def _age_class(self, timestamp: float) -> int:
+        # Newest first: index 0 is younger than 30 days
+        for i, limit in enumerate(self._age_limits):
+            if timestamp >= limit:
+                return i
+        return 3
+
+    def visit(self, bucket: str, path: str, st: os.stat_result, size: int):
+        if not size:
+            return
+        hist = self.buckets.get(bucket)
+        if hist is None:
+            hist = self.buckets[bucket] = self.new_bucket()
+        hist['mtime'][self._age_class(st.st_mtime)] += size
+        hist['atime'][self._age_class(st.st_atime)] += size
+        size_class = bisect.bisect_right(self.SIZE_LIMITS, st.st_size)
+        hist['size'][size_class] += size
+        hist['size_count'][size_class] += 1
+
+    def merge(self, other: 'AgeHistogram'):
+        for bucket, hist in other.buckets.items():
+            mine = self.buckets.get(bucket)
+            if mine is None:
+                self.buckets[bucket] = hist
+                continue
+            for key, values in hist.items():
+                mine[key] = [a + b for a, b in zip(mine[key], values)]
+
+class SizeGroups:
+    """
+    Scan visitor that groups regular files by apparent size.
+
+    A size seen once is stored as a single path; a list is only built when
+    a second file of that size turns up, which is the only case where the
+    duplicate finder needs to read anything.
+    """
+
+    def __init__(self, min_size: int = 1):
+        self.min_size = min_size
+        self.sizes: Dict[int, object] = {}
+
+    def fork(self) -> 'SizeGroups':
+        return SizeGroups(self.min_size)
+
+    def _add(self, size: int, paths):
+        current = self.sizes.get(size)
+        if current is None:
+            self.sizes[size] = paths
+            return
+        if not isinstance(current, list):
+            current = self.sizes[size] = [current]
+        if isinstance(paths, list):
+            current.extend(paths)
+        else:
+            current.append(paths)
+
+    def visit(self, bucket: str, path: str, st: os.stat_result, size: int):
+        # size is 0 for additional links to an inode that was already seen
+        if size and stat.S_ISREG(st.st_mode) and st.st_size >= self.min_size:
+            self._add(st.st_size, path)
+
+    def merge(self, other: 'SizeGroups'):
+        for size, paths in other.sizes.items():
+            self._add(size, paths)
+
+    def collisions(self) -> Dict[int, List[str]]:
+        return {size: paths for size, paths in self.sizes.items() if isinstance(paths, list)}
+
+@dataclass
+class DuplicateGroup:
+    size: int
+    digest: str
+    paths: List[str]
+
+    @property
+    def reclaimable(self) -> int:
+        return self.size * (len(self.paths) - 1)
+
+class DuplicateFinder:
+    """
+    Staged duplicate detection over files that share a size.
+
+    Stage one hashes only the first and last `edge` bytes of each file;
+    files whose edges differ cannot be duplicates. Files larger than the
+    two edges then get a full hash read through mmap. Hashing runs in a
+    thread pool (hashlib releases the GIL on large buffers), and files of a
+    unique size are never opened.
+    """
+
+    CHUNK = 8 * 1024 * 1024
+
+    def __init__(self, workers: Optional[int] = None, edge: int = 64 * 1024):
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self.edge = edge
+        self.bytes_read = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def _account(self, nbytes: int):
+        with self._lock:
+            self.bytes_read += nbytes
+
+    def _edge_hash(self, path: str, size: int) -> Optional[str]:
+        import hashlib
+        digest = hashlib.blake2b(digest_size=16)
+        try:
+            with open(path, 'rb') as f:
+                head = f.read(self.edge)
+                digest.update(head)
+                read = len(head)
+                if size > self.edge:
+                    f.seek(max(self.edge, size - self.edge))
+                    tail = f.read(self.edge)
+                    digest.update(tail)
+                    read += len(tail)
+        except OSError:
+            with self._lock:
+                self.errors += 1
+            return None
+        self._account(read)
+        return digest.hexdigest()
+
+    def _full_hash(self, path: str, size: int) -> Optional[str]:
+        import hashlib
+        digest = hashlib.blake2b(digest_size=32)
+        try:
+            with open(path, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    view = memoryview(mapped)
+                    try:
+                        for offset in range(0, len(mapped), self.CHUNK):
+                            digest.update(view[offset:offset + self.CHUNK])
+                    finally:
+                        view.release()
+        except (OSError, ValueError):
+            with self._lock:
+                self.errors += 1
+            return None
+        self._account(size)
+        return digest.hexdigest()
+
+    def _regroup(self, pool: 'ThreadPoolExecutor', groups: List[Tuple[int, List[str]]],
+                 hasher) -> List[Tuple[int, str, List[str]]]:
+        jobs = [(size, path) for size, paths in groups for path in paths]
+        digests = pool.map(lambda job: hasher(job[1], job[0]), jobs)
+        buckets: Dict[Tuple[int, str], List[str]] = {}
+        for (size, path), digest in zip(jobs, digests):
+            if digest is not None:
+                buckets.setdefault((size, digest), []).append(path)
+        return [(size, digest, paths) for (size, digest), paths in buckets.items()
+                if len(paths) > 1]
+
+    def find(self, collisions: Dict[int, List[str]]) -> List[DuplicateGroup]:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            candidates = self._regroup(pool, list(collisions.items()), self._edge_hash)
+            # Files no larger than both edges were hashed completely already
+            done = [DuplicateGroup(size, digest, paths) for size, digest, paths in candidates
+                    if size <= 2 * self.edge]
+            remaining = [(size, paths) for size, _, paths in candidates if size > 2 * self.edge]
+            confirmed = self._regroup(pool, remaining, self._full_hash)
+        done.extend(DuplicateGroup(size, digest, paths) for size, digest, paths in confirmed)
+        for group in done:
+            group.paths.sort()
+        done.sort(key=lambda g: g.reclaimable, reverse=True)
+        return done
+
+@dataclass
+class WatchEvent:
+    timestamp: float
+    kind: str
+    target: str
+    message: str
+    value: Optional[float] = None
+
+class StorageWatcher:
+    """
+    Long-running sampler for the watch command.
+
+    Capacity comes from MountUsageCollector and device state from the size
+    and ro attributes in /sys/class/block, so no process is forked per
+    sample. mountinfo is only re-parsed when the kernel flags a change to
+    the mount table through poll(). The last `history` samples of every
+    mount are kept in fixed-size deques, and events are emitted when a
+    mount crosses a threshold or a device appears, disappears, is resized
+    or turns read-only.
+    """
+
+    HYSTERESIS = 1.0
+
+    def __init__(self, interval: float = 10.0, thresholds: Optional[List[float]] = None,
+                 history: int = 360, timeout: float = 2.0, emit=None,
+                 sys_root: str = "/sys", mountinfo_path: str = "/proc/self/mountinfo",
+                 capacity_history: Optional[CapacityHistory] = None):
+        self.interval = interval
+        self.thresholds = sorted(thresholds or [90.0])
+        self.history_size = history
+        self.emit = emit or self._print_event
+        self.block_dir = os.path.join(sys_root, "class", "block")
+        self.mountinfo_path = mountinfo_path
+        self.collector = MountUsageCollector(mountinfo_path, timeout=timeout)
+        self.capacity_history = capacity_history
+        self.history: Dict[str, deque] = {}
+        self._levels: Dict[str, int] = {}
+        self._devices: Optional[Dict[str, Tuple[str, str]]] = None
+        self._mounts: Optional[List[MountEntry]] = None
+        self._mountinfo = None
+        self._poller = None
+        self._stop = threading.Event()
+
+    @staticmethod
+    def _print_event(event: WatchEvent):
+        stamp = datetime.fromtimestamp(event.timestamp).strftime('%Y-%m-%d %H:%M:%S')
+        print(f"{stamp} {event.kind:<16} {event.target} {event.message}", flush=True)
+
+    def stop(self, *_):
+        self._stop.set()
+
+    def _refresh_mounts(self) -> List[MountEntry]:
+        if self._poller is None:
+            self._mountinfo = open(self.mountinfo_path)
+            self._poller = select.poll()
+            self._poller.register(self._mountinfo, select.POLLPRI | select.POLLERR)
+        if self._mounts is None or self._poller.poll(0):
+            # Reading the file to EOF re-arms the change notification
+            self._mountinfo.seek(0)
+            self._mountinfo.read()
+            self._mounts = self.collector.mounts()
+        return self._mounts
+
+    def _read_devices(self) -> Dict[str, Tuple[str, str]]:
+        devices = {}
+        try:
+            names = os.listdir(self.block_dir)
+        except OSError:
+            return devices
+        for name in names:
+            base = os.path.join(self.block_dir, name)
+            try:
+                with open(os.path.join(base, "size")) as f:
+                    size = f.read().strip()
+                with open(os.path.join(base, "ro")) as f:
+                    ro = f.read().strip()
+            except OSError:
+                continue
+            devices[name] = (size, ro)
+        return devices
+
+    def _device_events(self, now: float) -> List[WatchEvent]:
+        current = self._read_devices()
+        previous, self._devices = self._devices, current
+        if previous is None:
+            return []
+        events = []
+        for name in current.keys() - previous.keys():
+            events.append(WatchEvent(now, 'device-added', f"/dev/{name}", "appeared"))
+        for name in previous.keys() - current.keys():
+            events.append(WatchEvent(now, 'device-removed', f"/dev/{name}", "disappeared"))
+        for name in current.keys() & previous.keys():
+            (old_size, old_ro), (size, ro) = previous[name], current[name]
+            if size != old_size:
+                events.append(WatchEvent(
+                    now, 'device-resized', f"/dev/{name}",
+                    f"{format_lsblk_size(int(old_size) * 512)} -> {format_lsblk_size(int(size) * 512)}"))
+            if ro != old_ro:
+                state = 'read-only' if ro == '1' else 'read-write'
+                events.append(WatchEvent(now, 'device-readonly', f"/dev/{name}", f"is now {state}"))
+        return events
+
+    def _mount_events(self, now: float) -> List[WatchEvent]:
+        events = []
+        seen = set()
+        for usage in self.collector.collect(self._refresh_mounts()):
+            if usage.error:
+                if usage.error == 'timeout' and self._levels.get(usage.mountpoint) != -1:
+                    events.append(WatchEvent(now, 'mount-timeout', usage.mountpoint,
+                                             f"statvfs did not answer within {self.collector.timeout}s"))
+                    self._levels[usage.mountpoint] = -1
+                continue
+            if usage.total == 0:
+                continue
+            seen.add(usage.mountpoint)
+            samples = self.history.get(usage.mountpoint)
+            if samples is None:
+                samples = self.history[usage.mountpoint] = deque(maxlen=self.history_size)
+            samples.append((now, usage.used, usage.avail))
+            if self.capacity_history and usage.fstype != 'devtmpfs':
+                self.capacity_history.append(usage.mountpoint, now, usage.used, usage.avail)
+
+            percent = usage.used * 100.0 / max(1, usage.used + usage.avail)
+            previous = max(0, self._levels.get(usage.mountpoint, 0))
+            level = previous
+            while level < len(self.thresholds) and percent >= self.thresholds[level]:
+                level += 1
+            while level > 0 and percent < self.thresholds[level - 1] - self.HYSTERESIS:
+                level -= 1
+            if level > previous:
+                events.append(WatchEvent(now, 'threshold', usage.mountpoint,
+                                         f"{percent:.1f}% used, crossed {self.thresholds[level - 1]:g}%",
+                                         percent))
+            elif level < previous:
+                events.append(WatchEvent(now, 'recovered', usage.mountpoint,
+                                         f"{percent:.1f}% used, below {self.thresholds[previous - 1]:g}%",
+                                         percent))
+            self._levels[usage.mountpoint] = level
+
+        for mountpoint in list(self.history):
+            if mountpoint not in seen and self._levels.get(mountpoint) != -1:
+                del self.history[mountpoint]
+                self._levels.pop(mountpoint, None)
+        return events
+
+    def sample(self) -> List[WatchEvent]:
+        now = time.time()
+        events = self._device_events(now) + self._mount_events(now)
+        for event in events:
+            self.emit(event)
+        return events
+
+    def run(self, count: Optional[int] = None):
+        next_run = time.monotonic()
+        samples = 0
+        try:
+            while not self._stop.is_set():
+                self.sample()
+                samples += 1
+                if count is not None and samples >= count:
+                    break
+                next_run += self.interval
+                self._stop.wait(max(0.0, next_run - time.monotonic()))
+        finally:
+            if self._mountinfo:
+                self._mountinfo.close()
+
+class MetricsExporter:
+    """
+    Renders StorageManager state as Prometheus/OpenMetrics text.
+
+    Collection is cached for `ttl` seconds behind a lock, so scrapes that
+    arrive while a collection is running wait for it and share the result
+    instead of each starting their own lsblk/statvfs/lvm round.
+    """
+
+    OPENMETRICS_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+    TEXT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+    # Seconds between textfile rewrites while also serving HTTP
+    TEXTFILE_INTERVAL = 10.0
+
+    def __init__(self, manager: 'StorageManager', ttl: float = 15.0):
+        self.manager = manager
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._body: Optional[str] = None
+        self._collected_at = 0.0
+
+    @staticmethod
+    def _labels(**labels) -> str:
+        def escape(value) -> str:
+            return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        return ','.join(f'{key}="{escape(value)}"' for key, value in labels.items())
+
+    def _family(self, lines: List[str], name: str, help_text: str,
+                samples: List[Tuple[Dict[str, str], float]]):
+        if not samples:
+            return
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in samples:
+            # repr keeps full precision; byte counts stay exact integers
+            text = repr(value)
+            lines.append(f"{name}{{{self._labels(**labels)}}} {text}" if labels
+                         else f"{name} {text}")
+
+    def _collect_local(self, lines: List[str]) -> int:
+        tree = self.manager.get_device_tree()
+        self._family(lines, 'storage_device_size_bytes', 'Size of the block device.', [
+            ({'device': d.name, 'type': d.type, 'maj_min': d.maj_min or ''}, d.size_bytes)
+            for d in tree.devices if d.size_bytes is not None])
+
+        usages = self.manager.mount_collector.collect()
+        usages = [u for u in usages if u.total > 0 or u.error]
+        ok = [u for u in usages if not u.error]
+
+        def mount_labels(u: MountUsage) -> Dict[str, str]:
+            return {'mountpoint': u.mountpoint, 'device': u.source, 'fstype': u.fstype}
+
+        self._family(lines, 'storage_mount_size_bytes', 'Filesystem size.',
+                     [(mount_labels(u), u.total) for u in ok])
+        self._family(lines, 'storage_mount_used_bytes', 'Filesystem space in use.',
+                     [(mount_labels(u), u.used) for u in ok])
+        self._family(lines, 'storage_mount_avail_bytes', 'Filesystem space available to non-root users.',
+                     [(mount_labels(u), u.avail) for u in ok])
+        self._family(lines, 'storage_mount_up', 'Whether statvfs answered for the mount.',
+                     [(mount_labels(u), 0 if u.error else 1) for u in usages])
+        return sum(1 for u in usages if u.error)
+
+    def collect(self) -> str:
+        started = time.monotonic()
+        lines: List[str] = []
+        errors = 0
+
+        # lvm runs as its own process and shares nothing with the device and mount reads,
+        # so its report is read on a worker while those run here
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            lvm = pool.submit(self.manager.get_lvm_info) if self.manager.check_root_privileges() else None
+            errors += self._collect_local(lines)
+            report = lvm.result() if lvm is not None else None
+
+        if report is not None:
+            errors += len(report.errors)
+            vgs = report.volume_groups
+            self._family(lines, 'storage_vg_size_bytes', 'Volume group size.',
+                         [({'vg': vg.vg_name}, vg.vg_size) for vg in vgs])
+            self._family(lines, 'storage_vg_free_bytes', 'Unallocated space in the volume group.',
+                         [({'vg': vg.vg_name}, vg.vg_free) for vg in vgs])
+            self._family(lines, 'storage_vg_extents', 'Physical extents in the volume group.',
+                         [({'vg': vg.vg_name}, vg.extent_count) for vg in vgs
+                          if vg.extent_count is not None])
+            self._family(lines, 'storage_vg_free_extents', 'Free physical extents in the volume group.',
+                         [({'vg': vg.vg_name}, vg.free_count) for vg in vgs
+                          if vg.free_count is not None])
+            pools = [lv for lv in report.logical_volumes if lv.is_thin_pool]
+            self._family(lines, 'storage_thin_pool_size_bytes', 'Thin pool size.',
+                         [({'vg': lv.vg_name, 'lv': lv.lv_name}, lv.lv_size) for lv in pools])
+            self._family(lines, 'storage_thin_pool_data_ratio', 'Fraction of thin pool data space in use.',
+                         [({'vg': lv.vg_name, 'lv': lv.lv_name}, lv.data_percent / 100)
+                          for lv in pools if lv.data_percent is not None])
+            self._family(lines, 'storage_thin_pool_metadata_ratio',
+                         'Fraction of thin pool metadata space in use.',
+                         [({'vg': lv.vg_name, 'lv': lv.lv_name}, lv.metadata_percent / 100)
+                          for lv in pools if lv.metadata_percent is not None])
+
+        self._family(lines, 'storage_collect_errors', 'Problems hit during the last collection.',
+                     [({}, errors)])
+        self._family(lines, 'storage_collect_duration_seconds', 'Time spent on the last collection.',
+                     [({}, round(time.monotonic() - started, 6))])
+        return '\n'.join(lines) + '\n'
+
+    def render(self, openmetrics: bool = False) -> str:
+        with self._lock:
+            if self._body is None or time.monotonic() - self._collected_at >= self.ttl:
+                self._body = self.collect()
+                self._collected_at = time.monotonic()
+            body = self._body
+        return body + '# EOF\n' if openmetrics else body
+
+    def write_textfile(self, path: str):
+        # node_exporter may read the file at any time, so replace it atomically
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def serve(self, host: str, port: int):
+        exporter = self
+
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                openmetrics = 'application/openmetrics-text' in self.headers.get('Accept', '')
+                body = exporter.render(openmetrics=openmetrics).encode()
+                self.send_response(200)
+                self.send_header('Content-Type',
+                                 exporter.OPENMETRICS_TYPE if openmetrics else exporter.TEXT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+
+@dataclass
+class DeviceIOStats:
+    name: str
+    maj_min: str
+    read_iops: float
+    write_iops: float
+    read_bytes_per_sec: float
+    write_bytes_per_sec: float
+    await_ms: float
+    read_await_ms: float
+    write_await_ms: float
+    queue_depth: float
+    util_percent: float
+
+class DiskStatsSampler:
+    """
+    iostat -x style rates from successive reads of /proc/diskstats.
+
+    A sample is one read of one procfs file plus integer arithmetic on
+    the deltas, with no subprocess and no per-device sysfs access, so it
+    can run every second on a busy host. The first sample() only primes
+    the counters. Devices that have never completed a read or a write
+    (unused loop devices) are left out.
+    """
+
+    SECTOR = 512
+
+    def __init__(self, proc_root: str = "/proc"):
+        self.path = os.path.join(proc_root, "diskstats")
+        self._last: Optional[Tuple[float, Dict[str, Tuple[str, List[int]]]]] = None
+
+    def read(self) -> Dict[str, Tuple[str, List[int]]]:
+        counters = {}
+        with open(self.path) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 14:
+                    continue
+                # reads, merged, sectors, ms, writes, merged, sectors, ms, in flight, io ms, weighted ms
+                counters[f"{fields[0]}:{fields[1]}"] = (fields[2], [int(v) for v in fields[3:14]])
+        return counters
+
+    def sample(self) -> List[DeviceIOStats]:
+        now = time.monotonic()
+        current = self.read()
+        last, self._last = self._last, (now, current)
+        if last is None:
+            return []
+
+        elapsed_ms = (now - last[0]) * 1000.0
+        if elapsed_ms <= 0:
+            return []
+        stats = []
+        for maj_min, (name, values) in current.items():
+            if maj_min not in last[1] or (values[0] == 0 and values[4] == 0):
+                continue
+            # Counters reset when a device is re-created under the same number
+            d = [max(0, b - a) for a, b in zip(last[1][maj_min][1], values)]
+            reads, writes = d[0], d[4]
+            ios = reads + writes
+            per_sec = 1000.0 / elapsed_ms
+            stats.append(DeviceIOStats(
+                name=name,
+                maj_min=maj_min,
+                read_iops=reads * per_sec,
+                write_iops=writes * per_sec,
+                read_bytes_per_sec=d[2] * self.SECTOR * per_sec,
+                write_bytes_per_sec=d[6] * self.SECTOR * per_sec,
+                await_ms=(d[3] + d[7]) / ios if ios else 0.0,
+                read_await_ms=d[3] / reads if reads else 0.0,
+                write_await_ms=d[7] / writes if writes else 0.0,
+                queue_depth=d[10] / elapsed_ms,
+                util_percent=min(100.0, d[9] * 100.0 / elapsed_ms),
+            ))
+        return stats
+
+@dataclass
+class ProcessWriter:
+    pid: int
+    comm: str
+    write_bytes_per_sec: float
+    mountpoints: List[str] = field(default_factory=list)
+
+class ProcessIOSampler:
+    """
+    Ranks processes by bytes written, from /proc/[pid]/io deltas.
+
+    A pass reads just /proc/[pid]/io for every process with bare
+    os.open/os.read calls, which keeps it in the tens of milliseconds
+    on hosts with 10k processes. Walking /proc/[pid]/fd is much more
+    expensive, so it is only done for processes that actually wrote
+    during the window: each regular file they hold open for writing is
+    mapped to a mount by st_dev. Reading other users' /proc/[pid]/io
+    needs root; those processes are skipped otherwise.
+    """
+
+    O_ACCMODE = 0o3
+
+    def __init__(self, mounts: List[MountEntry], proc_root: str = "/proc"):
+        self.proc_root = proc_root
+        self.mounts = {os.makedev(m.major, m.minor): m.mountpoint for m in mounts}
+        self._last: Optional[Tuple[float, Dict[int, int]]] = None
+
+    def read(self) -> Dict[int, int]:
+        counters = {}
+        with os.scandir(self.proc_root) as entries:
+            for entry in entries:
+                if not entry.name.isdigit():
+                    continue
+                try:
+                    fd = os.open(f"{self.proc_root}/{entry.name}/io", os.O_RDONLY)
+                except OSError:
+                    continue
+                try:
+                    data = os.read(fd, 1024)
+                except OSError:
+                    continue
+                finally:
+                    os.close(fd)
+                counters[int(entry.name)] = (self._field(data, b'\nwrite_bytes: ')
+                                             - self._field(data, b'\ncancelled_write_bytes: '))
+        return counters
+
+    @staticmethod
+    def _field(data: bytes, key: bytes) -> int:
+        start = data.find(key)
+        if start < 0:
+            return 0
+        start += len(key)
+        end = data.find(b'\n', start)
+        return int(data[start:end if end >= 0 else None])
+
+    def writable_mounts(self, pid: int) -> List[str]:
+        fd_dir = f"{self.proc_root}/{pid}/fd"
+        found: List[str] = []
+        try:
+            fds = os.listdir(fd_dir)
+        except OSError:
+            return found
+        for name in fds:
+            try:
+                st = os.stat(f"{fd_dir}/{name}")
+            except OSError:
+                continue
+            mountpoint = self.mounts.get(st.st_dev)
+            if mountpoint is None or mountpoint in found or not stat.S_ISREG(st.st_mode):
+                continue
+            try:
+                with open(f"{self.proc_root}/{pid}/fdinfo/{name}", 'rb') as f:
+                    info = f.read()
+                start = info.index(b'flags:') + 6
+                flags = int(info[start:info.index(b'\n', start)], 8)
+            except (OSError, ValueError):
+                continue
+            if flags & self.O_ACCMODE:
+                found.append(mountpoint)
+        return found
+
+    def _comm(self, pid: int) -> str:
+        try:
+            with open(f"{self.proc_root}/{pid}/comm") as f:
+                return f.read().strip()
+        except OSError:
+            return '?'
+
+    def sample(self) -> List[ProcessWriter]:
+        now = time.monotonic()
+        current = self.read()
+        last, self._last = self._last, (now, current)
+        if last is None:
+            return []
+
+        elapsed = now - last[0]
+        writers = []
+        for pid, written in current.items():
+            # A process started during the window has written everything since
+            delta = written - last[1].get(pid, 0)
+            if delta <= 0:
+                continue
+            writers.append(ProcessWriter(pid=pid, comm=self._comm(pid),
+                                         write_bytes_per_sec=delta / elapsed,
+                                         mountpoints=self.writable_mounts(pid)))
+        writers.sort(key=lambda w: w.write_bytes_per_sec, reverse=True)
+        return writers
+
+@dataclass
+class HostResult:
+    host: str
+    ok: bool
+    elapsed: float
+    data: Optional[Dict] = None
+    error: Optional[str] = None
+
+class LocalTransport:
+    """Runs the collector as a local subprocess; the host name is only a label."""
+
+    def command(self, host: str, argv: List[str]) -> List[str]:
+        return argv
+
+class SSHTransport:
+    """Pipes this script to `python3 -` on the target, so nothing has to be installed there."""
+
+    def __init__(self, ssh_options: Optional[List[str]] = None, connect_timeout: int = 10):
+        self.ssh_options = ssh_options or []
+        self.connect_timeout = connect_timeout
+
+    def command(self, host: str, argv: List[str]) -> List[str]:
+        return (['ssh', '-o', 'BatchMode=yes', '-o', f'ConnectTimeout={self.connect_timeout}']
+                + self.ssh_options + [host, '--'] + [shlex.quote(arg) for arg in argv])
+
+FLEET_TRANSPORTS = {'local': LocalTransport, 'ssh': SSHTransport}
+
+class FleetRunner:
+    """
+    Runs one collector on many hosts at once.
+
+    Each host gets its own subprocess (ssh or local) driven by asyncio, at
+    most `concurrency` of them run at a time, and a host that exceeds
+    `timeout` is killed and reported as failed, so the fleet finishes in
+    roughly the time of its slowest responsive host.
+    """
+
+    def __init__(self, transport, concurrency: int = 50, timeout: float = 60.0,
+                 sudo: bool = False, remote_python: str = 'python3'):
+        self.transport = transport
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.sudo = sudo
+        self.remote_python = remote_python
+        with open(os.path.abspath(__file__), 'rb') as f:
+            self.script = f.read()
+
+    def _argv(self, collect_args: List[str]) -> List[str]:
+        if isinstance(self.transport, LocalTransport):
+            argv = [sys.executable, '-']
+        else:
+            argv = [self.remote_python, '-']
+        if self.sudo:
+            argv = ['sudo', '-n'] + argv
+        return argv + ['collect'] + collect_args
+
+    async def _run_host(self, host: str, collect_args: List[str],
+                        semaphore: 'asyncio.Semaphore') -> HostResult:
+        import asyncio
+        async with semaphore:
+            started = time.monotonic()
+            command = self.transport.command(host, self._argv(collect_args))
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                    *command, stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                    start_new_session=True)
+            except OSError as e:
+                return HostResult(host, False, 0.0, error=str(e))
+            try:
+                out, err = await asyncio.wait_for(proc.communicate(self.script), self.timeout)
+            except asyncio.TimeoutError:
+                # Kill the whole group: children holding the pipes would keep wait() blocked
+                try:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                await proc.wait()
+                return HostResult(host, False, time.monotonic() - started,
+                                  error=f"timed out after {self.timeout:g}s")
+            elapsed = time.monotonic() - started
+            if proc.returncode != 0:
+                message = err.decode(errors='replace').strip().splitlines()
+                return HostResult(host, False, elapsed,
+                                  error=message[-1] if message else f"exit code {proc.returncode}")
+            try:
+                return HostResult(host, True, elapsed, data=json.loads(out))
+            except json.JSONDecodeError as e:
+                return HostResult(host, False, elapsed, error=f"invalid collector output ({e})")
+
+    async def _run(self, hosts: List[str], collect_args: List[str]) -> List[HostResult]:
+        import asyncio
+        semaphore = asyncio.Semaphore(self.concurrency)
+        return await asyncio.gather(*(self._run_host(h, collect_args, semaphore) for h in hosts))
+
+    def run(self, hosts: List[str], collect_args: List[str]) -> List[HostResult]:
+        import asyncio
+        return asyncio.run(self._run(hosts, collect_args))
+
+@dataclass
+class BackupRef:
+    device: str
+    created: float
+    digest: str
+    size: int
+
+    @property
+    def device_name(self) -> str:
+        return self.device.split('/')[-1]
+
+class PartitionBackupStore:
+    """
+    Content-addressed store for partition table dumps.
+
+    Each distinct dump is kept once as objects/<xx>/<sha256>.gz, and each
+    backup run appends a small reference (device, time, digest, size) to
+    index.jsonl. Backing up an unchanged table only adds a reference, and
+    listing or looking up backups reads the index without touching the
+    blobs. Files from the old one-file-per-backup layout are still found
+    by name.
+    """
+
+    LEGACY_PATTERN = r'^(?P<name>.+)_partition_table_(?P<ts>\d{8}_\d{6})\.backup$'
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.objects_dir = os.path.join(directory, "objects")
+        self.index_path = os.path.join(directory, "index.jsonl")
+
+    def object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest + '.gz')
+
+    def _lock_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        while True:
+            f = open(self.index_path, 'a+')
+            fcntl.flock(f, fcntl.LOCK_EX)
+            # prune() may have replaced the index while we waited for the lock
+            if os.fstat(f.fileno()).st_ino == os.stat(self.index_path).st_ino:
+                return f
+            f.close()
+
+    def put(self, device: str, content: str, created: Optional[float] = None) -> Tuple[BackupRef, bool]:
+        data = content.encode()
+        import gzip
+        import hashlib
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.object_path(digest)
+        ref = BackupRef(device=device, created=created or time.time(), digest=digest, size=len(data))
+        line = json.dumps(asdict(ref), sort_keys=True) + '\n'
+
+        # Blob and reference are written under the index lock so prune()
+        # never sees a blob whose reference has not been recorded yet
+        with self._lock_index() as index:
+            is_new = not os.path.exists(path)
+            if is_new:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(gzip.compress(data, mtime=0))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, path)
+            index.write(line)
+            index.flush()
+            os.fsync(index.fileno())
+        return ref, is_new
+
+    def write_manifest(self, refs: List[BackupRef], failed: Dict[str, str],
+                       created: Optional[float] = None) -> str:
+        created = created or time.time()
+        manifests_dir = os.path.join(self.directory, "manifests")
+        os.makedirs(manifests_dir, exist_ok=True)
+        stamp = datetime.fromtimestamp(created).strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(manifests_dir, f"snapshot_{stamp}.json")
+        manifest = {
+            'created': created,
+            'devices': {ref.device: {'digest': ref.digest, 'size': ref.size} for ref in refs},
+            'failed': failed,
+            'partial': bool(failed),
+        }
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return path
+    
+    def read(self, ref: BackupRef) -> str:
+        if ref.digest.startswith('legacy:'):
+            with open(os.path.join(self.directory, ref.digest[len('legacy:'):])) as f:
+                return f.read()
+        import gzip
+        with gzip.open(self.object_path(ref.digest), 'rt') as f:
+            return f.read()
+
+    def _legacy_refs(self) -> List[BackupRef]:
+        refs = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return refs
+        for name in names:
+            match = re.match(self.LEGACY_PATTERN, name)
+            if not match:
+                continue
+            created = datetime.strptime(match.group('ts'), "%Y%m%d_%H%M%S").timestamp()
+            # size is unknown without a stat; it is not needed for listing
+            refs.append(BackupRef(device=f"/dev/{match.group('name')}", created=created,
+                                  digest=f"legacy:{name}", size=-1))
+        return refs
+
+    def refs(self, include_legacy: bool = True) -> List[BackupRef]:
+        refs = []
+        try:
+            with open(self.index_path) as f:
+                for line in f:
+                    try:
+                        refs.append(BackupRef(**json.loads(line)))
+                    except (ValueError, TypeError):
+                        continue
+        except FileNotFoundError:
+            pass
+        if include_legacy:
+            refs.extend(self._legacy_refs())
+        refs.sort(key=lambda r: r.created, reverse=True)
+        return refs
+
+    def find(self, device: Optional[str] = None, since: Optional[float] = None,
+             until: Optional[float] = None) -> List[BackupRef]:
+        name = device.split('/')[-1] if device else None
+        return [r for r in self.refs()
+                if (name is None or r.device_name == name)
+                and (since is None or r.created >= since)
+                and (until is None or r.created <= until)]
+
+    @staticmethod
+    def retained(refs: List[BackupRef], keep_last: int = 0, keep_daily: int = 0,
+                 keep_weekly: int = 0) -> List[BackupRef]:
+        by_device: Dict[str, List[BackupRef]] = {}
+        for ref in sorted(refs, key=lambda r: r.created, reverse=True):
+            by_device.setdefault(ref.device_name, []).append(ref)
+
+        keep = []
+        for device_refs in by_device.values():
+            kept = set(range(min(keep_last, len(device_refs))))
+            for count, period in ((keep_daily, '%Y-%m-%d'), (keep_weekly, '%G-W%V')):
+                seen = set()
+                for i, ref in enumerate(device_refs):
+                    if len(seen) >= count:
+                        break
+                    bucket = datetime.fromtimestamp(ref.created).strftime(period)
+                    if bucket not in seen:
+                        # newest backup of each day/week
+                        seen.add(bucket)
+                        kept.add(i)
+            keep.extend(device_refs[i] for i in sorted(kept))
+        return keep
+
+    def prune(self, keep_last: int = 0, keep_daily: int = 0, keep_weekly: int = 0,
+              dry_run: bool = False) -> Tuple[List[BackupRef], List[BackupRef], int]:
+        with self._lock_index() as index:
+            index.seek(0)
+            lines = []
+            for line in index:
+                try:
+                    lines.append((BackupRef(**json.loads(line)), line))
+                except (ValueError, TypeError):
+                    continue
+            legacy = self._legacy_refs()
+            keep = self.retained([ref for ref, _ in lines] + legacy, keep_last, keep_daily, keep_weekly)
+            keep_ids = {(r.device, r.created, r.digest) for r in keep}
+            removed = [ref for ref, _ in lines + [(r, None) for r in legacy]
+                       if (ref.device, ref.created, ref.digest) not in keep_ids]
+            if dry_run:
+                return removed, keep, 0
+
+            kept_lines = [line for ref, line in lines if (ref.device, ref.created, ref.digest) in keep_ids]
+            live_digests = {r.digest for r in keep}
+
+            tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.writelines(kept_lines)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.index_path)
+
+            for ref in removed:
+                if ref.digest.startswith('legacy:'):
+                    try:
+                        os.unlink(os.path.join(self.directory, ref.digest[len('legacy:'):]))
+                    except FileNotFoundError:
+                        pass
+
+            blobs = 0
+            for root, _, files in os.walk(self.objects_dir):
+                for name in files:
+                    if name.endswith('.gz') and name[:-3] not in live_digests:
+                        os.unlink(os.path.join(root, name))
+                        blobs += 1
+
+            # A manifest stays while every table it lists is still stored
+            manifests_dir = os.path.join(self.directory, "manifests")
+            for name in (os.listdir(manifests_dir) if os.path.isdir(manifests_dir) else []):
+                path = os.path.join(manifests_dir, name)
+                try:
+                    with open(path) as f:
+                        digests = {entry['digest'] for entry in json.load(f)['devices'].values()}
+                except (OSError, ValueError, KeyError, TypeError, AttributeError):
+                    continue
+                if not digests <= live_digests:
+                    os.unlink(path)
+        return removed, keep, blobs
+
+@dataclass
+class CleanupItem:
+    path: str
+    size: int
+    dev: int = 0
+    ino: int = 0
+
+@dataclass
+class CleanupPlan:
+    rule: str
+    description: str
+    items: List[CleanupItem] = field(default_factory=list)
+    bytes: int = 0
+    error: Optional[str] = None
+
+class FileCleanupRule:
+    """
+    Base for cleanup rules that delete files.
+
+    plan() walks roots() (without following symlinks or crossing into other
+    filesystems) and sizes every regular file wanted() accepts by its
+    allocated blocks; a hard-linked file only counts once all of its links
+    are in the plan. remove() lstats each file again right before unlinking it, so a
+    file that was replaced or touched since the sizing pass is left alone.
+    """
+
+    name = ''
+    description = ''
+    max_age_days: Optional[float] = None
+
+    def __init__(self, max_age_days: Optional[float] = None, now: Optional[float] = None):
+        if max_age_days is not None:
+            self.max_age_days = max_age_days
+        self.now = now or time.time()
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def roots(self) -> List[str]:
+        return []
+
+    def available(self) -> bool:
+        return any(os.path.isdir(root) for root in self.roots())
+
+    def skip_dir(self, path: str) -> bool:
+        return False
+
+    def wanted(self, path: str, st: os.stat_result) -> bool:
+        return True
+
+    def _older(self, timestamp: float) -> bool:
+        return self.max_age_days is None or timestamp < self.now - self.max_age_days * 86400
+
+    @staticmethod
+    def _freed(st: os.stat_result) -> int:
+        return st.st_blocks * 512 if st.st_nlink == 1 else 0
+
+    def _walk(self, root: str) -> Iterator[Tuple[str, os.stat_result]]:
+        try:
+            root_dev = os.lstat(root).st_dev
+        except OSError:
+            return
+        pending = [root]
+        while pending:
+            directory = pending.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            st = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        if stat.S_ISDIR(st.st_mode):
+                            if st.st_dev == root_dev and not self.skip_dir(entry.path):
+                                pending.append(entry.path)
+                        elif stat.S_ISREG(st.st_mode):
+                            yield entry.path, st
+            except OSError:
+                continue
+
+    def plan(self) -> CleanupPlan:
+        plan = CleanupPlan(self.name, self.description)
+        links: Dict[Tuple[int, int], int] = {}
+        for root in self.roots():
+            for path, st in self._walk(root):
+                if not self.wanted(path, st):
+                    continue
+                size = self._freed(st)
+                if st.st_nlink > 1:
+                    # A hard-linked file frees its blocks once every link is in the plan
+                    key = (st.st_dev, st.st_ino)
+                    links[key] = links.get(key, 0) + 1
+                    if links[key] == st.st_nlink:
+                        size = st.st_blocks * 512
+                plan.items.append(CleanupItem(path, size, st.st_dev, st.st_ino))
+                plan.bytes += size
+        return plan
+
+    def remove(self, item: CleanupItem) -> int:
+        try:
+            st = os.lstat(item.path)
+            if (st.st_dev, st.st_ino) != (item.dev, item.ino) or not self.wanted(item.path, st):
+                return 0
+            os.unlink(item.path)
+        except FileNotFoundError:
+            return 0
+        except OSError:
+            with self._lock:
+                self.errors += 1
+            return 0
+        return self._freed(st)
+
+    def apply(self, plan: CleanupPlan, pool: 'ThreadPoolExecutor') -> list:
+        return [pool.submit(self.remove, item) for item in plan.items]
+
+class PackageCacheRule(FileCleanupRule):
+    """
+    Downloaded package files, the way the package managers clean them.
+
+    pacman: cached packages whose version is no longer installed (pacman -Sc);
+    apt: downloaded .debs, partial downloads and the binary caches (apt clean);
+    dnf/yum: the whole cache (dnf clean all).
+    """
+
+    name = 'package-cache'
+    description = 'Package manager caches (pacman -Sc, apt clean, dnf clean all)'
+
+    PACMAN_CACHE = '/var/cache/pacman/pkg'
+    PACMAN_LOCAL = '/var/lib/pacman/local'
+    APT_CACHE = '/var/cache/apt'
+    DNF_CACHES = ('/var/cache/dnf', '/var/cache/yum')
+
+    def __init__(self, max_age_days: Optional[float] = None, now: Optional[float] = None):
+        super().__init__(max_age_days, now)
+        self._installed: Optional[set] = None
+
+    def roots(self) -> List[str]:
+        return [root for root in (self.PACMAN_CACHE, self.APT_CACHE) + self.DNF_CACHES
+                if os.path.isdir(root)]
+
+    def installed_packages(self) -> set:
+        if self._installed is None:
+            try:
+                self._installed = set(os.listdir(self.PACMAN_LOCAL))
+            except OSError:
+                self._installed = set()
+        return self._installed
+
+    def wanted(self, path: str, st: os.stat_result) -> bool:
+        name = os.path.basename(path)
+        if name == 'lock' or name.endswith('.lock') or not self._older(st.st_mtime):
+            return False
+        if path.startswith(self.PACMAN_CACHE + os.sep):
+            marker = name.find('.pkg.tar')
+            if marker < 0:
+                return False
+            # name-version-release-arch.pkg.tar.zst[.sig]; the local db holds name-version-release
+            return name[:marker].rsplit('-', 1)[0] not in self.installed_packages()
+        if path.startswith(self.APT_CACHE + os.sep):
+            return (name.endswith('.deb') or name.endswith('pkgcache.bin')
+                    or os.path.basename(os.path.dirname(path)) == 'partial')
+        return True
+
+class JournalVacuumRule(FileCleanupRule):
+    """Archived journal files not written to for max_age_days, like journalctl --vacuum-time."""
+
+    name = 'journal'
+    description = 'Archived systemd journal files'
+    max_age_days = 3.0
+
+    def roots(self) -> List[str]:
+        return ['/var/log/journal', '/run/log/journal']
+
+    def wanted(self, path: str, st: os.stat_result) -> bool:
+        # Only archived files (system@<id>.journal, dirty ones end in ~); never the active journal
+        name = os.path.basename(path)
+        return ('@' in name and name.endswith(('.journal', '.journal~'))
+                and self._older(st.st_mtime))
+
+class OldLogsRule(FileCleanupRule):
+    """
+    Rotated log files (compressed, numbered, dated or .old) under /var/log.
+
+    A numbered file (X.1, X.2.gz) only counts as rotated while the live log
+    X is next to it, the way logrotate leaves them, so numbered data files
+    such as MySQL binary logs (mysql-bin.000042) are left alone. The MySQL
+    and MariaDB log directories, where binary logs live, are not walked.
+    """
+
+    name = 'old-logs'
+    description = 'Rotated logs in /var/log'
+    max_age_days = 14.0
+
+    LOG_DIR = '/var/log'
+    SKIP_DIRS = ('journal', 'mysql', 'mariadb')
+    NUMBERED = r'^(?P<base>.+)\.\d+(\.(gz|xz|bz2|zst|lz4))?$'
+    ROTATED = r'(\.old|-\d{8})(\.(gz|xz|bz2|zst|lz4))?$|\.(gz|xz|bz2|zst|lz4)$'
+
+    def roots(self) -> List[str]:
+        return [self.LOG_DIR]
+
+    def skip_dir(self, path: str) -> bool:
+        return os.path.dirname(path) == self.LOG_DIR and os.path.basename(path) in self.SKIP_DIRS
+
+    def rotated(self, path: str) -> bool:
+        name = os.path.basename(path)
+        numbered = re.match(self.NUMBERED, name)
+        if numbered:
+            return os.path.lexists(os.path.join(os.path.dirname(path), numbered.group('base')))
+        return bool(re.search(self.ROTATED, name))
+
+    def wanted(self, path: str, st: os.stat_result) -> bool:
+        return self._older(st.st_mtime) and self.rotated(path)
+
+class TempFilesRule(FileCleanupRule):
+    """
+    Files in /tmp and /var/tmp neither read nor modified for max_age_days.
+
+    Private tmp directories of running services (systemd-private-*) are not
+    entered, the same exclusion systemd-tmpfiles makes.
+    """
+
+    name = 'tmp'
+    description = 'Stale files in /tmp and /var/tmp'
+    max_age_days = 7.0
 
-# Color codes
-class Color:
-    HEADER = '\033[95m'
-    OKBLUE = '\033[94m'
-    OKCYAN = '\033[96m'
-    OKGREEN = '\033[92m'
-    WARNING = '\033[93m'
-    FAIL = '\033[91m'
-    ENDC = '\033[0m'
-    BOLD = '\033[1m'
+    def roots(self) -> List[str]:
+        return ['/tmp', '/var/tmp']
 
-class OperationRisk(Enum):
-    SAFE = "safe"
-    LOW = "low"
-    MEDIUM = "medium"
-    HIGH = "high"
-    CRITICAL = "critical"
+    def skip_dir(self, path: str) -> bool:
+        return os.path.basename(path).startswith('systemd-private-')
 
-@dataclass
-class DiskInfo:
-    name: str
-    size: str
-    type: str
-    mountpoint: Optional[str]
-    fstype: Optional[str]
-    uuid: Optional[str]
-    label: Optional[str]
-    used: Optional[str] = None
-    avail: Optional[str] = None
-    use_percent: Optional[str] = None
+    def wanted(self, path: str, st: os.stat_result) -> bool:
+        return self._older(max(st.st_atime, st.st_mtime))
+
+class ContainerImageRule:
+    """
+    Container images no container uses, through the Docker (or Podman) API socket.
+
+    Sizing comes from /system/df: an unused image frees its size minus the
+    layers it shares with other images. The delete is a single
+    /images/prune call, whose SpaceReclaimed is the freed byte count.
+    Volumes and stopped containers are left alone.
+    """
+
+    name = 'container-images'
+    description = 'Unused container images (docker/podman)'
+    SOCKETS = ('/var/run/docker.sock', '/run/podman/podman.sock')
+
+    def __init__(self, max_age_days: Optional[float] = None, now: Optional[float] = None,
+                 sockets: Optional[Tuple[str, ...]] = None, timeout: float = 120.0):
+        self.max_age_days = max_age_days
+        self.now = now or time.time()
+        self.timeout = timeout
+        self.errors = 0
+        self.socket_path = next((path for path in (sockets or self.SOCKETS) if os.path.exists(path)), None)
+
+    def available(self) -> bool:
+        return self.socket_path is not None
+
+    def _request(self, method: str, path: str):
+        import http.client
+        import socket
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        conn = http.client.HTTPConnection('localhost', timeout=self.timeout)
+        try:
+            sock.connect(self.socket_path)
+            conn.sock = sock
+            conn.request(method, path)
+            response = conn.getresponse()
+            body = response.read()
+        finally:
+            conn.close()
+            sock.close()
+        if response.status >= 300:
+            raise RuntimeError(f"{method} {path}: HTTP {response.status}")
+        return json.loads(body or b'null')
+
+    def _filters(self) -> str:
+        from urllib.parse import quote
+        filters = {'dangling': ['false']}
+        if self.max_age_days is not None:
+            filters['until'] = [f"{self.max_age_days * 24:g}h"]
+        return quote(json.dumps(filters))
+
+    def plan(self) -> CleanupPlan:
+        plan = CleanupPlan(self.name, self.description)
+        cutoff = self.now - self.max_age_days * 86400 if self.max_age_days is not None else None
+        for image in self._request('GET', '/system/df').get('Images') or []:
+            if image.get('Containers', 0) != 0:
+                continue
+            if cutoff is not None and image.get('Created', 0) >= cutoff:
+                continue
+            size = max(0, image.get('Size', 0) - max(0, image.get('SharedSize', 0)))
+            tags = [tag for tag in image.get('RepoTags') or [] if tag != '<none>:<none>']
+            plan.items.append(CleanupItem(tags[0] if tags else image.get('Id', '')[:19], size))
+            plan.bytes += size
+        return plan
+
+    def prune(self) -> int:
+        try:
+            result = self._request('POST', f"/images/prune?filters={self._filters()}")
+        except (OSError, RuntimeError, ValueError):
+            self.errors += 1
+            return 0
+        return (result or {}).get('SpaceReclaimed', 0)
+
+    def apply(self, plan: CleanupPlan, pool: 'ThreadPoolExecutor') -> list:
+        return [pool.submit(self.prune)]
+
+CLEANUP_RULES = {rule.name: rule for rule in (PackageCacheRule, JournalVacuumRule, OldLogsRule,
+                                             TempFilesRule, ContainerImageRule)}
+
+class RecordWriter:
+    """
+    Streams structured records to stdout for --format json/ndjson.
+
+    ndjson writes one object per line. json writes a single document whose
+    "records" array is printed element by element, so consumers can parse
+    it incrementally. Every record has a "type" field, and emit() is safe
+    to call from scanner worker threads.
+    """
+
+    def __init__(self, fmt: str, command: str, stream=None):
+        self.fmt = fmt
+        self.command = command
+        self.stream = stream or sys.stdout
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def emit(self, kind: str, data: Dict):
+        record = {'type': kind}
+        record.update(data)
+        text = json.dumps(record, default=str)
+        with self._lock:
+            if self.fmt == 'ndjson':
+                self.stream.write(text + '\n')
+            else:
+                prefix = (json.dumps({'command': self.command})[:-1] + ', "records": [\n'
+                          if self.count == 0 else ',\n')
+                self.stream.write(prefix + text)
+            self.count += 1
+            self.stream.flush()
+
+    def close(self):
+        if self.fmt == 'json':
+            if self.count == 0:
+                self.stream.write(json.dumps({'command': self.command, 'records': []}) + '\n')
+            else:
+                self.stream.write('\n]}\n')
+            self.stream.flush()
+
+class CommandExecutor:
+    """
+    Runs external commands, each with its own deadline.
+
+    A single command runs straight on subprocess; a batch runs on asyncio,
+    concurrently and at most `concurrency` at a time, so the cost of
+    loading asyncio is only paid when there is something to overlap.
+    A command that outlives its deadline is killed with its whole process
+    group (children holding the pipes would otherwise keep the read
+    blocked) and reported with exit code 124 and a "timed out" message,
+    while the rest of the batch completes normally. Deadlines default per
+    program, so one lvs stuck on a dead multipath path or an sfdisk on an
+    unresponsive disk cannot hang the tool. Interrupting a run kills every
+    command still running.
+    """
+
+    TIMED_OUT = 124
+    TIMEOUTS = {'lsblk': 15.0, 'lvm': 30.0, 'pvs': 30.0, 'vgs': 30.0, 'lvs': 30.0, 'sfdisk': 30.0}
+    DEFAULT_TIMEOUT = 60.0
+
+    def __init__(self, timeout: Optional[float] = None, concurrency: int = 16):
+        self.timeout = timeout
+        self.concurrency = concurrency
+
+    def deadline(self, cmd: List[str]) -> float:
+        if self.timeout is not None:
+            return self.timeout
+        return self.TIMEOUTS.get(os.path.basename(cmd[0]), self.DEFAULT_TIMEOUT)
+
+    def _run_single(self, cmd: List[str], capture_output: bool) -> Tuple[int, str, str]:
+        import subprocess
+        pipe = subprocess.PIPE if capture_output else None
+        try:
+            proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=pipe, stderr=pipe,
+                                    start_new_session=True)
+        except FileNotFoundError:
+            return (127, "", f"Command not found: {cmd[0]}")
+        except OSError as e:
+            return (1, "", f"Error executing command: {e}")
+        timeout = self.deadline(cmd)
+        with proc:
+            try:
+                out, err = proc.communicate(timeout=timeout)
+            except BaseException as e:
+                try:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                if not isinstance(e, subprocess.TimeoutExpired):
+                    raise
+                return (self.TIMED_OUT, "", f"{cmd[0]} timed out after {timeout:g}s")
+        return (proc.returncode, (out or b'').decode(errors='replace'),
+                (err or b'').decode(errors='replace'))
+
+    async def _run_one(self, cmd: List[str], semaphore: 'asyncio.Semaphore',
+                       capture_output: bool) -> Tuple[int, str, str]:
+        import asyncio
+        async with semaphore:
+            pipe = asyncio.subprocess.PIPE if capture_output else None
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                    *cmd, stdin=asyncio.subprocess.DEVNULL, stdout=pipe, stderr=pipe,
+                    start_new_session=True)
+            except FileNotFoundError:
+                return (127, "", f"Command not found: {cmd[0]}")
+            except OSError as e:
+                return (1, "", f"Error executing command: {e}")
+            timeout = self.deadline(cmd)
+            try:
+                out, err = await asyncio.wait_for(proc.communicate(), timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                try:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                await proc.wait()
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                return (self.TIMED_OUT, "", f"{cmd[0]} timed out after {timeout:g}s")
+            return (proc.returncode, (out or b'').decode(errors='replace'),
+                    (err or b'').decode(errors='replace'))
+
+    async def _run(self, commands: Dict[str, List[str]], capture_output: bool) -> Dict[str, Tuple[int, str, str]]:
+        import asyncio
+        semaphore = asyncio.Semaphore(max(1, self.concurrency))
+        results = await asyncio.gather(*(self._run_one(cmd, semaphore, capture_output)
+                                         for cmd in commands.values()))
+        return dict(zip(commands, results))
+
+    def run(self, commands: Dict[str, List[str]], capture_output: bool = True) -> Dict[str, Tuple[int, str, str]]:
+        if len(commands) <= 1:
+            return {name: self._run_single(cmd, capture_output) for name, cmd in commands.items()}
+        import asyncio
+        return asyncio.run(self._run(commands, capture_output))
 
 class StorageManager:
-    def __init__(self):
-        self.backup_dir = "/var/backups/storage-manager"
-        self.ensure_backup_dir()
+    def __init__(self, disk_backend: str = 'auto'):
+        self.disk_backend = disk_backend
+        self._backup_dir: Optional[str] = None
+        self.cache_dir = "/var/cache/storage-manager"
+        self.data_dir = "/var/lib/storage-manager"
+        self.metadata_ttl = 10.0
+        self.command_timeout: Optional[float] = None
+        self._mount_collector: Optional[MountUsageCollector] = None
+        self._metadata_cache: Optional[MetadataCache] = None
+    
+    @property
+    def backup_dir(self) -> str:
+        # Resolved without creating anything; see ensure_backup_dir()
+        if self._backup_dir is None:
+            primary = "/var/backups/storage-manager"
+            if os.path.isdir(primary) or os.access(os.path.dirname(primary), os.W_OK):
+                self._backup_dir = primary
+            else:
+                self._backup_dir = os.path.expanduser("~/.storage-manager-backups")
+        return self._backup_dir
+    
+    @backup_dir.setter
+    def backup_dir(self, path: str):
+        self._backup_dir = path
     
-    def ensure_backup_dir(self):
+    def ensure_backup_dir(self) -> str:
         try:
             os.makedirs(self.backup_dir, exist_ok=True)
         except PermissionError:
-            self.backup_dir = os.path.expanduser("~/.storage-manager-backups")
-            os.makedirs(self.backup_dir, exist_ok=True)
+            self._backup_dir = os.path.expanduser("~/.storage-manager-backups")
+            os.makedirs(self._backup_dir, exist_ok=True)
+        return self._backup_dir
+    
+    def _ensure_writable_dir(self, path: str, fallback: str) -> str:
+        try:
+            os.makedirs(path, exist_ok=True)
+            if not os.access(path, os.W_OK):
+                raise PermissionError(path)
+        except PermissionError:
+            path = os.path.expanduser(fallback)
+            os.makedirs(path, exist_ok=True)
+        return path
+    
+    @property
+    def metadata_cache(self) -> Optional[MetadataCache]:
+        if self.metadata_ttl <= 0:
+            return None
+        if self._metadata_cache is None:
+            directory = MetadataCache.default_directory()
+            if directory is None:
+                return None
+            self._metadata_cache = MetadataCache(directory, ttl=self.metadata_ttl)
+        return self._metadata_cache
+    
+    @metadata_cache.setter
+    def metadata_cache(self, cache: Optional[MetadataCache]):
+        self._metadata_cache = cache
+    
+    @property
+    def mount_collector(self) -> MountUsageCollector:
+        # One collector per manager, so a mount stuck in statvfs keeps a single probe across calls
+        if self._mount_collector is None:
+            self._mount_collector = MountUsageCollector()
+        return self._mount_collector
+    
+    @mount_collector.setter
+    def mount_collector(self, collector: MountUsageCollector):
+        self._mount_collector = collector
+    
+    def ensure_cache_dir(self) -> str:
+        self.cache_dir = self._ensure_writable_dir(self.cache_dir, "~/.cache/storage-manager")
+        return self.cache_dir
+    
+    def ensure_data_dir(self) -> str:
+        self.data_dir = self._ensure_writable_dir(self.data_dir, "~/.local/share/storage-manager")
+        return self.data_dir
+    
+    def capacity_history(self) -> CapacityHistory:
+        directory = os.path.join(self.ensure_data_dir(), "history")
+        os.makedirs(directory, exist_ok=True)
+        return CapacityHistory(directory)
     
     def print_banner(self):
         banner = f"""{Color.OKCYAN}
@@ -89,96 +2971,137 @@ class StorageManager:
     
     def run_command(self, cmd: List[str], require_root: bool = False, 
                    capture_output: bool = True) -> Tuple[int, str, str]:
+        return self.run_commands({'command': cmd}, require_root=require_root,
+                                 capture_output=capture_output)['command']
+    
+    def run_commands(self, commands: Dict[str, List[str]], require_root: bool = False,
+                     capture_output: bool = True, concurrency: int = 16) -> Dict[str, Tuple[int, str, str]]:
         if require_root and not self.check_root_privileges():
-            return (1, "", "Root privileges required for this operation")
-        
-        try:
-            result = subprocess.run(cmd, capture_output=capture_output, text=True, check=False)
-            return (result.returncode, result.stdout, result.stderr)
-        except FileNotFoundError:
-            return (127, "", f"Command not found: {cmd[0]}")
-        except Exception as e:
-            return (1, "", f"Error executing command: {str(e)}")
+            return {name: (1, "", "Root privileges required for this operation") for name in commands}
+        executor = CommandExecutor(timeout=self.command_timeout, concurrency=concurrency)
+        return executor.run(commands, capture_output=capture_output)
     
     def get_disk_info(self) -> List[DiskInfo]:
+        return self.get_device_tree().devices
+    
+    def get_device_tree(self) -> DeviceTree:
+        cache = self.metadata_cache
+        if cache is None:
+            return self._read_device_tree()
+        
+        name = f"devices-{self.disk_backend}"
+        key = cache.topology_key()
+        cached = cache.load(name, key)
+        if cached is not None:
+            try:
+                return DeviceTree.restore(cached)
+            except (KeyError, TypeError, IndexError):
+                pass
+        tree = self._read_device_tree()
+        if len(tree):
+            cache.store(name, tree.dump(), key)
+        return tree
+    
+    def _read_device_tree(self) -> DeviceTree:
+        backend = self.disk_backend
+        if backend == 'auto':
+            backend = 'sysfs' if SysfsBlockBackend().available() else 'lsblk'
+        
+        if backend == 'sysfs':
+            try:
+                tree = SysfsBlockBackend().read_tree()
+            except OSError as e:
+                print(f"{Color.WARNING}sysfs device scan failed ({e}), falling back to lsblk{Color.ENDC}", file=sys.stderr)
+                return self._get_device_tree_lsblk()
+            self._enhance_with_mount_usage(tree)
+            return tree
+        
+        return self._get_device_tree_lsblk()
+    
+    def _get_device_tree_lsblk(self) -> DeviceTree:
+        tree = DeviceTree()
         exit_code, output, error = self.run_command(
-            ['lsblk', '-J', '-o', 'NAME,SIZE,TYPE,MOUNTPOINT,FSTYPE,UUID,LABEL']
+            ['lsblk', '-J', '-b', '-o', 'NAME,SIZE,TYPE,MOUNTPOINT,FSTYPE,UUID,LABEL,MAJ:MIN']
         )
         
         if exit_code != 0:
-            print(f"{Color.FAIL}Error getting disk info: {error}{Color.ENDC}")
-            return []
+            print(f"{Color.FAIL}Error getting disk info: {error}{Color.ENDC}", file=sys.stderr)
+            return tree
         
         try:
             data = json.loads(output)
-            disks = []
-            
-            for device in data.get('blockdevices', []):
-                disk = DiskInfo(
-                    name=device.get('name', ''),
-                    size=device.get('size', ''),
-                    type=device.get('type', ''),
-                    mountpoint=device.get('mountpoint'),
-                    fstype=device.get('fstype'),
-                    uuid=device.get('uuid'),
-                    label=device.get('label')
-                )
-                disks.append(disk)
-                
-                for child in device.get('children', []):
-                    child_disk = DiskInfo(
-                        name=child.get('name', ''),
-                        size=child.get('size', ''),
-                        type=child.get('type', ''),
-                        mountpoint=child.get('mountpoint'),
-                        fstype=child.get('fstype'),
-                        uuid=child.get('uuid'),
-                        label=child.get('label')
-                    )
-                    disks.append(child_disk)
-            
-            self._enhance_with_df_data(disks)
-            return disks
         except json.JSONDecodeError as e:
-            print(f"{Color.FAIL}Error parsing disk info: {e}{Color.ENDC}")
-            return []
+            print(f"{Color.FAIL}Error parsing disk info: {e}{Color.ENDC}", file=sys.stderr)
+            return tree
+        
+        stack = [(device, None) for device in reversed(data.get('blockdevices', []))]
+        while stack:
+            device, parent = stack.pop()
+            # -b prints exact byte counts; older lsblk versions print them as strings
+            try:
+                size_bytes = int(device.get('size'))
+            except (TypeError, ValueError):
+                size_bytes = None
+            disk = DiskInfo(
+                name=device.get('name', ''),
+                size=format_lsblk_size(size_bytes) if size_bytes is not None else device.get('size', ''),
+                type=device.get('type', ''),
+                mountpoint=device.get('mountpoint'),
+                fstype=device.get('fstype'),
+                uuid=device.get('uuid'),
+                label=device.get('label'),
+                maj_min=device.get('maj:min'),
+                size_bytes=size_bytes
+            )
+            node, created = tree.add(disk, parent)
+            if created:
+                stack.extend((child, node) for child in reversed(device.get('children', [])))
+        
+        self._enhance_with_mount_usage(tree)
+        return tree
     
-    def _enhance_with_df_data(self, disks: List[DiskInfo]):
-        exit_code, output, _ = self.run_command(['df', '-h'])
-        if exit_code != 0:
+    def _enhance_with_mount_usage(self, tree: DeviceTree):
+        try:
+            usages = self.mount_collector.collect(block_only=True)
+        except OSError:
             return
         
-        lines = output.strip().split('\n')[1:]
-        df_data = {}
+        for usage in usages:
+            node = tree.by_devno.get(f"{usage.major}:{usage.minor}")
+            if node is None and usage.major == 0:
+                node = tree.by_source(usage.source)
+            if node is None:
+                continue
+            disk = node.info
+            if usage.error:
+                disk.use_percent = f"n/a ({usage.error})"
+                continue
+            disk.used_bytes = usage.used
+            disk.avail_bytes = usage.avail
+            disk.used = format_lsblk_size(usage.used)
+            disk.avail = format_lsblk_size(usage.avail)
+            disk.use_percent = f"{usage.use_percent}%"
+    
+    def display_disk_overview(self, writer: Optional[RecordWriter] = None):
+        if writer:
+            for node in self.get_device_tree().nodes:
+                data = asdict(node.info)
+                # 'type' is the record kind in the output stream
+                data['device_type'] = data.pop('type')
+                data['parents'] = [parent.info.name for parent in node.parents]
+                writer.emit('device', data)
+            return
         
-        for line in lines:
-            parts = line.split()
-            if len(parts) >= 6:
-                device = parts[0].split('/')[-1] if '/' in parts[0] else parts[0]
-                df_data[device] = {
-                    'used': parts[2],
-                    'avail': parts[3],
-                    'use_percent': parts[4]
-                }
-        
-        for disk in disks:
-            if disk.name in df_data:
-                data = df_data[disk.name]
-                disk.used = data['used']
-                disk.avail = data['avail']
-                disk.use_percent = data['use_percent']
-    
-    def display_disk_overview(self):
         print(f"\n{Color.BOLD}=== DISK OVERVIEW ==={Color.ENDC}\n")
         
-        disks = self.get_disk_info()
-        if not disks:
+        tree = self.get_device_tree()
+        if not tree:
             print(f"{Color.WARNING}No disk information available{Color.ENDC}")
             return
         
-        physical_disks = [d for d in disks if d.type == 'disk']
-        partitions = [d for d in disks if d.type == 'part']
-        lvm_volumes = [d for d in disks if d.type == 'lvm']
+        physical_disks = tree.of_type('disk')
+        partitions = tree.of_type('part')
+        lvm_volumes = tree.of_type('lvm')
         
         if physical_disks:
             print(f"{Color.OKBLUE}Physical Disks:{Color.ENDC}")
@@ -215,36 +3138,79 @@ class StorageManager:
                     print(f"    Used: {lvm.used} / Available: {lvm.avail} ({lvm.use_percent})")
                 print()
     
-    def get_lvm_info(self) -> Dict:
-        lvm_info = {'physical_volumes': [], 'volume_groups': [], 'logical_volumes': []}
+    def get_lvm_info(self) -> LVMReport:
+        cache = self.metadata_cache
+        if cache is None:
+            return self._read_lvm_info()
         
-        exit_code, output, _ = self.run_command(['pvs', '--reportformat', 'json'], require_root=True)
-        if exit_code == 0:
+        key = cache.topology_key()
+        cached = cache.load("lvm", key)
+        if cached is not None:
             try:
-                data = json.loads(output)
-                lvm_info['physical_volumes'] = data.get('report', [{}])[0].get('pv', [])
-            except:
+                return LVMReport.restore(cached)
+            except (KeyError, TypeError):
                 pass
+        report = self._read_lvm_info()
+        # Failed reads (no lvm2, not root) are not cached
+        if not report.errors:
+            cache.store("lvm", report.dump(), key)
+        return report
+    
+    def _read_lvm_info(self) -> LVMReport:
+        parser = LVMReportParser()
+        report = LVMReport(source='fullreport')
+        common = ['--reportformat', 'json', '--units', 'b', '--nosuffix']
         
-        exit_code, output, _ = self.run_command(['vgs', '--reportformat', 'json'], require_root=True)
+        exit_code, output, error = self.run_command(
+            ['lvm', 'fullreport'] + common + [
+                '--configreport', 'pv', '-o', parser.PV_FIELDS,
+                '--configreport', 'vg', '-o', parser.VG_FIELDS,
+                '--configreport', 'lv', '-o', parser.LV_FIELDS,
+                '--configreport', 'seg', '-o', parser.SEG_FIELDS],
+            require_root=True
+        )
         if exit_code == 0:
-            try:
-                data = json.loads(output)
-                lvm_info['volume_groups'] = data.get('report', [{}])[0].get('vg', [])
-            except:
-                pass
+            parser.parse(output, report, 'lvm fullreport')
+            return report
+        if exit_code == CommandExecutor.TIMED_OUT:
+            # The separate reports would block on the same device; don't wait for them too
+            report.errors.append(f"lvm fullreport: {error}")
+            return report
         
-        exit_code, output, _ = self.run_command(['lvs', '--reportformat', 'json'], require_root=True)
-        if exit_code == 0:
-            try:
-                data = json.loads(output)
-                lvm_info['logical_volumes'] = data.get('report', [{}])[0].get('lv', [])
-            except:
-                pass
+        # lvm2 builds without fullreport: run the classic reports side by side, each with its
+        # own deadline, and keep whatever finishes
+        report = LVMReport(source='pvs/vgs/lvs')
+        commands = {
+            'pvs': ['pvs'] + common + ['-o', parser.PV_FIELDS],
+            'vgs': ['vgs'] + common + ['-o', parser.VG_FIELDS],
+            'lvs': ['lvs'] + common + ['-o', parser.LV_FIELDS],
+            'lvs --segments': ['lvs', '--segments'] + common + ['-o', parser.SEG_FIELDS],
+        }
+        results = self.run_commands(commands, require_root=True)
         
-        return lvm_info
+        for source, (exit_code, output, error) in results.items():
+            if exit_code == 0:
+                parser.parse(output, report, source)
+            else:
+                report.errors.append(f"{source}: {error.strip() or f'exit code {exit_code}'}")
+        return report
     
-    def display_lvm_info(self):
+    def display_lvm_info(self, writer: Optional[RecordWriter] = None):
+        if writer:
+            if not self.check_root_privileges():
+                writer.emit('error', {'message': 'Root privileges required for LVM information'})
+                return
+            report = self.get_lvm_info()
+            for pv in report.physical_volumes:
+                writer.emit('pv', asdict(pv))
+            for vg in report.volume_groups:
+                writer.emit('vg', asdict(vg))
+            for lv in report.logical_volumes:
+                writer.emit('lv', asdict(lv))
+            for error in report.errors:
+                writer.emit('error', {'message': error})
+            return
+        
         if not self.check_root_privileges():
             print(f"{Color.WARNING}Root privileges required for LVM information{Color.ENDC}")
             return
@@ -253,61 +3219,159 @@ class StorageManager:
         
         lvm_info = self.get_lvm_info()
         
-        pvs = lvm_info.get('physical_volumes', [])
+        pvs = lvm_info.physical_volumes
         if pvs:
             print(f"{Color.OKBLUE}Physical Volumes:{Color.ENDC}")
             for pv in pvs:
-                print(f"  {Color.BOLD}{pv.get('pv_name', 'N/A')}{Color.ENDC}")
-                print(f"    VG Name: {pv.get('vg_name', 'N/A')}")
-                print(f"    Size: {pv.get('pv_size', 'N/A')}")
-                print(f"    Free: {pv.get('pv_free', 'N/A')}")
+                print(f"  {Color.BOLD}{pv.pv_name}{Color.ENDC}")
+                print(f"    VG Name: {pv.vg_name or 'N/A'}")
+                print(f"    Size: {self._format_bytes(pv.pv_size)}")
+                print(f"    Free: {self._format_bytes(pv.pv_free)}")
+                if pv.pe_count is not None:
+                    print(f"    PE: {pv.pe_alloc_count} / {pv.pe_count} allocated")
                 print()
         
-        vgs = lvm_info.get('volume_groups', [])
+        vgs = lvm_info.volume_groups
         if vgs:
             print(f"{Color.OKBLUE}Volume Groups:{Color.ENDC}")
             for vg in vgs:
-                print(f"  {Color.BOLD}{vg.get('vg_name', 'N/A')}{Color.ENDC}")
-                print(f"    Size: {vg.get('vg_size', 'N/A')}")
-                print(f"    Free: {vg.get('vg_free', 'N/A')}")
-                print(f"    PV Count: {vg.get('pv_count', 'N/A')}")
+                print(f"  {Color.BOLD}{vg.vg_name}{Color.ENDC}")
+                print(f"    Size: {self._format_bytes(vg.vg_size)}")
+                print(f"    Free: {self._format_bytes(vg.vg_free)}")
+                print(f"    PV Count: {vg.pv_count}")
+                if vg.extent_count is not None:
+                    print(f"    Extents: {vg.free_count} free / {vg.extent_count} "
+                          f"({self._format_bytes(vg.extent_size or 0)} each)")
                 print()
         
-        lvs = lvm_info.get('logical_volumes', [])
+        lvs = lvm_info.logical_volumes
         if lvs:
             print(f"{Color.OKBLUE}Logical Volumes:{Color.ENDC}")
             for lv in lvs:
-                print(f"  {Color.BOLD}{lv.get('lv_name', 'N/A')}{Color.ENDC}")
-                print(f"    VG Name: {lv.get('vg_name', 'N/A')}")
-                print(f"    Size: {lv.get('lv_size', 'N/A')}")
+                print(f"  {Color.BOLD}{lv.lv_name}{Color.ENDC}")
+                print(f"    VG Name: {lv.vg_name}")
+                print(f"    Size: {self._format_bytes(lv.lv_size)}")
+                if lv.layout:
+                    print(f"    Layout: {','.join(lv.layout)}")
+                if lv.pool_lv:
+                    print(f"    Pool: {lv.pool_lv}")
+                if lv.data_percent is not None:
+                    meta = f", metadata {lv.metadata_percent:.2f}%" if lv.metadata_percent is not None else ""
+                    print(f"    Data: {lv.data_percent:.2f}%{meta}")
+                for seg in lv.segments:
+                    devices = ', '.join(seg.devices) if seg.devices else '-'
+                    print(f"    Segment: {seg.segtype} {self._format_bytes(seg.seg_size)} on {devices}")
                 print()
         
         if not pvs and not vgs and not lvs:
             print(f"{Color.WARNING}No LVM configuration found{Color.ENDC}")
+        
+        for error in lvm_info.errors:
+            print(f"{Color.WARNING}LVM report problem: {error}{Color.ENDC}")
+    
+    def backup_store(self, create: bool = False) -> PartitionBackupStore:
+        return PartitionBackupStore(self.ensure_backup_dir() if create else self.backup_dir)
     
     def backup_partition_table(self, device: str) -> Optional[str]:
         if not self.check_root_privileges():
             print(f"{Color.FAIL}Root privileges required{Color.ENDC}")
             return None
         
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        device_name = device.split('/')[-1]
-        backup_file = os.path.join(self.backup_dir, f"{device_name}_partition_table_{timestamp}.backup")
-        
-        exit_code, output, error = self.run_command(['sfdisk', '-d', device], require_root=True)
+        store = self.backup_store(create=True)
+        try:
+            ref, is_new = self._snapshot_partition_table(store, device)
+        except RuntimeError as e:
+            print(f"{Color.FAIL}Error backing up partition table: {e}{Color.ENDC}")
+            return None
+        except OSError as e:
+            print(f"{Color.FAIL}Error writing backup file: {e}{Color.ENDC}")
+            return None
         
+        blob = store.object_path(ref.digest)
+        state = "new table" if is_new else "unchanged, reusing stored copy"
+        print(f"{Color.OKGREEN}Partition table of {device} backed up ({state}): {blob}{Color.ENDC}")
+        return blob
+    
+    def _snapshot_partition_table(self, store: PartitionBackupStore, device: str,
+                                  created: Optional[float] = None) -> Tuple[BackupRef, bool]:
+        result = self.run_command(['sfdisk', '-d', device], require_root=True)
+        return self._store_partition_table(store, device, result, created=created)
+    
+    def _store_partition_table(self, store: PartitionBackupStore, device: str,
+                               result: Tuple[int, str, str],
+                               created: Optional[float] = None) -> Tuple[BackupRef, bool]:
+        exit_code, output, error = result
         if exit_code != 0:
-            print(f"{Color.FAIL}Error backing up partition table: {error}{Color.ENDC}")
+            raise RuntimeError(error.strip() or f"sfdisk exited with {exit_code}")
+        return store.put(device, output, created=created)
+    
+    def backup_all_partition_tables(self, workers: int = 16) -> Optional[str]:
+        if not self.check_root_privileges():
+            print(f"{Color.FAIL}Root privileges required{Color.ENDC}")
+            return None
+        
+        devices = [f"/dev/{disk.name}" for disk in self.get_disk_info() if disk.type == 'disk']
+        if not devices:
+            print(f"{Color.WARNING}No disks found{Color.ENDC}")
             return None
         
+        store = self.backup_store(create=True)
+        created = time.time()
+        refs: List[BackupRef] = []
+        failed: Dict[str, str] = {}
+        
+        # Every sfdisk runs with its own deadline; a hung disk is recorded as failed
+        results = self.run_commands({device: ['sfdisk', '-d', device] for device in devices},
+                                    require_root=True, concurrency=workers)
+        for device in devices:
+            try:
+                ref, is_new = self._store_partition_table(store, device, results[device], created=created)
+            except (RuntimeError, OSError) as e:
+                failed[device] = str(e)
+                print(f"  {Color.FAIL}✗{Color.ENDC} {device}: {e}")
+                continue
+            refs.append(ref)
+            state = "new" if is_new else "unchanged"
+            print(f"  {Color.OKGREEN}✓{Color.ENDC} {device} ({state}, {ref.digest[:12]})")
+        
         try:
-            with open(backup_file, 'w') as f:
-                f.write(output)
-            print(f"{Color.OKGREEN}Partition table backed up to: {backup_file}{Color.ENDC}")
-            return backup_file
-        except Exception as e:
-            print(f"{Color.FAIL}Error writing backup file: {e}{Color.ENDC}")
+            manifest = store.write_manifest(refs, failed, created=created)
+        except OSError as e:
+            print(f"{Color.FAIL}Error writing manifest: {e}{Color.ENDC}")
             return None
+        
+        if failed:
+            # The manifest is kept (marked partial) but the run still fails
+            print(f"\n{Color.FAIL}Backed up {len(refs)}/{len(devices)} disks, "
+                  f"partial manifest: {manifest}{Color.ENDC}")
+            return None
+        print(f"\n{Color.OKGREEN}Backed up {len(refs)}/{len(devices)} disks, manifest: {manifest}{Color.ENDC}")
+        return manifest
+    
+    def show_backup(self, device: str, date: Optional[str] = None) -> bool:
+        until = None
+        if date:
+            try:
+                parsed = datetime.fromisoformat(date)
+            except ValueError:
+                print(f"{Color.FAIL}Invalid --date (use YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS): {date}{Color.ENDC}",
+                      file=sys.stderr)
+                return False
+            if len(date) == 10:
+                parsed = parsed.replace(hour=23, minute=59, second=59)
+            until = parsed.timestamp()
+        
+        store = self.backup_store()
+        matches = store.find(device=device, until=until)
+        if not matches:
+            print(f"{Color.FAIL}No backup found for {device}{Color.ENDC}", file=sys.stderr)
+            return False
+        
+        ref = matches[0]
+        created = datetime.fromtimestamp(ref.created).strftime('%Y-%m-%d %H:%M:%S')
+        print(f"# {ref.device} backed up {created} ({ref.digest})", file=sys.stderr)
+        sys.stdout.write(store.read(ref))
+        return True
     
     def confirm_operation(self, message: str, risk_level: OperationRisk) -> bool:
         risk_colors = {
@@ -332,7 +3396,16 @@ class StorageManager:
             response = input(f"Type 'yes' to continue: ")
             return response.lower() in ['yes', 'y']
     
-    def analyze_space_usage(self, path: str = "/"):
+    def analyze_space_usage(self, path: str = "/", incremental: bool = False,
+                            full_rescan: bool = False, largest_files: int = 0,
+                            age_histogram: bool = False, writer: Optional[RecordWriter] = None,
+                            polite: bool = False, dir_rate: float = 200.0):
+        throttle = self.polite_throttle(dir_rate) if polite else None
+        if writer:
+            self._emit_space_usage(writer, path, incremental, full_rescan, largest_files, age_histogram,
+                                   throttle=throttle)
+            return
+        
         print(f"\n{Color.BOLD}=== SPACE USAGE ANALYSIS: {path} ==={Color.ENDC}\n")
         
         if not os.path.exists(path):
@@ -352,23 +3425,430 @@ class StorageManager:
         
         print(f"{Color.OKBLUE}Top 10 space consumers:{Color.ENDC}\n")
         
-        exit_code, output, error = self.run_command(['du', '-h', '--max-depth=1', path])
+        visitors = []
+        largest = None
+        if largest_files > 0:
+            largest = LargestFiles(largest_files)
+            visitors.append(largest)
+        ages = None
+        if age_histogram:
+            ages = AgeHistogram()
+            visitors.append(ages)
         
-        if exit_code == 0:
-            lines = output.strip().split('\n')
-            items = []
-            for line in lines:
-                parts = line.split('\t')
-                if len(parts) == 2:
-                    size, name = parts
-                    items.append((size, name))
-            
-            items.sort(reverse=True)
-            
-            for size, name in items[:10]:
-                print(f"  {size:>10s}  {name}")
-        else:
-            print(f"{Color.WARNING}Unable to analyze space usage{Color.ENDC}")
+        import sqlite3
+        try:
+            result = self.scan_space_usage(path, incremental=incremental, full_rescan=full_rescan,
+                                           visitors=visitors, throttle=throttle)
+        except (OSError, sqlite3.Error) as e:
+            print(f"{Color.WARNING}Unable to analyze space usage: {e}{Color.ENDC}")
+            return
+        
+        for item in result.items[:10]:
+            suffix = '/' if item.is_dir else ''
+            print(f"  {self._format_bytes(item.size):>10s}  {item.path}{suffix}")
+        
+        print(f"\n  Scanned {self._format_bytes(result.total)} in "
+              f"{result.files} files, {result.dirs} directories")
+        if incremental or full_rescan:
+            print(f"  Reused {result.reused} unchanged directories from the scan index "
+                  "(files grown in place there show their old size until --full-rescan)")
+        if result.errors:
+            print(f"  {Color.WARNING}{result.errors} entries could not be read{Color.ENDC}")
+        if throttle and throttle.backoffs:
+            print(f"  Slowed down {throttle.backoffs} times because of I/O pressure")
+        
+        if largest:
+            self._display_largest_files(largest.results())
+        if ages:
+            self._display_age_histogram(result, ages)
+    
+    def _emit_space_usage(self, writer: RecordWriter, path: str, incremental: bool,
+                          full_rescan: bool, largest_files: int, age_histogram: bool,
+                          throttle: Optional[ScanThrottle] = None):
+        if not os.path.exists(path):
+            writer.emit('error', {'message': f"Path does not exist: {path}"})
+            return
+        
+        total, used, free = shutil.disk_usage(path)
+        writer.emit('filesystem', {'path': path, 'total': total, 'used': used, 'free': free})
+        
+        largest = LargestFiles(largest_files) if largest_files > 0 else None
+        ages = AgeHistogram() if age_histogram else None
+        visitors = [v for v in (largest, ages) if v]
+        import sqlite3
+        try:
+            # Top-level entries are written as soon as their subtree is done
+            result = self.scan_space_usage(path, incremental=incremental, full_rescan=full_rescan,
+                                           visitors=visitors, throttle=throttle,
+                                           on_entry=lambda item: writer.emit('entry', asdict(item)))
+        except (OSError, sqlite3.Error) as e:
+            writer.emit('error', {'message': f"Unable to analyze space usage: {e}"})
+            return
+        
+        writer.emit('summary', {'path': result.path, 'total': result.total, 'files': result.files,
+                                'dirs': result.dirs, 'errors': result.errors,
+                                'reused': result.reused})
+        if largest:
+            for entry in largest.results():
+                writer.emit('largest_file', asdict(entry))
+        if ages:
+            for bucket, hist in ages.buckets.items():
+                data = {'path': bucket, 'age_classes': ages.AGE_LABELS,
+                        'size_classes': ages.SIZE_LABELS}
+                data.update(hist)
+                writer.emit('age_histogram', data)
+    
+    def _display_age_histogram(self, result: ScanResult, ages: AgeHistogram):
+        print(f"\n{Color.OKBLUE}Data age by top-level entry (allocated bytes):{Color.ENDC}\n")
+        
+        def row(label: str, values: List[int]) -> str:
+            return f"{label:<14}" + ''.join(f"{self._format_bytes(v):>12s}" for v in values)
+        
+        header = f"{'':<14}" + ''.join(f"{label:>12s}" for label in ages.AGE_LABELS)
+        totals = ages.new_bucket()
+        for item in result.items:
+            hist = ages.buckets.get(item.path)
+            if hist is None:
+                continue
+            for key in totals:
+                totals[key] = [a + b for a, b in zip(totals[key], hist[key])]
+            if not item.is_dir:
+                continue
+            print(f"  {Color.BOLD}{item.path}/{Color.ENDC} ({self._format_bytes(item.size)})")
+            print(f"    {header}")
+            print(f"    {row('modified', hist['mtime'])}")
+            print(f"    {row('accessed', hist['atime'])}")
+            print()
+        
+        print(f"  {Color.BOLD}All of {result.path}{Color.ENDC}")
+        print(f"    {header}")
+        print(f"    {row('modified', totals['mtime'])}")
+        print(f"    {row('accessed', totals['atime'])}")
+        print(f"    {'':<14}" + ''.join(f"{label:>12s}" for label in ages.SIZE_LABELS))
+        print(f"    {row('file size', totals['size'])}")
+        print(f"    {'files':<14}" + ''.join(f"{count:>12d}" for count in totals['size_count']))
+    
+    def dedupe_report(self, path: str = "/", min_size: int = 1024 * 1024, limit: int = 20):
+        print(f"\n{Color.BOLD}=== DUPLICATE FILES: {path} ==={Color.ENDC}\n")
+        
+        if not os.path.exists(path):
+            print(f"{Color.FAIL}Path does not exist: {path}{Color.ENDC}")
+            return
+        
+        groups = SizeGroups(min_size=min_size)
+        try:
+            result = self.scan_space_usage(path, visitors=[groups])
+        except OSError as e:
+            print(f"{Color.WARNING}Unable to scan {path}: {e}{Color.ENDC}")
+            return
+        
+        collisions = groups.collisions()
+        candidate_bytes = sum(size * len(paths) for size, paths in collisions.items())
+        print(f"Scanned {result.files} files; {sum(len(p) for p in collisions.values())} files "
+              f"({self._format_bytes(candidate_bytes)}) share a size with another file\n")
+        
+        finder = DuplicateFinder()
+        duplicates = finder.find(collisions)
+        
+        if not duplicates:
+            print(f"{Color.OKGREEN}No duplicate files found{Color.ENDC}")
+        for group in duplicates[:limit]:
+            print(f"  {Color.BOLD}{self._format_bytes(group.reclaimable)} reclaimable{Color.ENDC} - "
+                  f"{len(group.paths)} copies of {self._format_bytes(group.size)}")
+            for dup in group.paths:
+                print(f"    {dup}")
+            print()
+        if len(duplicates) > limit:
+            print(f"  ... {len(duplicates) - limit} more groups\n")
+        
+        total = sum(g.reclaimable for g in duplicates)
+        print(f"Total reclaimable: {Color.BOLD}{self._format_bytes(total)}{Color.ENDC} "
+              f"in {len(duplicates)} groups (read {self._format_bytes(finder.bytes_read)})")
+        if finder.errors or result.errors:
+            print(f"{Color.WARNING}{finder.errors + result.errors} files could not be read{Color.ENDC}")
+    
+    def _display_largest_files(self, files: List[FileEntry]):
+        print(f"\n{Color.OKBLUE}Largest files:{Color.ENDC}\n")
+        if not files:
+            print(f"  {Color.WARNING}No files found{Color.ENDC}")
+            return
+        owners: Dict[int, str] = {}
+        for entry in files:
+            if entry.uid not in owners:
+                try:
+                    owners[entry.uid] = pwd.getpwuid(entry.uid).pw_name
+                except KeyError:
+                    owners[entry.uid] = str(entry.uid)
+            modified = datetime.fromtimestamp(entry.mtime).strftime('%Y-%m-%d %H:%M')
+            print(f"  {self._format_bytes(entry.size):>10s}  {owners[entry.uid]:<12} {modified}  {entry.path}")
+    
+    def watch(self, interval: float = 10.0, thresholds: Optional[List[float]] = None,
+              history: int = 360, count: Optional[int] = None, record: bool = False):
+        watcher = StorageWatcher(interval=interval, thresholds=thresholds, history=history,
+                                 capacity_history=self.capacity_history() if record else None)
+        signal.signal(signal.SIGTERM, watcher.stop)
+        print(f"{Color.BOLD}Watching mounts every {interval:g}s "
+              f"(thresholds: {', '.join(f'{t:g}%' for t in watcher.thresholds)}){Color.ENDC}",
+              flush=True)
+        try:
+            watcher.run(count=count)
+        except KeyboardInterrupt:
+            pass
+    
+    def iostat(self, interval: float = 1.0, count: Optional[int] = None,
+               writer: Optional[RecordWriter] = None):
+        devices = {disk.maj_min: disk for disk in self.get_disk_info() if disk.maj_min}
+        sampler = DiskStatsSampler()
+        sampler.sample()
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        
+        samples = 0
+        try:
+            while not stop.wait(interval):
+                stats = [s for s in sampler.sample() if s.maj_min in devices]
+                samples += 1
+                if writer:
+                    for s in stats:
+                        data = asdict(s)
+                        data['kernel_name'] = s.name
+                        data['name'] = self._iostat_name(s, devices)
+                        data['mountpoint'] = devices[s.maj_min].mountpoint
+                        writer.emit('iostat', data)
+                else:
+                    self._display_iostat(stats, devices)
+                if count and samples >= count:
+                    break
+        except KeyboardInterrupt:
+            pass
+    
+    @staticmethod
+    def _iostat_name(s: DeviceIOStats, devices: Dict[str, DiskInfo]) -> str:
+        # /proc/diskstats only has kernel names (dm-0); show the LV name the rest of the tool uses
+        disk = devices.get(s.maj_min)
+        return disk.name if disk and disk.name else s.name
+    
+    def _display_iostat(self, stats: List[DeviceIOStats], devices: Dict[str, DiskInfo]):
+        print(f"\n{Color.BOLD}{datetime.now().strftime('%H:%M:%S')}  "
+              f"{'Device':<12} {'r/s':>8} {'w/s':>8} {'rMB/s':>8} {'wMB/s':>8} "
+              f"{'r_await':>8} {'w_await':>8} {'aqu-sz':>7} {'%util':>6}  Mountpoint{Color.ENDC}")
+        for s in stats:
+            color = Color.FAIL if s.util_percent >= 90 else Color.WARNING if s.util_percent >= 70 else ''
+            end = Color.ENDC if color else ''
+            print(f"{color}          {self._iostat_name(s, devices):<12} {s.read_iops:8.1f} {s.write_iops:8.1f} "
+                  f"{s.read_bytes_per_sec / 1048576:8.2f} {s.write_bytes_per_sec / 1048576:8.2f} "
+                  f"{s.read_await_ms:8.2f} {s.write_await_ms:8.2f} {s.queue_depth:7.2f} "
+                  f"{s.util_percent:6.1f}  {devices[s.maj_min].mountpoint or ''}{end}")
+        sys.stdout.flush()
+    
+    def top_writers(self, interval: float = 5.0, count: int = 1, limit: int = 10,
+                    writer: Optional[RecordWriter] = None):
+        if not self.check_root_privileges():
+            print(f"{Color.WARNING}Not running as root: only your own processes are visible{Color.ENDC}",
+                  file=sys.stderr)
+        sampler = ProcessIOSampler(self.mount_collector.mounts())
+        sampler.sample()
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        
+        samples = 0
+        try:
+            while not stop.wait(interval):
+                by_mount: Dict[str, List[ProcessWriter]] = {}
+                for proc in sampler.sample():
+                    for mountpoint in proc.mountpoints or ['(unattributed)']:
+                        by_mount.setdefault(mountpoint, []).append(proc)
+                samples += 1
+                if writer:
+                    for mountpoint, procs in by_mount.items():
+                        for proc in procs[:limit]:
+                            data = asdict(proc)
+                            data['mountpoint'] = mountpoint
+                            writer.emit('writer', data)
+                else:
+                    self._display_top_writers(by_mount, limit)
+                if count and samples >= count:
+                    break
+        except KeyboardInterrupt:
+            pass
+    
+    def _display_top_writers(self, by_mount: Dict[str, List[ProcessWriter]], limit: int):
+        print(f"\n{Color.BOLD}=== TOP WRITERS {datetime.now().strftime('%H:%M:%S')} ==={Color.ENDC}")
+        if not by_mount:
+            print(f"\n  {Color.OKGREEN}No process wrote during the interval{Color.ENDC}")
+        ranked = sorted(by_mount.items(), key=lambda item: sum(p.write_bytes_per_sec for p in item[1]),
+                        reverse=True)
+        for mountpoint, procs in ranked:
+            total = sum(p.write_bytes_per_sec for p in procs)
+            print(f"\n{Color.OKBLUE}{mountpoint}{Color.ENDC}  {self._format_bytes(int(total))}/s")
+            for proc in procs[:limit]:
+                shared = f"  (also {len(proc.mountpoints) - 1} other mounts)" if len(proc.mountpoints) > 1 else ""
+                print(f"  {self._format_bytes(int(proc.write_bytes_per_sec)):>10s}/s  "
+                      f"{proc.pid:>7}  {proc.comm}{shared}")
+        sys.stdout.flush()
+    
+    def record_usage(self, history: Optional[CapacityHistory] = None,
+                     usages: Optional[List[MountUsage]] = None) -> int:
+        history = history or self.capacity_history()
+        if usages is None:
+            usages = self.mount_collector.collect()
+        now = time.time()
+        recorded = 0
+        for usage in usages:
+            if usage.error or usage.total == 0 or usage.fstype == 'devtmpfs':
+                continue
+            history.append(usage.mountpoint, now, usage.used, usage.avail)
+            recorded += 1
+        return recorded
+    
+    def display_forecast(self, window_days: float = 7.0):
+        print(f"\n{Color.BOLD}=== CAPACITY FORECAST (last {window_days:g} days) ==={Color.ENDC}\n")
+        
+        history = self.capacity_history()
+        forecasts = [f for f in (history.forecast(m, window_days * 86400) for m in history.mounts()) if f]
+        if not forecasts:
+            print(f"{Color.WARNING}No usage history recorded yet "
+                  f"(run 'record' periodically or 'watch --record'){Color.ENDC}")
+            return
+        
+        forecasts.sort(key=lambda f: f.seconds_to_full if f.seconds_to_full is not None else float('inf'))
+        
+        for fc in forecasts:
+            percent = fc.used * 100.0 / max(1, fc.used + fc.avail)
+            print(f"  {Color.BOLD}{fc.mountpoint}{Color.ENDC}")
+            print(f"    Used: {self._format_bytes(fc.used)} ({percent:.1f}%), "
+                  f"Available: {self._format_bytes(fc.avail)}")
+            if fc.samples < 2:
+                print("    Growth: not enough samples")
+            elif fc.rate <= 0:
+                print(f"    Growth: {Color.OKGREEN}flat or shrinking{Color.ENDC}")
+            else:
+                days = fc.seconds_to_full / 86400
+                color = Color.FAIL if days < 7 else Color.WARNING if days < 30 else Color.OKGREEN
+                full_at = datetime.fromtimestamp(time.time() + fc.seconds_to_full)
+                print(f"    Growth: {self._format_bytes(fc.rate * 86400)}/day over {fc.samples} samples")
+                print(f"    Full in: {color}{days:.1f} days ({full_at.strftime('%Y-%m-%d %H:%M')}){Color.ENDC}")
+            print()
+    
+    def export_metrics(self, listen: Optional[str] = None, textfile: Optional[str] = None,
+                       ttl: float = 15.0, interval: float = MetricsExporter.TEXTFILE_INTERVAL):
+        exporter = MetricsExporter(self, ttl=ttl)
+        
+        if textfile:
+            if listen is None:
+                exporter.write_textfile(textfile)
+                print(f"{Color.OKGREEN}Metrics written to: {textfile}{Color.ENDC}")
+                return
+            threading.Thread(target=self._write_textfile_loop,
+                             args=(exporter, textfile, interval), daemon=True).start()
+        
+        host, _, port = (listen or ':9628').rpartition(':')
+        try:
+            port_num = int(port)
+        except ValueError:
+            print(f"{Color.FAIL}Invalid --listen address: {listen}{Color.ENDC}")
+            return
+        print(f"{Color.BOLD}Serving metrics on http://{host or '0.0.0.0'}:{port_num}/metrics{Color.ENDC}",
+              flush=True)
+        try:
+            exporter.serve(host, port_num)
+        except OSError as e:
+            print(f"{Color.FAIL}Cannot serve metrics: {e}{Color.ENDC}")
+        except KeyboardInterrupt:
+            pass
+    
+    def _write_textfile_loop(self, exporter: MetricsExporter, path: str, interval: float):
+        while True:
+            try:
+                exporter.write_textfile(path)
+            except OSError as e:
+                print(f"{Color.WARNING}Cannot write {path}: {e}{Color.ENDC}", flush=True)
+            time.sleep(interval)
+    
+    def scan_space_usage(self, path: str, incremental: bool = False, full_rescan: bool = False,
+                         visitors: Optional[List] = None, throttle: Optional[ScanThrottle] = None,
+                         on_entry=None) -> ScanResult:
+        index = None
+        if incremental or full_rescan:
+            index = ScanIndex(os.path.join(self.ensure_cache_dir(), "scan-index.sqlite3"))
+        # A throttled scan also keeps few requests in flight
+        scanner = DirectoryScanner(workers=2 if throttle else None, index=index,
+                                   full_rescan=full_rescan, visitors=visitors, throttle=throttle)
+        return scanner.scan(path, on_entry=on_entry)
+    
+    def polite_throttle(self, max_rate: float) -> ScanThrottle:
+        throttle = ScanThrottle(max_rate=max_rate)
+        if not throttle.apply_priority():
+            print(f"{Color.WARNING}Could not set idle I/O priority; pacing reads only{Color.ENDC}",
+                  file=sys.stderr)
+        return throttle
+    
+    def collect(self, what: str, path: str = "/", limit: int = 20) -> Dict:
+        if what == 'overview':
+            return {'devices': [asdict(d) for d in self.get_disk_info()]}
+        if what == 'lvm':
+            return asdict(self.get_lvm_info())
+        if what == 'analyze':
+            result = self.scan_space_usage(path)
+            total, used, free = shutil.disk_usage(path)
+            data = asdict(result)
+            data['items'] = data['items'][:limit]
+            data.update({'fs_total': total, 'fs_used': used, 'fs_free': free})
+            return data
+        raise ValueError(f"unknown collector: {what}")
+    
+    def run_fleet(self, hosts: List[str], what: str, transport: str = 'ssh', path: str = "/",
+                  concurrency: int = 50, timeout: float = 60.0, sudo: bool = False,
+                  as_json: bool = False):
+        runner = FleetRunner(FLEET_TRANSPORTS[transport](), concurrency=concurrency,
+                             timeout=timeout, sudo=sudo)
+        started = time.monotonic()
+        results = runner.run(hosts, ['--collect', what, '--path', path])
+        elapsed = time.monotonic() - started
+        
+        if as_json:
+            print(json.dumps({
+                'collector': what,
+                'elapsed': round(elapsed, 3),
+                'hosts': [asdict(r) for r in sorted(results, key=lambda r: r.host)]
+            }, indent=2))
+            return
+        
+        print(f"\n{Color.BOLD}=== FLEET {what.upper()}: {len(hosts)} hosts in {elapsed:.1f}s ==={Color.ENDC}\n")
+        rows = []
+        for r in results:
+            if not r.ok:
+                continue
+            if what == 'overview':
+                for d in r.data.get('devices', []):
+                    if d.get('used_bytes') is not None:
+                        percent = d['used_bytes'] * 100.0 / max(1, d['used_bytes'] + d['avail_bytes'])
+                        rows.append((percent, r.host, d['name'], d.get('mountpoint') or '',
+                                     f"{self._format_bytes(d['used_bytes'])} used, "
+                                     f"{self._format_bytes(d['avail_bytes'])} free ({percent:.1f}%)"))
+            elif what == 'lvm':
+                for vg in r.data.get('volume_groups', []):
+                    percent = (vg['vg_size'] - vg['vg_free']) * 100.0 / max(1, vg['vg_size'])
+                    rows.append((percent, r.host, vg['vg_name'], f"{vg['pv_count']} PVs",
+                                 f"{self._format_bytes(vg['vg_free'])} free of "
+                                 f"{self._format_bytes(vg['vg_size'])}"))
+            else:
+                for item in r.data.get('items', []):
+                    rows.append((item['size'], r.host, item['path'], '', self._format_bytes(item['size'])))
+        
+        rows.sort(key=lambda row: (-row[0], row[1], row[2]))
+        for _, host, name, where, detail in rows:
+            print(f"  {Color.BOLD}{host:<24}{Color.ENDC} {name:<28} {where:<24} {detail}")
+        
+        failed = sorted((r for r in results if not r.ok), key=lambda r: r.host)
+        if failed:
+            print(f"\n{Color.FAIL}Failed hosts:{Color.ENDC}")
+            for r in failed:
+                print(f"  {r.host}: {r.error}")
+        slowest = max(results, key=lambda r: r.elapsed, default=None)
+        if slowest:
+            print(f"\n  {len(results) - len(failed)}/{len(results)} hosts succeeded, "
+                  f"slowest {slowest.host} ({slowest.elapsed:.1f}s)")
     
     def _format_bytes(self, bytes_val: int) -> str:
         for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
@@ -377,31 +3857,128 @@ class StorageManager:
             bytes_val /= 1024.0
         return f"{bytes_val:.2f} PB"
     
-    def list_backups(self):
-        print(f"\n{Color.BOLD}=== PARTITION TABLE BACKUPS ==={Color.ENDC}\n")
+    def list_backups(self, writer: Optional[RecordWriter] = None, limit: Optional[int] = None,
+                     since: Optional[float] = None, device: Optional[str] = None):
+        refs = (self.backup_store().find(device=device, since=since)
+                if os.path.exists(self.backup_dir) else [])
+        if limit is not None:
+            refs = refs[:limit]
         
-        if not os.path.exists(self.backup_dir):
-            print(f"{Color.WARNING}No backups found{Color.ENDC}")
+        if writer:
+            for ref in refs:
+                data = asdict(ref)
+                data['created'] = datetime.fromtimestamp(ref.created).isoformat()
+                writer.emit('backup', data)
             return
         
-        backups = [f for f in os.listdir(self.backup_dir) if f.endswith('.backup')]
+        print(f"\n{Color.BOLD}=== PARTITION TABLE BACKUPS ==={Color.ENDC}\n")
         
-        if not backups:
+        if not refs:
             print(f"{Color.WARNING}No backups found{Color.ENDC}")
             return
         
-        backups.sort(reverse=True)
-        
-        for backup in backups:
-            full_path = os.path.join(self.backup_dir, backup)
-            size = os.path.getsize(full_path)
-            mtime = datetime.fromtimestamp(os.path.getmtime(full_path))
+        store = self.backup_store()
+        for ref in refs:
+            created = datetime.fromtimestamp(ref.created)
+            legacy = ref.digest.startswith('legacy:')
+            path = (os.path.join(self.backup_dir, ref.digest[len('legacy:'):]) if legacy
+                    else store.object_path(ref.digest))
             
-            print(f"  {Color.BOLD}{backup}{Color.ENDC}")
-            print(f"    Size: {size} bytes")
-            print(f"    Created: {mtime.strftime('%Y-%m-%d %H:%M:%S')}")
-            print(f"    Path: {full_path}")
+            print(f"  {Color.BOLD}{ref.device}{Color.ENDC} {created.strftime('%Y-%m-%d %H:%M:%S')}")
+            if not legacy:
+                print(f"    Size: {ref.size} bytes")
+                print(f"    Digest: {ref.digest[:16]}")
+            print(f"    Path: {path}")
             print()
+    
+    def prune_backups(self, keep_last: int = 0, keep_daily: int = 0, keep_weekly: int = 0,
+                      dry_run: bool = False, assume_yes: bool = False) -> bool:
+        if not (keep_last or keep_daily or keep_weekly):
+            print(f"{Color.FAIL}At least one of --keep-last, --keep-daily, --keep-weekly is required{Color.ENDC}")
+            return False
+        if not os.path.exists(self.backup_dir):
+            print(f"{Color.WARNING}No backups found{Color.ENDC}")
+            return True
+        
+        store = self.backup_store()
+        removed, kept, _ = store.prune(keep_last, keep_daily, keep_weekly, dry_run=True)
+        
+        print(f"\n{Color.BOLD}=== PRUNE BACKUPS ==={Color.ENDC}\n")
+        for ref in removed:
+            created = datetime.fromtimestamp(ref.created).strftime('%Y-%m-%d %H:%M:%S')
+            print(f"  {Color.FAIL}remove{Color.ENDC} {ref.device} {created}")
+        print(f"\n{len(kept)} backups kept, {len(removed)} to remove")
+        
+        if dry_run or not removed:
+            return True
+        if not assume_yes and not self.confirm_operation(
+                f"Remove {len(removed)} partition table backups?", OperationRisk.MEDIUM):
+            print(f"{Color.WARNING}Prune cancelled{Color.ENDC}")
+            return False
+        
+        try:
+            removed, kept, blobs = store.prune(keep_last, keep_daily, keep_weekly)
+        except OSError as e:
+            print(f"{Color.FAIL}Error pruning backups: {e}{Color.ENDC}")
+            return False
+        print(f"{Color.OKGREEN}Removed {len(removed)} backups ({blobs} stored tables no longer referenced){Color.ENDC}")
+        return True
+    
+    def cleanup(self, rules: Optional[List[str]] = None, older_than: Optional[float] = None,
+                workers: int = 8, dry_run: bool = False, assume_yes: bool = False) -> bool:
+        if not dry_run and not self.check_root_privileges():
+            print(f"{Color.FAIL}Root privileges required (use --dry-run to only size the cleanup){Color.ENDC}")
+            return False
+        
+        selected = [CLEANUP_RULES[name](older_than) for name in (rules or CLEANUP_RULES)]
+        active = [rule for rule in selected if rule.available()]
+        
+        print(f"\n{Color.BOLD}=== CLEANUP ==={Color.ENDC}\n")
+        if not active:
+            print(f"{Color.WARNING}Nothing to clean up on this host{Color.ENDC}")
+            return True
+        
+        def size(rule):
+            try:
+                return rule.plan()
+            except (OSError, RuntimeError, ValueError) as e:
+                return CleanupPlan(rule.name, rule.description, error=str(e))
+        
+        # Sizing pass: every rule walks its own directories at the same time
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=len(active)) as pool:
+            plans = list(pool.map(size, active))
+        
+        for plan in plans:
+            if plan.error:
+                print(f"  {Color.FAIL}✗{Color.ENDC} {plan.rule:<17} {plan.error}")
+                continue
+            print(f"  {Color.BOLD}{plan.rule:<19}{Color.ENDC} {len(plan.items):>8} items "
+                  f"{self._format_bytes(plan.bytes):>12}  {plan.description}")
+        total = sum(plan.bytes for plan in plans)
+        print(f"\n{Color.BOLD}Reclaimable: {self._format_bytes(total)} ({total} bytes){Color.ENDC}")
+        
+        pending = [(rule, plan) for rule, plan in zip(active, plans) if plan.items]
+        if dry_run or not pending:
+            return True
+        if not assume_yes and not self.confirm_operation(
+                f"Delete {sum(len(plan.items) for _, plan in pending)} items "
+                f"({self._format_bytes(total)})?", OperationRisk.MEDIUM):
+            print(f"{Color.WARNING}Cleanup cancelled{Color.ENDC}")
+            return False
+        
+        # Deletes from all rules share one bounded pool; freed bytes are summed per rule
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            jobs = [(rule, rule.apply(plan, pool)) for rule, plan in pending]
+            freed = {rule.name: sum(job.result() for job in futures) for rule, futures in jobs}
+        
+        print()
+        for rule, _ in pending:
+            errors = f"  {Color.WARNING}({rule.errors} failed){Color.ENDC}" if rule.errors else ""
+            print(f"  {Color.OKGREEN}✓{Color.ENDC} {rule.name:<17} freed {self._format_bytes(freed[rule.name])}{errors}")
+        total_freed = sum(freed.values())
+        print(f"\n{Color.OKGREEN}Freed {self._format_bytes(total_freed)} ({total_freed} bytes){Color.ENDC}")
+        return not any(rule.errors for rule, _ in pending)
 
 def main():
     parser = argparse.ArgumentParser(
@@ -409,29 +3986,206 @@ def main():
         formatter_class=argparse.RawDescriptionHelpFormatter
     )
     
-    parser.add_argument('command', choices=['overview', 'lvm', 'backup', 'analyze', 'list-backups'],
+    parser.add_argument('command', choices=['overview', 'lvm', 'backup', 'analyze', 'list-backups',
+                                            'watch', 'export', 'record', 'forecast', 'fleet',
+                                            'collect', 'dedupe-report', 'show-backup', 'prune', 'iostat', 'top-writers',
+                                            'cleanup'],
                        help='Command to execute')
     parser.add_argument('--device', help='Device path (e.g., /dev/sda)')
     parser.add_argument('--path', default='/', help='Path for analysis')
+    parser.add_argument('--date', help='show-backup: newest backup on or before this date (YYYY-MM-DD)')
+    parser.add_argument('--since', type=parse_date, help='list-backups: only backups taken on or after this date')
+    parser.add_argument('--keep-last', type=int, default=0, help='prune: keep the N newest backups per device')
+    parser.add_argument('--keep-daily', type=int, default=0,
+                       help='prune: keep the newest backup of each of the last N days per device')
+    parser.add_argument('--keep-weekly', type=int, default=0,
+                       help='prune: keep the newest backup of each of the last N weeks per device')
+    parser.add_argument('--dry-run', action='store_true', help='prune, cleanup: only show what would be removed')
+    parser.add_argument('--yes', action='store_true', help='prune, cleanup: do not ask for confirmation')
+    parser.add_argument('--rule', action='append', choices=sorted(CLEANUP_RULES),
+                       help='cleanup: rule to run (repeatable, default: all that apply to this host)')
+    parser.add_argument('--older-than', type=float, metavar='DAYS',
+                       help='cleanup: only remove files (or images) older than this many days '
+                            '(default: journal 3, tmp 7, old-logs 14)')
+    parser.add_argument('--disk-backend', choices=['auto', 'sysfs', 'lsblk'], default='auto',
+                       help='Block device enumeration backend (default: sysfs when available)')
+    parser.add_argument('--incremental', action='store_true',
+                       help='Reuse the scan index for directories unchanged since the last analyze. '
+                            'A file that grows in place does not change its directory, so it keeps '
+                            'its old size until the next --full-rescan')
+    parser.add_argument('--full-rescan', action='store_true',
+                       help='Ignore the scan index for this analyze but rebuild it')
+    parser.add_argument('--largest-files', type=int, default=0, metavar='N',
+                       help='Also list the N largest files under --path')
+    parser.add_argument('--age-histogram', action='store_true',
+                       help='Break analyze results down by file age (mtime/atime) and size class')
+    parser.add_argument('--polite', action='store_true',
+                       help='Scan at idle I/O priority and nice 19, paced and backing off under I/O pressure')
+    parser.add_argument('--dir-rate', type=float, default=200.0,
+                       help='Directories read per second with --polite (default: 200)')
+    parser.add_argument('--min-size', type=parse_size, default=1024 * 1024,
+                       help='Smallest file considered by dedupe-report, e.g. 64K or 10M (default: 1M)')
+    parser.add_argument('--limit', type=int, help='Maximum number of entries to show')
+    parser.add_argument('--interval', type=float,
+                       help='Seconds between samples for watch (default: 10), iostat (default: 1) '
+                            'or top-writers (default: 5), or between export --textfile rewrites '
+                            f'(default: {MetricsExporter.TEXTFILE_INTERVAL:g})')
+    parser.add_argument('--threshold', type=float, action='append',
+                       help='Usage percent that triggers a watch event (repeatable, default: 90)')
+    parser.add_argument('--history', type=int, default=360,
+                       help='Samples kept per mount by watch (default: 360)')
+    parser.add_argument('--count', type=int,
+                       help='Stop watch or iostat after this many samples (top-writers: default 1)')
+    parser.add_argument('--record', action='store_true',
+                       help='Also append watch samples to the capacity history')
+    parser.add_argument('--window-days', type=float, default=7.0,
+                       help='History window used by forecast (default: 7)')
+    parser.add_argument('--listen', help='HOST:PORT for the export HTTP endpoint (default: :9628)')
+    parser.add_argument('--textfile', help='Write export metrics to this node_exporter textfile')
+    parser.add_argument('--cache-ttl', type=float, default=15.0,
+                       help='Seconds export reuses collected metrics across scrapes (default: 15)')
+    parser.add_argument('--command-timeout', type=float,
+                       help='Seconds any external command (lsblk, lvm, sfdisk, ...) may run before it is '
+                            'killed (default: 15 for lsblk, 30 for lvm and sfdisk, 60 otherwise)')
+    parser.add_argument('--metadata-ttl', type=float, default=10.0,
+                       help='Seconds device and LVM metadata cached in /run is reused across invocations '
+                            'while topology is unchanged (0 disables, default: 10)')
+    parser.add_argument('--collect', choices=['overview', 'lvm', 'analyze'], default='overview',
+                       help='Collector run on every host by fleet (default: overview)')
+    parser.add_argument('--hosts', help='Comma-separated hosts for fleet')
+    parser.add_argument('--hosts-file', help='File with one fleet host per line')
+    parser.add_argument('--transport', choices=sorted(FLEET_TRANSPORTS), default='ssh',
+                       help='How fleet reaches hosts (default: ssh)')
+    parser.add_argument('--concurrency', type=int,
+                       help='Hosts queried at the same time by fleet, disks dumped at once by backup --all '
+                            '(default: 50) or files deleted at once by cleanup (default: 8)')
+    parser.add_argument('--all', action='store_true', help='backup: snapshot every disk')
+    parser.add_argument('--timeout', type=float, default=60.0,
+                       help='Per-host timeout in seconds for fleet (default: 60)')
+    parser.add_argument('--sudo', action='store_true', help='Run the fleet collector with sudo -n')
+    parser.add_argument('--json', action='store_true', help='Print fleet results as JSON')
+    parser.add_argument('--format', choices=['text', 'json', 'ndjson'], default='text',
+                       help='Output format for overview, lvm, analyze and list-backups (default: text)')
     
     args = parser.parse_args()
     
-    manager = StorageManager()
-    manager.print_banner()
+    # Exit quietly when piped into head and the like. export and fleet write to
+    # sockets and child processes, where a closed peer must not kill us.
+    if args.command not in ('export', 'fleet'):
+        signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+    
+    manager = StorageManager(disk_backend=args.disk_backend)
+    manager.metadata_ttl = args.metadata_ttl
+    manager.command_timeout = args.command_timeout
+    
+    if args.command == 'collect':
+        # Machine interface used by fleet: JSON on stdout, nothing else
+        print(json.dumps(manager.collect(args.collect, path=args.path)))
+        return
+    
+    if args.format != 'text' and args.command in ('overview', 'lvm', 'analyze', 'list-backups', 'iostat',
+                                                   'top-writers'):
+        writer = RecordWriter(args.format, args.command)
+        try:
+            if args.command == 'overview':
+                manager.display_disk_overview(writer=writer)
+            elif args.command == 'lvm':
+                manager.display_lvm_info(writer=writer)
+            elif args.command == 'analyze':
+                manager.analyze_space_usage(args.path, incremental=args.incremental,
+                                            full_rescan=args.full_rescan,
+                                            largest_files=args.largest_files,
+                                            age_histogram=args.age_histogram, writer=writer,
+                                            polite=args.polite, dir_rate=args.dir_rate)
+            elif args.command == 'iostat':
+                manager.iostat(interval=args.interval or 1.0, count=args.count, writer=writer)
+            elif args.command == 'top-writers':
+                manager.top_writers(interval=args.interval or 5.0, count=args.count or 1,
+                                    limit=args.limit or 10, writer=writer)
+            else:
+                manager.list_backups(writer=writer, limit=args.limit, since=args.since,
+                                     device=args.device)
+        finally:
+            writer.close()
+        return
+    
+    # Scripts and pipes get plain output without the banner
+    if sys.stdout.isatty() and not args.json and args.command != 'show-backup':
+        manager.print_banner()
     
     if args.command == 'overview':
         manager.display_disk_overview()
     elif args.command == 'lvm':
         manager.display_lvm_info()
     elif args.command == 'backup':
-        if not args.device:
-            print(f"{Color.FAIL}--device required for backup command{Color.ENDC}")
+        if args.all:
+            if not manager.backup_all_partition_tables(workers=args.concurrency or 50):
+                sys.exit(1)
+        elif not args.device:
+            print(f"{Color.FAIL}--device or --all required for backup command{Color.ENDC}")
             sys.exit(1)
-        manager.backup_partition_table(args.device)
+        else:
+            manager.backup_partition_table(args.device)
     elif args.command == 'analyze':
-        manager.analyze_space_usage(args.path)
+        manager.analyze_space_usage(args.path, incremental=args.incremental,
+                                    full_rescan=args.full_rescan,
+                                    largest_files=args.largest_files,
+                                    age_histogram=args.age_histogram,
+                                    polite=args.polite, dir_rate=args.dir_rate)
+    elif args.command == 'show-backup':
+        if not args.device:
+            print(f"{Color.FAIL}--device required for show-backup command{Color.ENDC}")
+            sys.exit(1)
+        if not manager.show_backup(args.device, date=args.date):
+            sys.exit(1)
+    elif args.command == 'dedupe-report':
+        manager.dedupe_report(args.path, min_size=args.min_size, limit=args.limit or 20)
     elif args.command == 'list-backups':
-        manager.list_backups()
+        manager.list_backups(limit=args.limit, since=args.since, device=args.device)
+    elif args.command == 'prune':
+        if not manager.prune_backups(keep_last=args.keep_last, keep_daily=args.keep_daily,
+                                     keep_weekly=args.keep_weekly, dry_run=args.dry_run,
+                                     assume_yes=args.yes):
+            sys.exit(1)
+    elif args.command == 'cleanup':
+        if not manager.cleanup(rules=args.rule, older_than=args.older_than,
+                               workers=args.concurrency or 8, dry_run=args.dry_run,
+                               assume_yes=args.yes):
+            sys.exit(1)
+    elif args.command == 'watch':
+        manager.watch(interval=args.interval or 10.0, thresholds=args.threshold,
+                      history=args.history, count=args.count, record=args.record)
+    elif args.command == 'record':
+        recorded = manager.record_usage()
+        print(f"{Color.OKGREEN}Recorded usage for {recorded} mounts{Color.ENDC}")
+    elif args.command == 'forecast':
+        manager.display_forecast(window_days=args.window_days)
+    elif args.command == 'fleet':
+        hosts = [h.strip() for h in (args.hosts or '').split(',') if h.strip()]
+        if args.hosts_file:
+            with open(args.hosts_file) as f:
+                hosts.extend(line.strip() for line in f
+                             if line.strip() and not line.lstrip().startswith('#'))
+        if not hosts:
+            print(f"{Color.FAIL}--hosts or --hosts-file required for fleet command{Color.ENDC}")
+            sys.exit(1)
+        try:
+            manager.run_fleet(hosts, args.collect, transport=args.transport, path=args.path,
+                              concurrency=args.concurrency or 50, timeout=args.timeout, sudo=args.sudo,
+                              as_json=args.json)
+        except BrokenPipeError:
+            # SIGPIPE stays ignored for fleet; the reader went away (fleet --json | head).
+            # Point stdout at /dev/null so the flush at exit does not fail again.
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            sys.exit(1)
+    elif args.command == 'iostat':
+        manager.iostat(interval=args.interval or 1.0, count=args.count)
+    elif args.command == 'top-writers':
+        manager.top_writers(interval=args.interval or 5.0, count=args.count or 1,
+                            limit=args.limit or 10)
+    elif args.command == 'export':
+        manager.export_metrics(listen=args.listen, textfile=args.textfile, ttl=args.cache_ttl,
+                               interval=args.interval or MetricsExporter.TEXTFILE_INTERVAL)
 
 if __name__ == '__main__':
     main()
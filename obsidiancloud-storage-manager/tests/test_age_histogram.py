@@ -0,0 +1,72 @@
+import os
+from types import SimpleNamespace
+
+from storage_manager import AgeHistogram, DirectoryScanner
+
+NOW = 1000 * 86400.0
+DAY = 86400
+
+
+def stat(mtime_days, atime_days=0, st_size=1):
+    return SimpleNamespace(st_mtime=NOW - mtime_days * DAY, st_atime=NOW - atime_days * DAY, st_size=st_size)
+
+
+def test_ages_fall_into_30_90_365_day_classes():
+    hist = AgeHistogram(now=NOW)
+    # Exactly 30 days old is still in the youngest class
+    for days, size in ((0, 1), (30, 2), (30.5, 4), (90.5, 8), (365, 16), (366, 32)):
+        hist.visit('/data', '/data/f', stat(days), size)
+
+    assert hist.buckets['/data']['mtime'] == [1 + 2, 4, 8 + 16, 32]
+
+
+def test_mtime_and_atime_are_bucketed_separately():
+    hist = AgeHistogram(now=NOW)
+    hist.visit('/data', '/data/f', stat(mtime_days=400, atime_days=1), 100)
+
+    assert hist.buckets['/data']['mtime'] == [0, 0, 0, 100]
+    assert hist.buckets['/data']['atime'] == [100, 0, 0, 0]
+
+
+def test_size_classes_use_apparent_size_and_count_allocated_bytes():
+    hist = AgeHistogram(now=NOW)
+    for st_size in (1024 ** 2 - 1, 1024 ** 2, 100 * 1024 ** 2, 1024 ** 3, 5 * 1024 ** 3):
+        hist.visit('/data', '/data/f', stat(0, st_size=st_size), 4096)
+
+    assert hist.buckets['/data']['size_count'] == [1, 1, 1, 2]
+    assert hist.buckets['/data']['size'] == [4096, 4096, 4096, 8192]
+
+
+def test_links_already_counted_are_skipped():
+    hist = AgeHistogram(now=NOW)
+    hist.visit('/data', '/data/link', stat(0), 0)
+    assert hist.buckets == {}
+
+
+def test_forks_merge_per_bucket():
+    hist = AgeHistogram(now=NOW)
+    left, right = hist.fork(), hist.fork()
+    left.visit('/a', '/a/f', stat(10), 10)
+    right.visit('/a', '/a/g', stat(100), 20)
+    right.visit('/b', '/b/h', stat(500), 30)
+    hist.merge(left)
+    hist.merge(right)
+
+    assert hist.buckets['/a']['mtime'] == [10, 0, 20, 0]
+    assert hist.buckets['/b']['mtime'] == [0, 0, 0, 30]
+
+
+def test_scan_fills_histograms_per_top_level_entry(tmp_path):
+    for name, days in (('hot', 1), ('cold', 400)):
+        (tmp_path / name).mkdir()
+        path = tmp_path / name / 'file'
+        path.write_bytes(b'x' * 10000)
+        os.utime(path, (NOW - days * DAY, NOW - days * DAY))
+
+    hist = AgeHistogram(now=NOW)
+    DirectoryScanner(workers=2, visitors=[hist]).scan(str(tmp_path))
+
+    hot = os.lstat(tmp_path / 'hot' / 'file').st_blocks * 512
+    cold = os.lstat(tmp_path / 'cold' / 'file').st_blocks * 512
+    assert hist.buckets[str(tmp_path / 'hot')]['mtime'] == [hot, 0, 0, 0]
+    assert hist.buckets[str(tmp_path / 'cold')]['atime'] == [0, 0, 0, cold]
@@ -0,0 +1,43 @@
+import os
+import threading
+
+from storage_manager import CapacityHistory
+
+
+def test_compact_thins_old_samples_and_leaves_no_temp_files(tmp_path):
+    history = CapacityHistory(str(tmp_path), max_records=1000, full_resolution=3600)
+    now = 100 * 3600
+    for ts in range(now - 4 * 3600, now, 600):
+        history.append('/srv', ts, ts, 0)
+
+    history.compact('/srv', now=now)
+
+    times = list(history.load('/srv')[0::CapacityHistory.RECORD])
+    old = [t for t in times if t < now - 3600]
+    assert len(old) == len({t // 3600 for t in old}) == 3
+    assert [t for t in times if t >= now - 3600] == list(range(now - 3600, now, 600))
+    assert os.listdir(tmp_path) == ['%2Fsrv.bin']
+
+
+def test_concurrent_compact_and_append_keep_every_record(tmp_path):
+    history = CapacityHistory(str(tmp_path), max_records=100000, full_resolution=1e9)
+    history.append('/srv', 1, 1, 1)
+    stop = threading.Event()
+
+    def compact():
+        while not stop.is_set():
+            history.compact('/srv', now=2)
+
+    workers = [threading.Thread(target=compact) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    try:
+        for ts in range(2, 502):
+            history.append('/srv', ts, ts, ts)
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join()
+
+    assert list(history.load('/srv')[0::CapacityHistory.RECORD]) == list(range(1, 502))
+    assert os.listdir(tmp_path) == ['%2Fsrv.bin']
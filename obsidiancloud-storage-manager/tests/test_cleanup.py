@@ -0,0 +1,39 @@
+import os
+
+from storage_manager import OldLogsRule
+
+NOW = 1_800_000_000.0
+OLD = NOW - 30 * 86400
+
+
+def make_logs(root, names, mtime=OLD):
+    for name in names:
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text('x')
+        os.utime(path, (mtime, mtime))
+
+
+def planned(root):
+    rule = OldLogsRule(now=NOW)
+    rule.LOG_DIR = str(root)
+    return sorted(os.path.relpath(item.path, root) for item in rule.plan().items)
+
+
+def test_numbered_logs_need_the_live_file_next_to_them(tmp_path):
+    make_logs(tmp_path, ['syslog', 'syslog.1', 'syslog.2.gz',
+                         'app/data.000042', 'app/data.000043.gz', 'app/data.index'])
+    assert planned(tmp_path) == ['syslog.1', 'syslog.2.gz']
+
+
+def test_database_log_directories_are_not_walked(tmp_path):
+    make_logs(tmp_path, ['mysql/mysql-bin', 'mysql/mysql-bin.000042', 'mysql/error.log.1.gz',
+                         'mariadb/mariadb-bin.000001', 'journal/system@1.journal.gz',
+                         'nested/mysql/app.log', 'nested/mysql/app.log.1'])
+    assert planned(tmp_path) == ['nested/mysql/app.log.1']
+
+
+def test_dated_old_and_compressed_logs_are_rotated_once_old_enough(tmp_path):
+    make_logs(tmp_path, ['messages-20260101', 'auth.log.old', 'dpkg.log.gz', 'current.log'])
+    make_logs(tmp_path, ['kern.log-20260301.gz'], mtime=NOW - 86400)
+    assert planned(tmp_path) == ['auth.log.old', 'dpkg.log.gz', 'messages-20260101']
@@ -0,0 +1,32 @@
+import json
+
+import storage_manager
+from storage_manager import StorageManager
+
+
+class FailingLsblkManager(StorageManager):
+    def __init__(self, output):
+        super().__init__(disk_backend='lsblk')
+        self.output = output
+
+    def run_commands(self, commands, require_root=False, capture_output=True, concurrency=16):
+        return {name: self.output for name in commands}
+
+
+def run_collect(monkeypatch, capsys, output):
+    monkeypatch.setattr(storage_manager, 'StorageManager', lambda disk_backend: FailingLsblkManager(output))
+    monkeypatch.setattr('sys.argv', ['storage_manager.py', 'collect', '--collect', 'overview'])
+    storage_manager.main()
+    return capsys.readouterr()
+
+
+def test_collect_keeps_lsblk_errors_off_stdout(monkeypatch, capsys):
+    out, err = run_collect(monkeypatch, capsys, (1, '', 'lsblk: boom'))
+    assert json.loads(out) == {'devices': []}
+    assert 'lsblk: boom' in err
+
+
+def test_collect_keeps_parse_errors_off_stdout(monkeypatch, capsys):
+    out, err = run_collect(monkeypatch, capsys, (0, 'not json', ''))
+    assert json.loads(out) == {'devices': []}
+    assert 'Error parsing disk info' in err
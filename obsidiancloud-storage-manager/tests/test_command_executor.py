@@ -0,0 +1,32 @@
+import os
+import subprocess
+import sys
+import time
+
+from storage_manager import CommandExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_single_command_runs_without_asyncio():
+    code = ("import sys; from storage_manager import CommandExecutor; "
+            "print(CommandExecutor().run({'echo': ['echo', 'hi']})['echo'][1].strip(), "
+            "'asyncio' in sys.modules)")
+    out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.split() == ['hi', 'False']
+
+
+def test_single_command_timeout_kills_process_group():
+    # The grandchild holds the pipe open; only a process-group kill lets the read finish
+    started = time.monotonic()
+    code, out, err = CommandExecutor(timeout=0.2).run({'sh': ['sh', '-c', 'sleep 30 & sleep 30']})['sh']
+    assert time.monotonic() - started < 5
+    assert code == CommandExecutor.TIMED_OUT and 'timed out after 0.2s' in err
+
+
+def test_batch_keeps_results_of_commands_that_finish():
+    results = CommandExecutor(timeout=0.2).run({'hung': ['sleep', '30'], 'ok': ['echo', 'done'],
+                                                'missing': ['no-such-command-here']})
+    assert results['hung'][0] == CommandExecutor.TIMED_OUT
+    assert results['ok'] == (0, 'done\n', '')
+    assert results['missing'][0] == 127
@@ -0,0 +1,137 @@
+import os
+import threading
+
+import pytest
+
+from storage_manager import DirectoryScanner
+
+
+def make_tree(root):
+    (root / 'big' / 'deep' / 'deeper').mkdir(parents=True)
+    (root / 'small').mkdir()
+    (root / 'big' / 'one').write_bytes(b'x' * 200000)
+    (root / 'big' / 'deep' / 'deeper' / 'two').write_bytes(b'x' * 100000)
+    (root / 'small' / 'three').write_bytes(b'x' * 5000)
+    (root / 'top').write_bytes(b'x' * 50000)
+    (root / 'small' / 'empty').write_bytes(b'')
+    os.symlink('top', root / 'small' / 'link-to-top')
+
+
+def expected_total(root):
+    seen = set()
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in [''] + dirnames + filenames:
+            st = os.lstat(os.path.join(dirpath, name))
+            if (st.st_dev, st.st_ino) not in seen:
+                seen.add((st.st_dev, st.st_ino))
+                total += st.st_blocks * 512
+    return total
+
+
+def test_totals_and_counts_match_the_tree(tmp_path):
+    make_tree(tmp_path)
+    result = DirectoryScanner(workers=3).scan(str(tmp_path))
+
+    assert result.total == expected_total(tmp_path)
+    # Every regular file and symlink is a file; the root and its subdirectories are dirs
+    assert (result.files, result.dirs, result.errors) == (6, 5, 0)
+    assert sum(item.size for item in result.items) + os.lstat(tmp_path).st_blocks * 512 == result.total
+
+
+def test_items_are_top_level_entries_largest_first(tmp_path):
+    make_tree(tmp_path)
+    result = DirectoryScanner(workers=3).scan(str(tmp_path))
+
+    assert [os.path.basename(item.path) for item in result.items] == ['big', 'top', 'small']
+    assert [item.is_dir for item in result.items] == [True, False, True]
+    assert [item.size for item in result.items] == sorted((item.size for item in result.items), reverse=True)
+
+
+def test_hard_links_are_counted_once(tmp_path):
+    (tmp_path / 'a').mkdir()
+    (tmp_path / 'b').mkdir()
+    (tmp_path / 'a' / 'data').write_bytes(b'x' * 100000)
+    os.link(tmp_path / 'a' / 'data', tmp_path / 'a' / 'again')
+    os.link(tmp_path / 'a' / 'data', tmp_path / 'b' / 'elsewhere')
+
+    result = DirectoryScanner(workers=4).scan(str(tmp_path))
+
+    assert result.total == expected_total(tmp_path)
+    assert result.files == 3
+    # The inode is charged to whichever top-level entry reached it first, and only there
+    sizes = {os.path.basename(item.path): item.size - os.lstat(item.path).st_blocks * 512
+             for item in result.items}
+    assert sorted(sizes.values()) == [0, os.lstat(tmp_path / 'a' / 'data').st_blocks * 512]
+
+
+def test_unreadable_directories_are_counted_as_errors(tmp_path, monkeypatch):
+    make_tree(tmp_path)
+    unreadable = str(tmp_path / 'big' / 'deep')
+    real_scandir = os.scandir
+
+    def scandir(path='.'):
+        if path == unreadable:
+            raise PermissionError(13, 'Permission denied', path)
+        return real_scandir(path)
+
+    monkeypatch.setattr(os, 'scandir', scandir)
+    result = DirectoryScanner(workers=2).scan(str(tmp_path))
+
+    assert result.errors == 1
+    # deep itself is still counted from its parent listing; nothing below it is
+    assert result.dirs == 4 and result.files == 5
+
+
+class FailingVisitor:
+    def fork(self):
+        return self
+
+    def merge(self, local):
+        pass
+
+    def visit(self, bucket, path, st, size):
+        if path.endswith('two'):
+            raise ValueError('visitor bug')
+
+
+def run_with_deadline(scan):
+    outcome = {}
+
+    def target():
+        try:
+            outcome['result'] = scan()
+        except Exception as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive(), 'scan hung'
+    return outcome
+
+
+def test_worker_exception_is_raised_instead_of_hanging(tmp_path):
+    make_tree(tmp_path)
+    # One worker: if it died with the exception, nothing would drain the queue
+    scanner = DirectoryScanner(workers=1, visitors=[FailingVisitor()])
+    outcome = run_with_deadline(lambda: scanner.scan(str(tmp_path)))
+    assert isinstance(outcome.get('error'), ValueError)
+
+
+def test_on_entry_exception_is_raised_instead_of_hanging(tmp_path):
+    make_tree(tmp_path)
+
+    def on_entry(usage):
+        if usage.is_dir:
+            raise RuntimeError('consumer went away')
+
+    outcome = run_with_deadline(lambda: DirectoryScanner(workers=1).scan(str(tmp_path), on_entry=on_entry))
+    assert isinstance(outcome.get('error'), RuntimeError)
+
+
+@pytest.mark.parametrize('workers', [1, 8])
+def test_result_does_not_depend_on_worker_count(tmp_path, workers):
+    make_tree(tmp_path)
+    result = DirectoryScanner(workers=workers).scan(str(tmp_path))
+    assert (result.total, result.files, result.dirs) == (expected_total(tmp_path), 6, 5)
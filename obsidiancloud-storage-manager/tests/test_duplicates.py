@@ -0,0 +1,78 @@
+import os
+
+from storage_manager import DirectoryScanner, DuplicateFinder, SizeGroups
+
+EDGE = 16
+
+
+def write(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+
+def collisions(root, min_size=1):
+    groups = SizeGroups(min_size=min_size)
+    DirectoryScanner(workers=2, visitors=[groups]).scan(str(root))
+    return groups.collisions()
+
+
+def test_stages_narrow_by_size_then_edges_then_full_hash(tmp_path):
+    body = b'h' * EDGE + b'm' * 68 + b't' * EDGE
+    a = write(tmp_path / 'a', body)
+    b = write(tmp_path / 'b', body)
+    # Same head and tail as a and b: only the full hash tells it apart
+    write(tmp_path / 'c', b'h' * EDGE + b'X' * 68 + b't' * EDGE)
+    # Different head: dropped after the edge hash
+    write(tmp_path / 'd', b'H' * EDGE + b'm' * 68 + b't' * EDGE)
+    # Unique size: never opened
+    write(tmp_path / 'e', body + b'!')
+
+    found = collisions(tmp_path)
+    assert sorted(len(paths) for paths in found.values()) == [4]
+
+    finder = DuplicateFinder(workers=2, edge=EDGE)
+    groups = finder.find(found)
+
+    assert [(g.size, g.paths, g.reclaimable) for g in groups] == [(100, [a, b], 100)]
+    # Edges of a-d, then the whole of a, b and c
+    assert finder.bytes_read == 4 * 2 * EDGE + 3 * 100
+    assert finder.errors == 0
+
+
+def test_files_within_both_edges_are_not_hashed_twice(tmp_path):
+    a = write(tmp_path / 'a', b'same small file')
+    b = write(tmp_path / 'b', b'same small file')
+    write(tmp_path / 'c', b'diff small file')
+
+    finder = DuplicateFinder(workers=2, edge=EDGE)
+    groups = finder.find(collisions(tmp_path))
+
+    assert [g.paths for g in groups] == [[a, b]]
+    assert finder.bytes_read == 3 * len(b'same small file')
+
+
+def test_hard_links_to_one_inode_are_not_duplicates(tmp_path):
+    data = b'x' * 5000
+    original = write(tmp_path / 'original', data)
+    os.link(original, tmp_path / 'link')
+
+    assert collisions(tmp_path) == {}
+
+    copy = write(tmp_path / 'copy', data)
+    groups = DuplicateFinder(workers=2, edge=EDGE).find(collisions(tmp_path))
+    assert len(groups) == 1 and len(groups[0].paths) == 2
+    assert copy in groups[0].paths
+    assert {os.stat(path).st_ino for path in groups[0].paths} == {os.stat(original).st_ino,
+                                                                   os.stat(copy).st_ino}
+
+
+def test_zero_length_files_are_never_candidates(tmp_path):
+    empty = [write(tmp_path / name, b'') for name in ('a', 'b', 'c')]
+
+    assert collisions(tmp_path, min_size=0) == {}
+
+    # Handed over directly they group without any read (mmap of an empty file would fail)
+    finder = DuplicateFinder(workers=2, edge=EDGE)
+    groups = finder.find({0: empty})
+    assert [(g.paths, g.reclaimable) for g in groups] == [(empty, 0)]
+    assert finder.bytes_read == 0 and finder.errors == 0
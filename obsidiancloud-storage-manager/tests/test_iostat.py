@@ -0,0 +1,81 @@
+import io
+import json
+import signal
+
+import storage_manager
+from storage_manager import DiskInfo, DiskStatsSampler, RecordWriter, StorageManager
+
+
+def diskstats_line(major, minor, name, reads=0, read_sectors=0, read_ms=0, writes=0, write_sectors=0,
+                   write_ms=0, io_ms=0, weighted_ms=0):
+    fields = [major, minor, name, reads, 0, read_sectors, read_ms, writes, 0, write_sectors, write_ms,
+              0, io_ms, weighted_ms]
+    return ' '.join(str(f) for f in fields) + '\n'
+
+
+def test_sampler_computes_rates_from_counter_deltas(tmp_path, monkeypatch):
+    path = tmp_path / 'diskstats'
+    clock = iter([100.0, 102.0])
+    monkeypatch.setattr(storage_manager.time, 'monotonic', lambda: next(clock))
+    sampler = DiskStatsSampler(str(tmp_path))
+
+    path.write_text(diskstats_line(8, 0, 'sda', reads=100, read_sectors=800, read_ms=50, writes=10)
+                    + diskstats_line(7, 0, 'loop0')
+                    + "   8    1 sda1 short line\n")
+    assert sampler.sample() == []
+
+    path.write_text(diskstats_line(8, 0, 'sda', reads=300, read_sectors=4896, read_ms=450, writes=50,
+                                   write_sectors=2048, write_ms=120, io_ms=1000, weighted_ms=3000)
+                    + diskstats_line(7, 0, 'loop0'))
+    [stats] = sampler.sample()
+
+    assert (stats.name, stats.maj_min) == ('sda', '8:0')
+    assert stats.read_iops == 100.0 and stats.write_iops == 20.0
+    assert stats.read_bytes_per_sec == 4096 * 512 / 2
+    assert stats.write_bytes_per_sec == 2048 * 512 / 2
+    assert stats.read_await_ms == 2.0 and stats.write_await_ms == 3.0
+    assert stats.await_ms == 520 / 240
+    assert stats.util_percent == 50.0 and stats.queue_depth == 1.5
+
+
+def test_sampler_clamps_counters_that_went_backwards(tmp_path, monkeypatch):
+    path = tmp_path / 'diskstats'
+    clock = iter([0.0, 1.0])
+    monkeypatch.setattr(storage_manager.time, 'monotonic', lambda: next(clock))
+    sampler = DiskStatsSampler(str(tmp_path))
+    path.write_text(diskstats_line(253, 0, 'dm-0', reads=500, writes=500, io_ms=900))
+    sampler.sample()
+    path.write_text(diskstats_line(253, 0, 'dm-0', reads=5, writes=1, io_ms=10))
+    [stats] = sampler.sample()
+    assert stats.read_iops == stats.write_iops == stats.util_percent == 0.0
+
+
+class FakeSampler:
+    def sample(self):
+        return [storage_manager.DeviceIOStats(
+            name=name, maj_min=maj_min, read_iops=1.0, write_iops=2.0, read_bytes_per_sec=0.0,
+            write_bytes_per_sec=0.0, await_ms=0.0, read_await_ms=0.0, write_await_ms=0.0,
+            queue_depth=0.0, util_percent=0.0) for name, maj_min in [('dm-0', '253:0'), ('sda', '8:0')]]
+
+
+class FixedDisksManager(StorageManager):
+    def get_disk_info(self):
+        return [DiskInfo(name='vg-root', size='', type='lvm', mountpoint='/', fstype='ext4',
+                         uuid=None, label=None, maj_min='253:0'),
+                DiskInfo(name='', size='', type='disk', mountpoint=None, fstype=None,
+                         uuid=None, label=None, maj_min='8:0')]
+
+
+def test_iostat_reports_device_names_with_kernel_name_fallback(monkeypatch, capsys):
+    monkeypatch.setattr(storage_manager, 'DiskStatsSampler', FakeSampler)
+    monkeypatch.setattr(signal, 'signal', lambda *args: None)
+    stream = io.StringIO()
+
+    FixedDisksManager().iostat(interval=0, count=1, writer=RecordWriter('ndjson', 'iostat', stream))
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [(r['name'], r['kernel_name'], r['mountpoint']) for r in records] == [
+        ('vg-root', 'dm-0', '/'), ('sda', 'sda', None)]
+
+    FixedDisksManager().iostat(interval=0, count=1)
+    rows = capsys.readouterr().out.splitlines()[2:]
+    assert [row.split()[0] for row in rows] == ['vg-root', 'sda']
@@ -0,0 +1,55 @@
+import json
+
+from storage_manager import LVMReport, LVMReportParser
+
+
+def report_json(**rows):
+    return json.dumps({'report': [rows]})
+
+
+def test_fullreport_entries_and_segments_are_linked():
+    output = json.dumps({'report': [
+        {'vg': [{'vg_name': 'vg0', 'vg_uuid': 'v', 'vg_size': '2147483648', 'vg_free': '0',
+                 'pv_count': '1', 'lv_count': '1', 'vg_extent_size': '4194304',
+                 'vg_extent_count': '512', 'vg_free_count': '0'}],
+         'pv': [{'pv_name': '/dev/sda2', 'vg_name': 'vg0', 'pv_uuid': 'p', 'pv_size': '2147483648',
+                 'pv_free': '0', 'pv_pe_count': '512', 'pv_pe_alloc_count': '512'}],
+         'lv': [{'lv_name': 'pool', 'vg_name': 'vg0', 'lv_uuid': 'l', 'lv_attr': 'twi-aotz--',
+                 'lv_size': '1073741824', 'lv_layout': 'thin,pool', 'pool_lv': '',
+                 'data_percent': '12.50', 'metadata_percent': ''}],
+         'seg': [{'lv_uuid': 'l', 'segtype': 'thin-pool', 'stripes': '1', 'seg_start': '0',
+                  'seg_size': '1073741824', 'devices': 'pool_tdata(0)'}]},
+    ]})
+    report = LVMReport()
+    LVMReportParser().parse(output, report, 'lvm fullreport')
+
+    assert report.errors == []
+    assert report.volume_groups[0].extent_count == 512
+    lv = report.logical_volumes[0]
+    assert lv.is_thin_pool and lv.data_percent == 12.5 and lv.metadata_percent is None
+    assert lv.pool_lv is None
+    assert [seg.devices for seg in lv.segments] == [['pool_tdata(0)']]
+
+
+def test_sizes_above_2_53_stay_exact():
+    size = 2 ** 60 + 1
+    report = LVMReport()
+    LVMReportParser().parse(report_json(pv=[{'pv_name': '/dev/big', 'pv_size': str(size),
+                                             'pv_free': '1.0'}]), report, 'pvs')
+    pv = report.physical_volumes[0]
+    assert pv.pv_size == size
+    assert pv.pv_free == 1
+
+
+def test_bad_rows_are_reported_not_dropped_silently():
+    report = LVMReport()
+    LVMReportParser().parse(report_json(lv=[{'lv_name': 'broken', 'vg_name': 'vg0', 'lv_size': 'abc'}]),
+                            report, 'lvs')
+    assert report.logical_volumes == []
+    assert report.errors and report.errors[0].startswith('lvs: skipped lv row')
+
+
+def test_malformed_output():
+    report = LVMReport()
+    LVMReportParser().parse('not json', report, 'vgs')
+    assert report.errors[0].startswith('vgs: malformed report')
@@ -0,0 +1,130 @@
+import os
+
+import pytest
+
+from storage_manager import DeviceTree, DiskInfo, MetadataCache, StorageManager
+
+
+@pytest.fixture
+def topology(tmp_path):
+    (tmp_path / 'sys' / 'kernel').mkdir(parents=True)
+    (tmp_path / 'proc' / 'self').mkdir(parents=True)
+    (tmp_path / 'lvm-backup').mkdir()
+    (tmp_path / 'sys' / 'kernel' / 'uevent_seqnum').write_text('4242\n')
+    (tmp_path / 'proc' / 'self' / 'mountinfo').write_text('22 1 8:1 / / rw - ext4 /dev/sda1 rw\n')
+    return tmp_path
+
+
+def make_cache(root, directory=None, ttl=10.0):
+    return MetadataCache(str(directory or root / 'cache'), ttl=ttl, sys_root=str(root / 'sys'),
+                         proc_root=str(root / 'proc'), lvm_backup=str(root / 'lvm-backup'))
+
+
+def test_entry_is_used_while_the_topology_is_unchanged(topology):
+    cache = make_cache(topology)
+    cache.store('devices', {'n': 1}, cache.topology_key())
+
+    assert cache.load('devices', cache.topology_key()) == {'n': 1}
+    # Another invocation reads the same entry
+    assert make_cache(topology).load('devices', cache.topology_key()) == {'n': 1}
+
+
+@pytest.mark.parametrize('change', ['device event', 'mount', 'lvm change'])
+def test_topology_change_makes_the_entry_stale(topology, change):
+    cache = make_cache(topology)
+    cache.store('devices', {'n': 1}, cache.topology_key())
+
+    if change == 'device event':
+        (topology / 'sys' / 'kernel' / 'uevent_seqnum').write_text('4243\n')
+    elif change == 'mount':
+        with open(topology / 'proc' / 'self' / 'mountinfo', 'a') as f:
+            f.write('23 22 8:2 / /data rw - xfs /dev/sda2 rw\n')
+    else:
+        st = os.stat(topology / 'lvm-backup')
+        os.utime(topology / 'lvm-backup', ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+
+    assert cache.load('devices', cache.topology_key()) is None
+
+
+def test_entry_expires_after_ttl(topology, monkeypatch):
+    cache = make_cache(topology, ttl=10.0)
+    key = cache.topology_key()
+    cache.store('devices', {'n': 1}, key)
+
+    now = os.stat(cache._path('devices')).st_mtime
+    monkeypatch.setattr('time.time', lambda: now + 11)
+    assert cache.load('devices', key) is None
+
+
+def test_entries_from_another_version_are_ignored(topology, monkeypatch):
+    cache = make_cache(topology)
+    key = cache.topology_key()
+    cache.store('devices', {'n': 1}, key)
+
+    monkeypatch.setattr(MetadataCache, 'VERSION', MetadataCache.VERSION + 1)
+    assert cache.load('devices', key) is None
+
+
+def test_corrupt_entry_is_a_miss(topology):
+    cache = make_cache(topology)
+    os.makedirs(cache.directory)
+    with open(cache._path('devices'), 'w') as f:
+        f.write('{"version": 1, "crea')
+    assert cache.load('devices', cache.topology_key()) is None
+
+
+def test_unwritable_directory_stores_nothing(topology):
+    # A path below a regular file cannot be created, even as root
+    (topology / 'run').write_text('')
+    cache = make_cache(topology, directory=topology / 'run' / 'storage-manager')
+    key = cache.topology_key()
+
+    cache.store('devices', {'n': 1}, key)
+
+    assert cache.load('devices', key) is None
+    assert not any(name.endswith('.tmp') for _, _, names in os.walk(topology) for name in names)
+
+
+def test_no_runtime_directory_without_root(monkeypatch):
+    monkeypatch.setattr(os, 'geteuid', lambda: 1000)
+    monkeypatch.delenv('XDG_RUNTIME_DIR', raising=False)
+    assert MetadataCache.default_directory() is None
+    assert StorageManager().metadata_cache is None
+
+    monkeypatch.setenv('XDG_RUNTIME_DIR', '/run/user/1000')
+    assert MetadataCache.default_directory() == '/run/user/1000/storage-manager'
+
+
+class CountingManager(StorageManager):
+    def __init__(self):
+        super().__init__(disk_backend='sysfs')
+        self.reads = 0
+
+    def _read_device_tree(self):
+        self.reads += 1
+        tree = DeviceTree()
+        tree.add(DiskInfo('sda', '10G', 'disk', None, None, None, None, maj_min='8:0'))
+        return tree
+
+
+def test_device_tree_is_read_again_after_a_device_event(topology):
+    manager = CountingManager()
+    manager.metadata_cache = make_cache(topology)
+
+    assert [n.info.name for n in manager.get_device_tree().nodes] == ['sda']
+    manager.get_device_tree()
+    assert manager.reads == 1
+
+    (topology / 'sys' / 'kernel' / 'uevent_seqnum').write_text('4243\n')
+    manager.get_device_tree()
+    assert manager.reads == 2
+
+
+def test_device_tree_is_read_on_every_call_when_the_cache_cannot_be_written(topology):
+    (topology / 'run').write_text('')
+    manager = CountingManager()
+    manager.metadata_cache = make_cache(topology, directory=topology / 'run' / 'storage-manager')
+
+    assert len(manager.get_device_tree()) == 1
+    assert len(manager.get_device_tree()) == 1
+    assert manager.reads == 2
@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+
+from storage_manager import DeviceTree, DiskInfo, MetricsExporter, MountUsageCollector, StorageManager
+
+
+def write_mountinfo(tmp_path, lines):
+    path = tmp_path / 'mountinfo'
+    path.write_text(''.join(line + '\n' for line in lines))
+    return str(path)
+
+
+def disk(name, maj_min, dev_type='part'):
+    return DiskInfo(name=name, size='', type=dev_type, mountpoint=None, fstype=None,
+                    uuid=None, label=None, maj_min=maj_min)
+
+
+def test_block_mounts_keep_anonymous_devices_with_dev_source(tmp_path):
+    path = write_mountinfo(tmp_path, [
+        f"22 1 8:1 / {tmp_path} rw - ext4 /dev/sda1 rw",
+        f"23 1 0:31 /@ {tmp_path} rw - btrfs /dev/mapper/vg-root rw",
+        f"24 1 0:31 /@home {tmp_path} rw - btrfs /dev/mapper/vg-root rw",
+        f"25 1 0:22 / {tmp_path} rw - tmpfs tmpfs rw",
+    ])
+    mounts = MountUsageCollector(path).mounts(block_only=True)
+    assert [(m.fstype, m.source) for m in mounts] == [('ext4', '/dev/sda1'), ('btrfs', '/dev/mapper/vg-root')]
+
+
+def test_overview_usage_joins_btrfs_by_source(tmp_path):
+    path = write_mountinfo(tmp_path, [f"23 1 0:31 / {tmp_path} rw - btrfs /dev/mapper/vg-root rw"])
+    manager = StorageManager()
+    manager.mount_collector = MountUsageCollector(path)
+    tree = DeviceTree()
+    pv, _ = tree.add(disk('sda2', '8:2'))
+    tree.add(disk('vg-root', '253:0', 'lvm'), pv)
+
+    manager._enhance_with_mount_usage(tree)
+
+    root = tree.by_name['vg-root'].info
+    assert root.avail_bytes is not None and root.use_percent.endswith('%')
+    assert tree.by_name['sda2'].info.used_bytes is None
+
+
+def test_by_source():
+    tree = DeviceTree()
+    tree.add(disk('sda1', '8:1'))
+    tree.add(disk('vg-root', '253:0', 'lvm'))
+    assert tree.by_source('/dev/sda1').info.name == 'sda1'
+    assert tree.by_source('/dev/mapper/vg-root').info.name == 'vg-root'
+    assert tree.by_source('tmpfs') is None
+
+
+def test_pseudo_filesystems_are_not_probed(tmp_path):
+    path = write_mountinfo(tmp_path, [
+        f"22 1 0:21 / {tmp_path}/proc rw - proc proc rw",
+        f"23 1 0:22 / {tmp_path}/cg rw - cgroup2 cgroup2 rw",
+        f"24 1 0:23 / {tmp_path}/ov rw - overlay overlay rw",
+        f"25 1 0:24 / {tmp_path} rw - tmpfs tmpfs rw",
+    ])
+    assert [m.fstype for m in MountUsageCollector(path).mounts()] == ['tmpfs']
+
+
+def test_hung_mount_keeps_one_probe_in_flight(tmp_path, monkeypatch):
+    hung = str(tmp_path / 'nfs')
+    path = write_mountinfo(tmp_path, [f"22 1 0:50 / {hung} rw - nfs4 server:/export rw",
+                                      f"23 1 0:24 / {tmp_path} rw - tmpfs tmpfs rw"])
+    release = threading.Event()
+    real_statvfs = os.statvfs
+    calls = []
+
+    def statvfs(mountpoint):
+        calls.append(mountpoint)
+        if mountpoint == hung:
+            release.wait()
+        return real_statvfs(str(tmp_path))
+
+    monkeypatch.setattr(os, 'statvfs', statvfs)
+    collector = MountUsageCollector(path, timeout=0.05)
+    baseline = threading.active_count()
+    try:
+        for _ in range(5):
+            usages = {u.mountpoint: u for u in collector.collect()}
+            assert usages[hung].error == 'timeout'
+            assert usages[str(tmp_path)].error is None
+        assert calls.count(hung) == 1
+        assert threading.active_count() <= baseline + 1
+    finally:
+        release.set()
+
+    # Once the stuck probe returns the mount is probed again
+    for _ in range(100):
+        if not collector._pending:
+            break
+        time.sleep(0.01)
+    usages = {u.mountpoint: u for u in collector.collect()}
+    assert usages[hung].error is None
+    assert calls.count(hung) == 2
+
+
+def test_exporter_scrapes_share_one_probe_per_mount(tmp_path, monkeypatch):
+    hung = str(tmp_path / 'nfs')
+    path = write_mountinfo(tmp_path, [f"22 1 0:50 / {hung} rw - nfs4 server:/export rw"])
+    release = threading.Event()
+    real_statvfs = os.statvfs
+    calls = []
+
+    def statvfs(mountpoint):
+        calls.append(mountpoint)
+        release.wait()
+        return real_statvfs(str(tmp_path))
+
+    monkeypatch.setattr(os, 'statvfs', statvfs)
+    manager = StorageManager()
+    manager.mount_collector = MountUsageCollector(path, timeout=0.05)
+    monkeypatch.setattr(manager, 'get_device_tree', DeviceTree)
+    monkeypatch.setattr(manager, 'check_root_privileges', lambda: False)
+    exporter = MetricsExporter(manager, ttl=0)
+    try:
+        for _ in range(3):
+            assert 'storage_mount_up{mountpoint="%s"' % hung in exporter.collect()
+        assert calls == [hung]
+    finally:
+        release.set()
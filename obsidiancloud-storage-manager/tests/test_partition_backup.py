@@ -0,0 +1,110 @@
+import json
+import os
+from datetime import datetime
+
+from storage_manager import BackupRef, DiskInfo, PartitionBackupStore, StorageManager
+
+
+class FakeSfdiskManager(StorageManager):
+    def __init__(self, backup_dir, results):
+        super().__init__()
+        self.backup_dir = str(backup_dir)
+        self.results = results
+
+    def check_root_privileges(self):
+        return True
+
+    def get_disk_info(self):
+        return [DiskInfo(name=device[len('/dev/'):], size='', type='disk', mountpoint=None, fstype=None,
+                         uuid=None, label=None) for device in self.results]
+
+    def run_commands(self, commands, require_root=False, capture_output=True, concurrency=16):
+        return {name: self.results[name] for name in commands}
+
+
+TABLE = "label: gpt\ndevice: /dev/sda\n\n/dev/sda1 : start=2048, size=2048, type=L\n"
+
+
+def test_backup_all_succeeds_when_every_disk_is_stored(tmp_path):
+    manager = FakeSfdiskManager(tmp_path, {'/dev/sda': (0, TABLE, ''), '/dev/sdb': (0, TABLE, '')})
+    manifest = manager.backup_all_partition_tables()
+    with open(manifest) as f:
+        data = json.load(f)
+    assert sorted(data['devices']) == ['/dev/sda', '/dev/sdb']
+    assert data['failed'] == {} and data['partial'] is False
+
+
+def test_backup_all_fails_and_marks_manifest_partial(tmp_path):
+    manager = FakeSfdiskManager(tmp_path, {'/dev/sda': (0, TABLE, ''), '/dev/sdb': (124, '', 'timed out')})
+    assert manager.backup_all_partition_tables() is None
+    manifests = list((tmp_path / 'manifests').iterdir())
+    assert len(manifests) == 1
+    data = json.loads(manifests[0].read_text())
+    assert list(data['devices']) == ['/dev/sda']
+    assert data['failed'] == {'/dev/sdb': 'timed out'}
+    assert data['partial'] is True
+
+
+def at(day, hour):
+    return datetime(2026, 3, day, hour).timestamp()
+
+
+def ref(device, created, digest='d'):
+    return BackupRef(device=device, created=created, digest=digest, size=1)
+
+
+def test_retained_counts_backups_kept_by_several_policies_once():
+    refs = [ref('/dev/sda', at(1, 10)), ref('/dev/sda', at(1, 12)), ref('/dev/sda', at(2, 9)),
+            ref('/dev/sda', at(3, 8)), ref('/dev/sda', at(3, 20)), ref('/dev/sdb', at(1, 10))]
+
+    keep = PartitionBackupStore.retained(refs, keep_last=2, keep_daily=2)
+
+    # keep-last picks 3/20 and 3/8, keep-daily picks 3/20 and 2/9; sdb is kept on its own
+    assert [(r.device, r.created) for r in keep] == [
+        ('/dev/sda', at(3, 20)), ('/dev/sda', at(3, 8)), ('/dev/sda', at(2, 9)), ('/dev/sdb', at(1, 10))]
+
+
+def test_retained_daily_keeps_newest_backup_of_each_day():
+    refs = [ref('/dev/sda', at(1, 10)), ref('/dev/sda', at(1, 12)), ref('/dev/sda', at(2, 9))]
+    keep = PartitionBackupStore.retained(refs, keep_daily=5)
+    assert [r.created for r in keep] == [at(2, 9), at(1, 12)]
+
+
+def blobs(store):
+    return sorted(name[:-3] for _, _, files in os.walk(store.objects_dir) for name in files)
+
+
+def test_prune_rewrites_index_and_collects_unreferenced_blobs(tmp_path):
+    store = PartitionBackupStore(str(tmp_path))
+    old, _ = store.put('/dev/sda', 'table v1', created=at(1, 10))
+    shared, _ = store.put('/dev/sda', 'table v2', created=at(2, 10))
+    store.put('/dev/sda', 'table v2', created=at(3, 10))
+    current, _ = store.put('/dev/sdb', 'table v3', created=at(3, 10))
+
+    removed, keep, _ = store.prune(keep_last=1, dry_run=True)
+    assert len(removed) == 2 and len(blobs(store)) == 3
+
+    removed, keep, collected = store.prune(keep_last=1)
+
+    assert sorted(r.created for r in removed) == [at(1, 10), at(2, 10)]
+    assert [(r.device, r.created) for r in store.refs()] == [('/dev/sda', at(3, 10)), ('/dev/sdb', at(3, 10))]
+    # v2 is still referenced by the 3/10 backup, so only v1's blob goes
+    assert collected == 1
+    assert blobs(store) == sorted([shared.digest, current.digest])
+    assert old.digest not in blobs(store)
+
+
+def test_prune_keeps_manifests_whose_tables_are_still_stored(tmp_path):
+    store = PartitionBackupStore(str(tmp_path))
+    manifests = {}
+    for day, table in ((1, 'table v1'), (2, 'table v1'), (3, 'table v2')):
+        ref, _ = store.put('/dev/sda', table, created=at(day, 10))
+        manifests[day] = store.write_manifest([ref], {}, created=at(day, 10) + 0.25)
+
+    # The 1/10 backup goes, but its table is still the one the 2/10 backup points at
+    removed, _, _ = store.prune(keep_last=2)
+    assert [r.created for r in removed] == [at(1, 10)]
+    assert all(os.path.exists(path) for path in manifests.values())
+
+    store.prune(keep_last=1)
+    assert [os.path.exists(manifests[day]) for day in (1, 2, 3)] == [False, False, True]
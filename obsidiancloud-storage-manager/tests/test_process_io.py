@@ -0,0 +1,60 @@
+import os
+
+import storage_manager
+from storage_manager import MountEntry, ProcessIOSampler
+
+
+def make_process(proc, pid, comm, write_bytes, cancelled=0, files=()):
+    base = proc / str(pid)
+    (base / 'fd').mkdir(parents=True, exist_ok=True)
+    (base / 'fdinfo').mkdir(exist_ok=True)
+    (base / 'comm').write_text(comm + '\n')
+    (base / 'io').write_text(f"rchar: 1\nwchar: 2\nsyscr: 3\nsyscw: 4\nread_bytes: 5\n"
+                             f"write_bytes: {write_bytes}\ncancelled_write_bytes: {cancelled}\n")
+    for fd, (target, flags) in enumerate(files, start=3):
+        link = base / 'fd' / str(fd)
+        if not link.is_symlink():
+            link.symlink_to(target)
+        (base / 'fdinfo' / str(fd)).write_text(f"pos:\t0\nflags:\t{flags}\nmnt_id:\t1\n")
+
+
+def mount_for(path, mountpoint):
+    dev = os.stat(path).st_dev
+    return MountEntry(major=os.major(dev), minor=os.minor(dev), root='/', mountpoint=mountpoint,
+                      fstype='ext4', source='/dev/sda1')
+
+
+def test_read_parses_write_bytes_net_of_cancelled_writes(tmp_path):
+    proc = tmp_path / 'proc'
+    make_process(proc, 10, 'postgres', 8192, cancelled=4096)
+    make_process(proc, 11, 'idle', 0)
+    (proc / 'self').mkdir()
+    (proc / '12').mkdir()  # exited between listdir and open
+    assert ProcessIOSampler([], str(proc)).read() == {10: 4096, 11: 0}
+
+
+def test_sample_ranks_writers_and_maps_open_files_to_mounts(tmp_path, monkeypatch):
+    proc, data = tmp_path / 'proc', tmp_path / 'data'
+    data.mkdir()
+    log, table = data / 'app.log', data / 'table'
+    log.write_text('')
+    table.write_text('')
+    clock = iter([10.0, 12.0])
+    monkeypatch.setattr(storage_manager.time, 'monotonic', lambda: next(clock))
+    sampler = ProcessIOSampler([mount_for(data, '/data')], str(proc))
+
+    make_process(proc, 10, 'postgres', 1000, files=[(table, '0100002')])
+    make_process(proc, 20, 'reader', 1000, files=[(log, '0100000')])
+    make_process(proc, 30, 'idle', 500)
+    assert sampler.sample() == []
+
+    make_process(proc, 10, 'postgres', 9000, files=[(table, '0100002'), (log, '02100001')])
+    make_process(proc, 20, 'reader', 3000, files=[(log, '0100000')])
+    make_process(proc, 30, 'idle', 500)
+    make_process(proc, 40, 'new', 100)
+    writers = sampler.sample()
+
+    assert [(w.pid, w.comm, w.write_bytes_per_sec) for w in writers] == [
+        (10, 'postgres', 4000.0), (20, 'reader', 1000.0), (40, 'new', 50.0)]
+    # postgres writes two files on /data; reader only holds /data open read-only
+    assert [w.mountpoints for w in writers] == [['/data'], [], []]
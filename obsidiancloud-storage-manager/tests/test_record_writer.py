@@ -0,0 +1,75 @@
+import io
+import json
+import threading
+
+from storage_manager import RecordWriter
+
+
+def test_ndjson_writes_one_typed_object_per_line():
+    out = io.StringIO()
+    writer = RecordWriter('ndjson', 'analyze', stream=out)
+    writer.emit('entry', {'path': '/data', 'size': 4096})
+    writer.emit('summary', {'total': 4096})
+    writer.close()
+
+    lines = out.getvalue().splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {'type': 'entry', 'path': '/data', 'size': 4096},
+        {'type': 'summary', 'total': 4096},
+    ]
+    assert writer.count == 2
+
+
+def test_json_is_a_single_document_with_a_records_array():
+    out = io.StringIO()
+    writer = RecordWriter('json', 'analyze', stream=out)
+    writer.emit('entry', {'path': '/data'})
+    # Partial output already has the header and the first record
+    assert out.getvalue().startswith('{"command": "analyze", "records": [\n')
+    writer.emit('summary', {'total': 1})
+    writer.close()
+
+    assert json.loads(out.getvalue()) == {
+        'command': 'analyze',
+        'records': [{'type': 'entry', 'path': '/data'}, {'type': 'summary', 'total': 1}],
+    }
+    assert out.getvalue().endswith('\n]}\n')
+
+
+def test_json_without_records_is_still_a_document():
+    out = io.StringIO()
+    RecordWriter('json', 'list-backups', stream=out).close()
+    assert json.loads(out.getvalue()) == {'command': 'list-backups', 'records': []}
+
+
+def test_ndjson_without_records_writes_nothing():
+    out = io.StringIO()
+    RecordWriter('ndjson', 'list-backups', stream=out).close()
+    assert out.getvalue() == ''
+
+
+def test_values_json_cannot_encode_are_written_as_strings():
+    out = io.StringIO()
+    writer = RecordWriter('ndjson', 'overview', stream=out)
+    writer.emit('device', {'size': 1, 'tags': {'a'}})
+    assert json.loads(out.getvalue()) == {'type': 'device', 'size': 1, 'tags': "{'a'}"}
+
+
+def test_records_from_threads_are_not_interleaved():
+    out = io.StringIO()
+    writer = RecordWriter('json', 'analyze', stream=out)
+
+    def emit(n):
+        for i in range(200):
+            writer.emit('entry', {'worker': n, 'i': i})
+
+    threads = [threading.Thread(target=emit, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writer.close()
+
+    records = json.loads(out.getvalue())['records']
+    assert len(records) == writer.count == 800
+    assert sorted((r['worker'], r['i']) for r in records) == [(n, i) for n in range(4) for i in range(200)]
@@ -0,0 +1,57 @@
+import os
+
+from storage_manager import DirectoryScanner, ScanIndex
+
+
+def make_tree(root):
+    for name in ('a', 'b'):
+        (root / name).mkdir(parents=True)
+        (root / name / 'data').write_bytes(b'x' * 10000)
+    # A hard link is counted once, whether its directory is listed or reused
+    os.link(root / 'a' / 'data', root / 'a' / 'link')
+
+
+def scan(tmp_path, full_rescan=False):
+    index = ScanIndex(str(tmp_path / 'index.db'))
+    return DirectoryScanner(workers=2, index=index, full_rescan=full_rescan).scan(str(tmp_path / 'tree'))
+
+
+def test_unchanged_directories_are_reused(tmp_path):
+    make_tree(tmp_path / 'tree')
+    first = scan(tmp_path)
+    second = scan(tmp_path)
+
+    assert first.reused == 0 and second.reused == 2
+    assert (second.total, second.files, second.dirs) == (first.total, first.files, first.dirs)
+    assert [(i.path, i.size) for i in second.items] == [(i.path, i.size) for i in first.items]
+
+
+def test_mtime_or_ctime_change_lists_the_directory_again(tmp_path):
+    tree = tmp_path / 'tree'
+    make_tree(tree)
+    first = scan(tmp_path)
+
+    (tree / 'a' / 'new').write_bytes(b'y' * 10000)
+    added = scan(tmp_path)
+    assert added.reused == 1 and added.files == first.files + 1
+    assert added.total == first.total + os.lstat(tree / 'a' / 'new').st_blocks * 512
+
+    # chmod only moves ctime
+    os.chmod(tree / 'b', 0o700)
+    assert scan(tmp_path).reused == 1
+
+
+def test_full_rescan_picks_up_files_grown_in_place_and_rebuilds_the_index(tmp_path):
+    tree = tmp_path / 'tree'
+    make_tree(tree)
+    first = scan(tmp_path)
+
+    with open(tree / 'a' / 'data', 'ab') as f:
+        f.write(b'z' * 100000)
+    # The directory did not change, so its indexed size is reused
+    assert scan(tmp_path).total == first.total
+
+    rescanned = scan(tmp_path, full_rescan=True)
+    assert rescanned.reused == 0 and rescanned.total > first.total
+    after = scan(tmp_path)
+    assert after.reused == 2 and after.total == rescanned.total
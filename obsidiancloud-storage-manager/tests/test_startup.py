@@ -0,0 +1,24 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_defers_modules_commands_load_on_demand():
+    code = ("import sys; import storage_manager; "
+            "print(' '.join(m for m in ('subprocess', 'asyncio', 'sqlite3', 'http.server', 'concurrent.futures') "
+            "if m in sys.modules))")
+    out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.split() == []
+
+
+def test_records_are_dataclasses_at_import():
+    import dataclasses
+
+    from storage_manager import LVMReport, PhysicalVolume
+
+    assert dataclasses.is_dataclass(LVMReport) and dataclasses.is_dataclass(PhysicalVolume)
+    report = LVMReport()
+    report.physical_volumes.append(PhysicalVolume('/dev/sda2', 'vg', 'uuid', 1, 0, None, None))
+    assert dataclasses.asdict(report)['physical_volumes'][0]['pv_name'] == '/dev/sda2'
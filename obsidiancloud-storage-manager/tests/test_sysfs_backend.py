@@ -0,0 +1,68 @@
+import os
+
+from storage_manager import SysfsBlockBackend
+
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+def device(block, name, major, minor, devtype, sectors, parent=None):
+    base = os.path.join(block, parent, name) if parent else os.path.join(block, name)
+    write(os.path.join(base, 'uevent'), f"MAJOR={major}\nMINOR={minor}\nDEVNAME={name}\nDEVTYPE={devtype}\n")
+    write(os.path.join(base, 'size'), str(sectors))
+    os.makedirs(os.path.join(base, 'holders'), exist_ok=True)
+    if parent:
+        write(os.path.join(base, 'partition'), name[-1])
+        os.symlink(os.path.join(parent, name), os.path.join(block, name))
+    return base
+
+
+def make_host(tmp_path, mountinfo):
+    """sda with sda1 (ext4) and sda2 (LVM PV holding vg-root, dm-0)."""
+    block = str(tmp_path / 'sys' / 'class' / 'block')
+    device(block, 'sda', 8, 0, 'disk', 2097152)
+    device(block, 'sda1', 8, 1, 'partition', 1048576, parent='sda')
+    sda2 = device(block, 'sda2', 8, 2, 'partition', 1046528, parent='sda')
+    dm = device(block, 'dm-0', 253, 0, 'disk', 1040384)
+    write(os.path.join(dm, 'dm', 'name'), 'vg-root')
+    write(os.path.join(dm, 'dm', 'uuid'), 'LVM-abc')
+    os.symlink(dm, os.path.join(sda2, 'holders', 'dm-0'))
+    write(str(tmp_path / 'proc' / 'partitions'),
+          "major minor  #blocks  name\n\n   8 0 1048576 sda\n   8 1 524288 sda1\n"
+          "   8 2 523264 sda2\n 253 0 520192 dm-0\n")
+    write(str(tmp_path / 'proc' / 'self' / 'mountinfo'), mountinfo)
+    write(str(tmp_path / 'udev' / 'b8:1'), "E:ID_FS_TYPE=ext4\nE:ID_FS_UUID=1111\n")
+    return SysfsBlockBackend(str(tmp_path / 'sys'), str(tmp_path / 'proc'), str(tmp_path / 'udev'))
+
+
+def test_tree_types_sizes_and_relations(tmp_path):
+    backend = make_host(tmp_path, "22 1 8:1 / /boot rw - ext4 /dev/sda1 rw\n")
+    tree = backend.read_tree()
+
+    assert [d.name for d in tree.devices] == ['sda', 'sda1', 'sda2', 'vg-root']
+    assert [d.type for d in tree.devices] == ['disk', 'part', 'part', 'lvm']
+    assert tree.by_name['sda'].info.size_bytes == 1073741824
+    assert [n.info.name for n in tree.by_name['sda2'].children] == ['vg-root']
+    boot = tree.by_name['sda1'].info
+    assert (boot.mountpoint, boot.fstype, boot.uuid, boot.maj_min) == ('/boot', 'ext4', '1111', '8:1')
+
+
+def test_bind_mount_does_not_hide_filesystem_root(tmp_path):
+    backend = make_host(tmp_path, "22 1 8:1 /sub /mnt/sub rw - ext4 /dev/sda1 rw\n"
+                                  "23 1 8:1 / /boot rw - ext4 /dev/sda1 rw\n")
+    assert backend.read_tree().by_name['sda1'].info.mountpoint == '/boot'
+
+
+def test_anonymous_device_numbers_match_by_source(tmp_path):
+    # btrfs reports 0:N in mountinfo; the source path still names the device
+    backend = make_host(tmp_path, "22 1 0:31 /@ / rw - btrfs /dev/mapper/vg-root rw\n"
+                                  "23 1 0:31 /@home /home rw - btrfs /dev/mapper/vg-root rw\n"
+                                  "24 1 0:40 / /data rw - btrfs /dev/sda1 rw\n"
+                                  "25 1 0:22 / /proc rw - proc proc rw\n")
+    tree = backend.read_tree()
+    assert tree.by_name['vg-root'].info.mountpoint == '/'
+    assert tree.by_name['sda1'].info.mountpoint == '/data'
+    assert tree.by_name['sda2'].info.mountpoint is None